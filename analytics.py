@@ -0,0 +1,335 @@
+import functools
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import queries
+from database import GRADES, GRADE_POINTS
+from queries import (
+    get_data_version, get_top_courses, get_grade_distribution, get_course_popularity, get_student_gpas,
+    get_department_student_gpas, get_students_by_key,
+)
+
+# Answer enrollment aggregations from the in-memory snapshot; False sends them to SQLite
+USE_SNAPSHOT = True
+
+# Enrollment rows read per fetch during a full load
+LOAD_CHUNK_SIZE = 100000
+
+# Grade points indexed by grade code (see encode_grades)
+GRADE_POINT_VALUES = np.array([GRADE_POINTS[grade] for grade in GRADES])
+
+# Bin edges of the department GPA distributions
+GPA_BINS = np.arange(0, 4.5, 0.5)
+
+# Dean's list: at least this GPA over at least this many graded credits
+DEANS_LIST_GPA = 3.5
+DEANS_LIST_MIN_CREDITS = 12
+DEANS_LIST_LIMIT = 100
+
+
+def encode_grades(grades):
+    # Index into GRADES, -1 for ungraded
+    return pd.Categorical(grades, categories=GRADES).codes.astype(np.int8)
+
+
+def pair_ids(student_keys, course_keys):
+    # One int64 per enrollment, used to find the rows touched by logged changes
+    return (student_keys.astype(np.int64) << 32) | course_keys.astype(np.int64)
+
+
+class SnapshotState:
+    """One immutable, column-oriented copy of enrollments at a data version.
+
+    Enrollments are three parallel arrays (student key, course key, grade code);
+    course names and departments are stored once in ``course_dims``, indexed by course key.
+    """
+
+    def __init__(self, version, seq, students, courses, grades, course_dims):
+        self.version = version
+        self.seq = seq
+        self.students = students
+        self.courses = courses
+        self.grades = grades
+        self.course_dims = course_dims
+        # Course key -> row in course_dims, -1 for keys no longer present
+        self.course_index = np.full(int(course_dims.index.max()) + 1 if len(course_dims) else 1, -1, dtype=np.int32)
+        self.course_index[course_dims.index.to_numpy(dtype=np.int64)] = np.arange(len(course_dims), dtype=np.int32)
+
+    def __len__(self):
+        return len(self.students)
+
+    def nbytes(self):
+        return (self.students.nbytes + self.courses.nbytes + self.grades.nbytes + self.course_index.nbytes
+                + int(self.course_dims.memory_usage(deep=True).sum()))
+
+    @functools.cached_property
+    def course_rows(self):
+        # Row in course_dims of every enrollment's course, -1 where the course is gone
+        keys = np.minimum(self.courses, len(self.course_index) - 1)
+        return np.where(self.courses < len(self.course_index), self.course_index[keys], -1)
+
+    @functools.cached_property
+    def course_counts(self):
+        # Enrollments per course, aligned with course_dims; computed once per state
+        rows = self.course_rows
+        return np.bincount(rows[rows >= 0], minlength=len(self.course_dims))
+
+    def top_courses(self, limit=10):
+        counts = pd.Series(self.course_counts, index=self.course_dims["name"].values)
+        by_name = counts[counts > 0].groupby(level=0).sum().sort_values(ascending=False, kind="stable")
+        return [(name, int(count)) for name, count in by_name.head(limit).items()]
+
+    def course_popularity(self, limit=-1):
+        frame = self.course_dims.assign(enrollments=self.course_counts)
+        frame = frame[frame["department"].notna() & (frame["enrollments"] > 0)]
+        by_name = frame.groupby("name").agg(department=("department", "first"), enrollments=("enrollments", "sum"))
+        by_name = by_name.sort_values("enrollments", ascending=False, kind="stable")
+        if limit >= 0:
+            by_name = by_name.head(limit)
+        return [(name, department, int(count)) for name, department, count in by_name.itertuples()]
+
+    @functools.cached_property
+    def grade_counts(self):
+        return np.bincount(self.grades[self.grades >= 0], minlength=len(GRADES))
+
+    def grade_distribution(self):
+        # Same order as ORDER BY grade
+        return sorted((grade, int(count)) for grade, count in zip(GRADES, self.grade_counts) if count)
+
+    @functools.cached_property
+    def graded(self):
+        # Enrollments that count toward a GPA (graded, in a course with credits), with
+        # their credits and credit-weighted grade points
+        credits_by_row = self.course_dims["credits"].fillna(0).to_numpy(dtype=np.float64)
+        rows = self.course_rows
+        credits = np.where(rows >= 0, credits_by_row[rows], 0.0)
+        mask = (self.grades >= 0) & (credits > 0)
+        return mask, credits[mask], GRADE_POINT_VALUES[self.grades[mask]] * credits[mask]
+
+    @functools.cached_property
+    def student_gpas(self):
+        # Every student's GPA in one pass: credits and points summed per student key
+        mask, credits, points = self.graded
+        students = self.students[mask]
+        credit_sums = np.bincount(students, weights=credits)
+        point_sums = np.bincount(students, weights=points)
+        keys = np.flatnonzero(credit_sums)
+        return pd.DataFrame({
+            "credits": credit_sums[keys].astype(np.int64),
+            "gpa": point_sums[keys] / credit_sums[keys],
+        }, index=pd.Index(keys, name="student_key"))
+
+    @functools.cached_property
+    def department_student_gpas(self):
+        # GPA of each student over the courses of each department they took graded courses in
+        mask, credits, points = self.graded
+        codes, departments = pd.factorize(self.course_dims["department"])
+        frame = pd.DataFrame({
+            "department": codes[self.course_rows[mask]],
+            "student_key": self.students[mask],
+            "credits": credits,
+            "points": points,
+        })
+        frame = frame[frame["department"] >= 0].groupby(["department", "student_key"], sort=False).sum()
+        frame = frame.reset_index()
+        return pd.DataFrame({
+            "department": departments[frame["department"]],
+            "student_key": frame["student_key"],
+            "credits": frame["credits"].astype(np.int64),
+            "gpa": frame["points"] / frame["credits"],
+        })
+
+    @functools.cached_property
+    def department_gpa_distribution(self):
+        return summarize_department_gpas(self.department_student_gpas)
+
+
+def summarize_department_gpas(frame):
+    # Per-department GPA statistics, and student counts per GPA bin for charting
+    gpas = frame.groupby("department")["gpa"]
+    summary = pd.DataFrame({
+        "students": gpas.size(),
+        "mean_gpa": gpas.mean(),
+        "median_gpa": gpas.median(),
+        "p25_gpa": gpas.quantile(0.25),
+        "p75_gpa": gpas.quantile(0.75),
+    }).sort_index()
+    bins = np.clip(np.digitize(frame["gpa"], GPA_BINS) - 1, 0, len(GPA_BINS) - 2)
+    histogram = (frame.assign(bin_start=GPA_BINS[bins])
+                 .groupby(["department", "bin_start"]).size().rename("students").reset_index())
+    histogram["bin_end"] = histogram["bin_start"] + (GPA_BINS[1] - GPA_BINS[0])
+    return {"summary": summary, "histogram": histogram}
+
+
+def load_course_dims(conn):
+    frame = pd.read_sql_query("""
+    SELECT c.key, c.name, c.credits, d.name as department
+    FROM courses c
+    LEFT JOIN departments d ON c.department_id = d.id
+    """, conn)
+    return frame.set_index("key")
+
+
+def load_enrollments(conn):
+    students, courses, grades = [], [], []
+    cursor = conn.execute("SELECT student_key, course_key, grade FROM enrollments")
+    while True:
+        rows = cursor.fetchmany(LOAD_CHUNK_SIZE)
+        if not rows:
+            break
+        student_keys, course_keys, grade_values = zip(*rows)
+        students.append(np.array(student_keys, dtype=np.int32))
+        courses.append(np.array(course_keys, dtype=np.int32))
+        grades.append(encode_grades(grade_values))
+    if not students:
+        return np.array([], dtype=np.int32), np.array([], dtype=np.int32), np.array([], dtype=np.int8)
+    return np.concatenate(students), np.concatenate(courses), np.concatenate(grades)
+
+
+def apply_changes(state, changes):
+    # Only the last logged change per enrollment decides whether it is present and its grade
+    final = changes.drop_duplicates(["student_key", "course_key"], keep="last")
+    touched = pair_ids(final["student_key"].values, final["course_key"].values)
+    keep = ~np.isin(pair_ids(state.students, state.courses), touched)
+    added = final[final["op"] == "insert"]
+    return (
+        np.concatenate([state.students[keep], added["student_key"].values.astype(np.int32)]),
+        np.concatenate([state.courses[keep], added["course_key"].values.astype(np.int32)]),
+        np.concatenate([state.grades[keep], encode_grades(added["grade"].values)]),
+    )
+
+
+class EnrollmentSnapshot:
+    """Process-wide analytics copy of enrollments, refreshed when the data version moves.
+
+    A refresh reads only the rows added to ``enrollment_changes`` since the last one
+    and applies them in bulk; a full reload happens on first use or when the log has
+    been pruned past the snapshot. Each refresh builds a new SnapshotState, so
+    readers holding an older state are never affected.
+
+    Reads go through ``queries.reader``, so inside ``reading_from`` the copy is built
+    from that connection. With ``exact`` the state must be at the version the
+    connection reports rather than at least at it, as reports pin a version.
+    """
+
+    def __init__(self, exact=False):
+        self.exact = exact
+        self._lock = threading.Lock()
+        self._state = None
+        self.full_loads = 0
+        self.incremental_loads = 0
+        self.last_refresh_ms = None
+
+    def _current(self, state, version):
+        if state is None:
+            return False
+        return state.version == version if self.exact else state.version >= version
+
+    def get(self):
+        version = get_data_version()
+        state = self._state
+        if self._current(state, version):
+            return state
+        with self._lock:
+            # Another thread may have refreshed while this one waited
+            if not self._current(self._state, version):
+                start = time.perf_counter()
+                with queries.reader() as conn:
+                    self._state = self._refresh(conn, self._state)
+                self.last_refresh_ms = (time.perf_counter() - start) * 1000
+            return self._state
+
+    def _refresh(self, conn, state):
+        # One read transaction, so the version, the log and the tables agree
+        conn.execute("BEGIN")
+        try:
+            version = conn.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+            first_seq, last_seq = conn.execute("SELECT MIN(seq), MAX(seq) FROM enrollment_changes").fetchone()
+            last_seq = last_seq or 0
+            course_dims = load_course_dims(conn)
+            # Only forward: a state ahead of this log (a report pinned to an older copy) is reloaded
+            if state is not None and state.seq <= last_seq and (first_seq is None or first_seq <= state.seq + 1):
+                changes = pd.read_sql_query("""
+                SELECT op, student_key, course_key, grade
+                FROM enrollment_changes
+                WHERE seq > ?
+                ORDER BY seq
+                """, conn, params=(state.seq,))
+                columns = apply_changes(state, changes) if len(changes) else (state.students, state.courses, state.grades)
+                self.incremental_loads += 1
+            else:
+                columns = load_enrollments(conn)
+                self.full_loads += 1
+        finally:
+            conn.execute("COMMIT")
+        return SnapshotState(version, last_seq, *columns, course_dims)
+
+    def stats(self):
+        state = self._state
+        return {
+            "rows": len(state) if state is not None else 0,
+            "bytes": state.nbytes() if state is not None else 0,
+            "data_version": state.version if state is not None else None,
+            "full_loads": self.full_loads,
+            "incremental_loads": self.incremental_loads,
+            "last_refresh_ms": self.last_refresh_ms,
+        }
+
+
+# Shared by every session in this process
+enrollment_snapshot = EnrollmentSnapshot()
+
+# Built from the report snapshot file for reports running inside reading_from
+report_enrollment_snapshot = EnrollmentSnapshot(exact=True)
+
+
+def current_state():
+    # Reports read the same copy of the database as the rest of their queries
+    if queries.reading_connection() is not None:
+        return report_enrollment_snapshot.get()
+    return enrollment_snapshot.get()
+
+
+def top_courses(limit=10):
+    if not USE_SNAPSHOT:
+        return get_top_courses(limit)
+    return current_state().top_courses(limit)
+
+
+def grade_distribution():
+    if not USE_SNAPSHOT:
+        return get_grade_distribution()
+    return current_state().grade_distribution()
+
+
+def course_popularity(limit=-1):
+    if not USE_SNAPSHOT:
+        return get_course_popularity(limit)
+    return current_state().course_popularity(limit)
+
+
+def student_gpas():
+    # Indexed by student key: graded credits and credit-weighted GPA
+    if not USE_SNAPSHOT:
+        return get_student_gpas()
+    return current_state().student_gpas
+
+
+def department_gpa_distribution():
+    if not USE_SNAPSHOT:
+        return summarize_department_gpas(get_department_student_gpas())
+    return current_state().department_gpa_distribution
+
+
+def deans_list(min_gpa=DEANS_LIST_GPA, min_credits=DEANS_LIST_MIN_CREDITS, limit=DEANS_LIST_LIMIT):
+    # The highest GPAs among eligible students, and how many are eligible in total
+    gpas = student_gpas()
+    eligible = gpas[(gpas["gpa"] >= min_gpa) & (gpas["credits"] >= min_credits)]
+    top = eligible.sort_values(["gpa", "credits"], ascending=False, kind="stable").head(limit)
+    students = get_students_by_key(tuple(int(key) for key in top.index))
+    top = students.join(top, on="student_key", how="inner").sort_values(["gpa", "credits"], ascending=False,
+                                                                         kind="stable")
+    return top.drop(columns="student_key"), len(eligible)
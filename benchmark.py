@@ -0,0 +1,291 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import analytics
+import datagen
+import queries
+import schedule
+from cache import query_cache
+
+DEFAULT_DATA_DIR = "benchmark_data"
+DEFAULT_REPEAT = 5
+
+# A query counts as a regression when its median is this many times the baseline and
+# at least REGRESSION_MIN_MS slower, so timer noise on sub-millisecond queries is ignored
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_MS = 1.0
+
+
+def pick_samples(conn):
+    # Representative ids for the detail pages: a typical student, and the busiest
+    # course, department and instructor, so per-entity queries see the worst case
+    c = conn.cursor()
+    c.execute("""
+    SELECT s.id FROM students s
+    JOIN enrollments e ON e.student_key = s.key
+    GROUP BY s.key
+    ORDER BY COUNT(*), s.key
+    LIMIT 1 OFFSET (SELECT count / 2 FROM entity_counts WHERE entity = 'students')
+    """)
+    student_id = c.fetchone()[0]
+    c.execute("""
+    SELECT c.id FROM courses c
+    JOIN enrollments e ON e.course_key = c.key
+    GROUP BY c.key
+    ORDER BY COUNT(*) DESC
+    LIMIT 1
+    """)
+    course_id = c.fetchone()[0]
+    c.execute("SELECT department_id FROM department_stats ORDER BY enrollments DESC LIMIT 1")
+    department_id = c.fetchone()[0]
+    c.execute("""
+    SELECT instructor_id FROM courses
+    WHERE instructor_id IS NOT NULL
+    GROUP BY instructor_id
+    ORDER BY COUNT(*) DESC
+    LIMIT 1
+    """)
+    instructor_id = c.fetchone()[0]
+    c.execute("SELECT p.name FROM persons p WHERE p.id = ?", (student_id,))
+    student_name = c.fetchone()[0]
+    return {
+        "student_id": student_id,
+        "student_name": student_name,
+        "course_id": course_id,
+        "department_id": department_id,
+        "instructor_id": instructor_id,
+    }
+
+
+def deep_page_cursor(view, sort_by, pages, page_size):
+    # Walk forward to a late page so the seek cost is measured away from the start
+    cursor = None
+    for _ in range(pages):
+        _, next_cursor = queries.get_page.__wrapped__(view, sort_by, cursor, page_size)
+        if next_cursor is None:
+            break
+        cursor = next_cursor
+    return cursor
+
+
+def snapshot_property(name):
+    # Evaluate a cached property of the current snapshot state without its memoized value
+    return getattr(analytics.SnapshotState, name).func(analytics.enrollment_snapshot.get())
+
+
+def benchmark_cases(samples):
+    # (name, function, args) for every query path the pages run
+    q = queries
+    first_name = samples["student_name"].split()[0]
+    return [
+        # Dashboard
+        ("get_entity_counts", q.get_entity_counts, ()),
+        ("get_department_stats", q.get_department_stats, ()),
+        ("get_top_courses", q.get_top_courses, ()),
+        ("get_grade_distribution", q.get_grade_distribution, ()),
+        # Full-table loaders
+        ("get_departments", q.get_departments, ()),
+        ("get_courses", q.get_courses, ()),
+        ("get_students", q.get_students, ()),
+        ("get_instructors", q.get_instructors, ()),
+        ("get_enrollments", q.get_enrollments, ()),
+        # Paged views
+        ("get_page students first", q.get_page, ("students", "name", None, 50)),
+        ("get_page students deep", q.get_page,
+         ("students", "name", deep_page_cursor("students", "name", 20, 250), 250)),
+        ("get_page instructors first", q.get_page, ("instructors", "name", None, 50)),
+        ("get_page courses first", q.get_page, ("courses", "name", None, 50)),
+        # Enrollments page
+        ("get_course_options", q.get_course_options, ()),
+        ("get_student_options", q.get_student_options, ()),
+        ("get_filtered_enrollments all", q.get_filtered_enrollments, ()),
+        ("get_filtered_enrollments course", q.get_filtered_enrollments, (samples["course_id"],)),
+        ("get_filtered_enrollments student", q.get_filtered_enrollments, (None, samples["student_id"])),
+        ("get_filtered_enrollments grade", q.get_filtered_enrollments, (None, None, "F")),
+        # Search
+        ("search_entities browse", q.search_entities, ("student", "")),
+        ("search_entities student", q.search_entities, ("student", first_name)),
+        ("search_entities course", q.search_entities, ("course", "intro")),
+        # Detail pages
+        ("get_student", q.get_student, (samples["student_id"],)),
+        ("get_student_courses", q.get_student_courses, (samples["student_id"],)),
+        ("get_available_courses", q.get_available_courses, (samples["student_id"],)),
+        ("get_instructor", q.get_instructor, (samples["instructor_id"],)),
+        ("get_instructor_courses", q.get_instructor_courses, (samples["instructor_id"],)),
+        ("get_assignable_courses", q.get_assignable_courses, (samples["instructor_id"],)),
+        ("get_course", q.get_course, (samples["course_id"],)),
+        ("get_course_roster", q.get_course_roster, (samples["course_id"],)),
+        ("get_department_courses", q.get_department_courses, (samples["department_id"],)),
+        ("get_department_instructors", q.get_department_instructors, (samples["department_id"],)),
+        # Reports
+        ("get_course_popularity", q.get_course_popularity, ()),
+        ("get_course_popularity top", q.get_course_popularity, (10,)),
+        ("get_student_distribution age", q.get_student_distribution, ("age",)),
+        ("get_student_distribution program", q.get_student_distribution, ("program",)),
+        ("get_student_distribution entry_year", q.get_student_distribution, ("entry_year",)),
+        ("get_average_salaries position", q.get_average_salaries, ("position",)),
+        ("get_average_salaries department", q.get_average_salaries, ("department",)),
+        ("get_salary_histogram", q.get_salary_histogram, ()),
+        # Transcripts and GPAs
+        ("get_transcript", q.get_transcript, (samples["student_id"],)),
+        ("get_student_gpas", q.get_student_gpas, ()),
+        ("get_department_student_gpas", q.get_department_student_gpas, ()),
+        # In-memory analytics snapshot (the first call pays for the full load)
+        ("snapshot full load", lambda: analytics.EnrollmentSnapshot().get(), ()),
+        ("snapshot top_courses", lambda: analytics.enrollment_snapshot.get().top_courses(10), ()),
+        ("snapshot grade_distribution", lambda: analytics.enrollment_snapshot.get().grade_distribution(), ()),
+        ("snapshot course_popularity", lambda: analytics.enrollment_snapshot.get().course_popularity(10), ()),
+        # GPAs are memoized per snapshot state, so time the computation itself
+        ("snapshot student_gpas", snapshot_property, ("student_gpas",)),
+        ("snapshot department_gpa_distribution", snapshot_property, ("department_gpa_distribution",)),
+        ("analytics deans_list", analytics.deans_list, ()),
+        # Timetables
+        ("get_student_meetings", q.get_student_meetings, (samples["student_id"],)),
+        ("get_all_meetings", q.get_all_meetings, ()),
+        ("registration_conflicts", schedule.registration_conflicts, (samples["student_id"], samples["course_id"])),
+        ("conflict_report", schedule.conflict_report, ()),
+        # Seats and waitlists
+        ("get_course_waitlist", q.get_course_waitlist, (samples["course_id"],)),
+        ("get_student_waitlists", q.get_student_waitlists, (samples["student_id"],)),
+    ]
+
+
+def count_rows(result):
+    # get_page returns (rows, next cursor)
+    if isinstance(result, tuple):
+        result = result[0]
+    return len(result)
+
+
+def time_calls(func, args, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, result
+
+
+def run_scale(path, scale, repeat, progress=print):
+    queries.use_database(path)
+    # Results from another database must not leak into this run
+    query_cache.clear()
+    analytics.enrollment_snapshot = analytics.EnrollmentSnapshot()
+    with queries.pool.reader() as conn:
+        samples = pick_samples(conn)
+
+    results = []
+    for name, func, args in benchmark_cases(samples):
+        # Time the query itself, bypassing the shared result cache
+        uncached = getattr(func, "__wrapped__", func)
+        timings, result = time_calls(uncached, args, repeat)
+        record = {
+            "scale": scale,
+            "query": name,
+            "rows": count_rows(result),
+            "median_ms": round(statistics.median(timings), 3),
+            "min_ms": round(min(timings), 3),
+            "max_ms": round(max(timings), 3),
+            "cached_ms": None,
+        }
+        if uncached is not func:
+            func(*args)
+            cached_timings, _ = time_calls(func, args, repeat)
+            record["cached_ms"] = round(statistics.median(cached_timings), 3)
+        results.append(record)
+        progress(f"  {name:<36} {record['median_ms']:>10.2f} ms  {record['rows']:>9} rows")
+    return results
+
+
+def ensure_database(data_dir, scale, seed):
+    # Generated databases are reused between runs; delete the file to regenerate it
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"{scale}-seed{seed}.db")
+    if not os.path.exists(path):
+        print(f"Generating {scale} database at {path}")
+        datagen.main([path, "--scale", scale, "--seed", str(seed)])
+    return path
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def compare(results, baseline_path, threshold=REGRESSION_RATIO):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["scale"], r["query"]): r["median_ms"] for r in baseline["results"]}
+    regressions = 0
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit')})")
+    for record in results:
+        before = previous.get((record["scale"], record["query"]))
+        if before is None:
+            continue
+        ratio = record["median_ms"] / before if before else float("inf")
+        flag = ""
+        if ratio > threshold and record["median_ms"] - before >= REGRESSION_MIN_MS:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"  {record['scale']:<7} {record['query']:<36} {before:>10.2f} -> {record['median_ms']:>10.2f} ms"
+              f"  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every query path against generated databases")
+    parser.add_argument("--scale", nargs="+", choices=list(datagen.SCALES.keys()), default=["small"])
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="where generated databases are kept")
+    parser.add_argument("--output", help="results file (default: benchmark-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against; exits 1 on regressions")
+    args = parser.parse_args(argv)
+
+    commit = git_revision()
+    report = {
+        "commit": commit,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "scales": {scale: datagen.SCALES[scale] for scale in args.scale},
+        "results": [],
+    }
+    for scale in args.scale:
+        path = ensure_database(args.data_dir, scale, args.seed)
+        print(f"Benchmarking {scale} ({path})")
+        report["results"].extend(run_scale(path, scale, args.repeat))
+
+    output = args.output or f"benchmark-{commit or 'unknown'}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        return 1 if compare(report["results"], args.compare) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
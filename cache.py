@@ -0,0 +1,92 @@
+import sys
+import threading
+from collections import OrderedDict
+
+# Default memory budget for cached query results (bytes)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def estimate_size(value):
+    # DataFrames and Series report their real footprint, everything else falls back to sys.getsizeof
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if hasattr(value, "memory_usage"):
+        # A DataFrame reports per column, a Series a single number
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    return sys.getsizeof(value)
+
+
+class DataCache:
+    """Process-wide LRU cache of query results, invalidated by the database data version.
+
+    Entries are shared between all Streamlit sessions, so cached values must be
+    treated as read-only by callers.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, key, version, loader):
+        with self._lock:
+            if self._version is None or version > self._version:
+                # Data changed since the entries were stored, drop everything
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+            entry = self._entries.get(key) if version == self._version else None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Older readers (version below the current one) load without storing
+        value = loader()
+        size = estimate_size(value)
+
+        with self._lock:
+            # Only keep the result if no newer write happened while loading
+            if version == self._version and size <= self.max_bytes:
+                if key in self._entries:
+                    self._bytes -= self._entries.pop(key)[1]
+                self._entries[key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._bytes -= evicted_size
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        # Also forget the data version, so the cache can follow a different database
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "data_version": self._version,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared by every session in this process; survives Streamlit reruns because
+# imported modules are not re-executed
+query_cache = DataCache()
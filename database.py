@@ -0,0 +1,1073 @@
+import argparse
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from querylog import InstrumentedConnection
+
+DB_PATH = "university.db"
+
+# Tables whose row counts are maintained in entity_counts
+COUNTED_TABLES = ["students", "instructors", "courses", "departments", "enrollments"]
+
+# Tables whose writes invalidate cached query results
+VERSIONED_TABLES = ["departments", "courses", "persons", "students", "instructors", "enrollments"]
+
+# Letter grades in display order
+GRADES = ["A", "A-", "B+", "B", "B-", "C+", "C", "C-", "D+", "D", "F"]
+
+# Grade points per letter on the 4.0 scale, weighted by course credits in GPAs
+GRADE_POINTS = {"A": 4.0, "A-": 3.7, "B+": 3.3, "B": 3.0, "B-": 2.7, "C+": 2.3, "C": 2.0, "C-": 1.7,
+                "D+": 1.3, "D": 1.0, "F": 0.0}
+
+# Connection pragmas applied every time a connection is opened. The journal mode is
+# persistent in the database file, so only the writer needs to set it.
+JOURNAL_PRAGMA = "PRAGMA journal_mode = WAL"
+PRAGMAS = [
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",  # 64 MB page cache
+    "PRAGMA mmap_size = 268435456",  # 256 MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+]
+
+# Read-only connections kept open for concurrent readers
+DEFAULT_READERS = 4
+
+# Seconds a checkout or a locked database may block before giving up
+CONNECTION_TIMEOUT = 30
+
+# Enrollment changes kept for incremental snapshot refreshes; older ones are pruned
+CHANGE_LOG_SIZE = 100000
+
+# Activity feed retention: entries older than ACTIVITY_RETENTION_DAYS, or beyond the newest
+# ACTIVITY_MAX_ROWS, are pruned ACTIVITY_PRUNE_BATCH rows per transaction
+ACTIVITY_RETENTION_DAYS = 365
+ACTIVITY_MAX_ROWS = 1000000
+ACTIVITY_PRUNE_BATCH = 10000
+# Seconds between prunes in a long-running process
+ACTIVITY_PRUNE_INTERVAL = 3600
+
+# Names looked up by the activity triggers; a missing row still produces an entry
+STUDENT_NAME_SQL = """COALESCE((SELECT p.name FROM students s JOIN persons p ON p.id = s.id
+                               WHERE s.key = {row}.student_key), 'Unknown student')"""
+COURSE_NAME_SQL = "COALESCE((SELECT name FROM courses WHERE key = {row}.course_key), 'unknown course')"
+
+
+def create_base_tables(c):
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS departments (
+        id TEXT PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL
+    )
+    ''')
+
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS courses (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        department_id TEXT,
+        instructor_id TEXT,
+        credits INTEGER,
+        description TEXT,
+        FOREIGN KEY (department_id) REFERENCES departments(id),
+        FOREIGN KEY (instructor_id) REFERENCES instructors(id)
+    )
+    ''')
+
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS persons (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        age INTEGER,
+        email TEXT UNIQUE,
+        type TEXT NOT NULL
+    )
+    ''')
+
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS students (
+        id TEXT PRIMARY KEY,
+        roll_number TEXT UNIQUE NOT NULL,
+        entry_year INTEGER,
+        program TEXT,
+        FOREIGN KEY (id) REFERENCES persons(id)
+    )
+    ''')
+
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS instructors (
+        id TEXT PRIMARY KEY,
+        salary REAL,
+        department_id TEXT,
+        position TEXT,
+        FOREIGN KEY (id) REFERENCES persons(id),
+        FOREIGN KEY (department_id) REFERENCES departments(id)
+    )
+    ''')
+
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS enrollments (
+        student_id TEXT,
+        course_id TEXT,
+        enrollment_date TEXT,
+        grade TEXT,
+        PRIMARY KEY (student_id, course_id),
+        FOREIGN KEY (student_id) REFERENCES students(id),
+        FOREIGN KEY (course_id) REFERENCES courses(id)
+    )
+    ''')
+
+
+def create_entity_counts(c):
+    # Row counters kept up to date by triggers so the dashboard never has to scan tables
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS entity_counts (
+        entity TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    )
+    ''')
+
+    for table in COUNTED_TABLES:
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table}
+        BEGIN
+            UPDATE entity_counts SET count = count + 1 WHERE entity = '{table}';
+        END
+        ''')
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table}
+        BEGIN
+            UPDATE entity_counts SET count = count - 1 WHERE entity = '{table}';
+        END
+        ''')
+        # Seed the counter from the existing rows the first time only
+        c.execute(f"INSERT OR IGNORE INTO entity_counts (entity, count) SELECT '{table}', COUNT(*) FROM {table}")
+
+
+def create_data_version(c):
+    # Data version bumped on every write so cached query results can be invalidated
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS data_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    ''')
+    c.execute("INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)")
+
+    for table in VERSIONED_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            c.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table}
+            BEGIN
+                UPDATE data_version SET version = version + 1 WHERE id = 1;
+            END
+            ''')
+
+
+def create_secondary_indexes(c):
+    # Foreign key and filter columns used by the detail pages, joins and reports
+    c.execute("CREATE INDEX IF NOT EXISTS idx_enrollments_course_id ON enrollments (course_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_courses_department_id ON courses (department_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_courses_instructor_id ON courses (instructor_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_instructors_department_id ON instructors (department_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_persons_type ON persons (type)")
+    c.execute("ANALYZE")
+
+
+def create_sort_indexes(c):
+    # Covering orderings for keyset pagination of the View tabs
+    c.execute("CREATE INDEX IF NOT EXISTS idx_persons_type_name ON persons (type, name, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_courses_name ON courses (name, id)")
+    c.execute("ANALYZE")
+
+
+def compact_enrollment_keys(c):
+    # Give students and courses INTEGER PRIMARY KEY surrogates and store enrollments by
+    # those keys in a WITHOUT ROWID table. The TEXT ids stay as unique external ids.
+    c.execute('''
+    CREATE TABLE students_compact (
+        key INTEGER PRIMARY KEY,
+        id TEXT UNIQUE NOT NULL,
+        roll_number TEXT UNIQUE NOT NULL,
+        entry_year INTEGER,
+        program TEXT,
+        FOREIGN KEY (id) REFERENCES persons(id)
+    )
+    ''')
+    c.execute('''
+    INSERT INTO students_compact (id, roll_number, entry_year, program)
+    SELECT id, roll_number, entry_year, program FROM students ORDER BY rowid
+    ''')
+
+    c.execute('''
+    CREATE TABLE courses_compact (
+        key INTEGER PRIMARY KEY,
+        id TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        department_id TEXT,
+        instructor_id TEXT,
+        credits INTEGER,
+        description TEXT,
+        FOREIGN KEY (department_id) REFERENCES departments(id),
+        FOREIGN KEY (instructor_id) REFERENCES instructors(id)
+    )
+    ''')
+    c.execute('''
+    INSERT INTO courses_compact (id, name, department_id, instructor_id, credits, description)
+    SELECT id, name, department_id, instructor_id, credits, description FROM courses ORDER BY rowid
+    ''')
+
+    c.execute('''
+    CREATE TABLE enrollments_compact (
+        student_key INTEGER NOT NULL,
+        course_key INTEGER NOT NULL,
+        enrollment_date TEXT,
+        grade TEXT,
+        PRIMARY KEY (student_key, course_key),
+        FOREIGN KEY (student_key) REFERENCES students(key),
+        FOREIGN KEY (course_key) REFERENCES courses(key)
+    ) WITHOUT ROWID
+    ''')
+    # Enrollments pointing at missing students or courses cannot be keyed and are dropped
+    c.execute('''
+    INSERT INTO enrollments_compact (student_key, course_key, enrollment_date, grade)
+    SELECT s.key, co.key, e.enrollment_date, e.grade
+    FROM enrollments e
+    JOIN students_compact s ON e.student_id = s.id
+    JOIN courses_compact co ON e.course_id = co.id
+    ''')
+
+    for table in ("enrollments", "students", "courses"):
+        c.execute(f"DROP TABLE {table}")
+        c.execute(f"ALTER TABLE {table}_compact RENAME TO {table}")
+
+    # Dropping the old tables dropped their triggers and indexes, so put them back
+    c.execute("UPDATE entity_counts SET count = (SELECT COUNT(*) FROM enrollments) WHERE entity = 'enrollments'")
+    create_entity_counts(c)
+    create_data_version(c)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_enrollments_course_key ON enrollments (course_key)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_courses_department_id ON courses (department_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_courses_instructor_id ON courses (instructor_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_courses_name ON courses (name, id)")
+    c.execute("ANALYZE")
+
+
+def create_search_index(c):
+    # FTS5 index over people and course names, emails and roll numbers for type-ahead search.
+    # kind is indexed so searches can be restricted to one entity type inside MATCH.
+    c.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        kind,
+        entity_id UNINDEXED,
+        name,
+        email,
+        roll_number,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    ''')
+
+    # Students and instructors are indexed when their detail row is inserted, after the persons row
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS students_search_insert AFTER INSERT ON students
+    BEGIN
+        INSERT INTO search_index (kind, entity_id, name, email, roll_number)
+        SELECT 'student', NEW.id, p.name, p.email, NEW.roll_number FROM persons p WHERE p.id = NEW.id;
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS students_search_update AFTER UPDATE OF roll_number ON students
+    BEGIN
+        UPDATE search_index SET roll_number = NEW.roll_number WHERE entity_id = NEW.id;
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS instructors_search_insert AFTER INSERT ON instructors
+    BEGIN
+        INSERT INTO search_index (kind, entity_id, name, email, roll_number)
+        SELECT 'instructor', NEW.id, p.name, p.email, NULL FROM persons p WHERE p.id = NEW.id;
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS persons_search_update AFTER UPDATE OF name, email ON persons
+    BEGIN
+        UPDATE search_index SET name = NEW.name, email = NEW.email WHERE entity_id = NEW.id;
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS courses_search_insert AFTER INSERT ON courses
+    BEGIN
+        INSERT INTO search_index (kind, entity_id, name, email, roll_number)
+        VALUES ('course', NEW.id, NEW.name, NULL, NULL);
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS courses_search_update AFTER UPDATE OF name ON courses
+    BEGIN
+        UPDATE search_index SET name = NEW.name WHERE entity_id = NEW.id;
+    END
+    ''')
+    for table in ("students", "instructors", "courses"):
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM search_index WHERE entity_id = OLD.id;
+        END
+        ''')
+
+    # Index the rows that already exist
+    c.execute("DELETE FROM search_index")
+    c.execute('''
+    INSERT INTO search_index (kind, entity_id, name, email, roll_number)
+    SELECT 'student', s.id, p.name, p.email, s.roll_number FROM students s JOIN persons p ON s.id = p.id
+    ''')
+    c.execute('''
+    INSERT INTO search_index (kind, entity_id, name, email, roll_number)
+    SELECT 'instructor', i.id, p.name, p.email, NULL FROM instructors i JOIN persons p ON i.id = p.id
+    ''')
+    c.execute('''
+    INSERT INTO search_index (kind, entity_id, name, email, roll_number)
+    SELECT 'course', id, name, NULL, NULL FROM courses
+    ''')
+    c.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+
+
+def rebuild_department_stats(c):
+    # Recompute the materialized department statistics from the base tables
+    c.execute("DELETE FROM department_students")
+    c.execute('''
+    INSERT INTO department_students (department_id, student_key, enrollments)
+    SELECT c.department_id, e.student_key, COUNT(*)
+    FROM enrollments e
+    JOIN courses c ON e.course_key = c.key
+    WHERE c.department_id IS NOT NULL
+    GROUP BY c.department_id, e.student_key
+    ''')
+    c.execute("DELETE FROM department_stats")
+    c.execute('''
+    INSERT INTO department_stats (department_id, instructors, courses, students, enrollments)
+    SELECT
+        d.id,
+        (SELECT COUNT(*) FROM instructors WHERE department_id = d.id),
+        (SELECT COUNT(*) FROM courses WHERE department_id = d.id),
+        (SELECT COUNT(*) FROM department_students WHERE department_id = d.id),
+        (SELECT COALESCE(SUM(enrollments), 0) FROM department_students WHERE department_id = d.id)
+    FROM departments d
+    ''')
+
+
+def create_department_stats(c):
+    # Per-department counters maintained incrementally by triggers. department_students
+    # reference-counts each student's enrollments per department so distinct students
+    # can be tracked without rescanning enrollments.
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS department_stats (
+        department_id TEXT PRIMARY KEY,
+        instructors INTEGER NOT NULL DEFAULT 0,
+        courses INTEGER NOT NULL DEFAULT 0,
+        students INTEGER NOT NULL DEFAULT 0,
+        enrollments INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS department_students (
+        department_id TEXT NOT NULL,
+        student_key INTEGER NOT NULL,
+        enrollments INTEGER NOT NULL,
+        PRIMARY KEY (department_id, student_key)
+    ) WITHOUT ROWID
+    ''')
+
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS departments_stats_insert AFTER INSERT ON departments
+    BEGIN
+        INSERT OR IGNORE INTO department_stats (department_id) VALUES (NEW.id);
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS departments_stats_delete AFTER DELETE ON departments
+    BEGIN
+        DELETE FROM department_stats WHERE department_id = OLD.id;
+        DELETE FROM department_students WHERE department_id = OLD.id;
+    END
+    ''')
+
+    # Instructors and courses only move a single counter
+    for table, column in (("instructors", "instructors"), ("courses", "courses")):
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_stats_insert AFTER INSERT ON {table}
+        BEGIN
+            UPDATE department_stats SET {column} = {column} + 1 WHERE department_id = NEW.department_id;
+        END
+        ''')
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_stats_delete AFTER DELETE ON {table}
+        BEGIN
+            UPDATE department_stats SET {column} = {column} - 1 WHERE department_id = OLD.department_id;
+        END
+        ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS instructors_stats_move AFTER UPDATE OF department_id ON instructors
+    BEGIN
+        UPDATE department_stats SET instructors = instructors - 1 WHERE department_id = OLD.department_id;
+        UPDATE department_stats SET instructors = instructors + 1 WHERE department_id = NEW.department_id;
+    END
+    ''')
+
+    # Moving a course carries its enrollments to the new department (rare, so set-based)
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS courses_stats_move AFTER UPDATE OF department_id ON courses
+    BEGIN
+        UPDATE department_students SET enrollments = enrollments - 1
+        WHERE department_id = OLD.department_id
+          AND student_key IN (SELECT student_key FROM enrollments WHERE course_key = OLD.key);
+        DELETE FROM department_students WHERE department_id = OLD.department_id AND enrollments = 0;
+        INSERT INTO department_students (department_id, student_key, enrollments)
+        SELECT NEW.department_id, student_key, 1 FROM enrollments WHERE course_key = NEW.key AND NEW.department_id IS NOT NULL
+        ON CONFLICT (department_id, student_key) DO UPDATE SET enrollments = enrollments + 1;
+        UPDATE department_stats SET
+            courses = (SELECT COUNT(*) FROM courses WHERE department_id = department_stats.department_id),
+            students = (SELECT COUNT(*) FROM department_students WHERE department_id = department_stats.department_id),
+            enrollments = (SELECT COALESCE(SUM(enrollments), 0) FROM department_students WHERE department_id = department_stats.department_id)
+        WHERE department_id IN (OLD.department_id, NEW.department_id);
+    END
+    ''')
+
+    # An enrollment adds one to the department total, and one distinct student when it is
+    # the student's first enrollment in that department
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_stats_insert AFTER INSERT ON enrollments
+    BEGIN
+        INSERT INTO department_students (department_id, student_key, enrollments)
+        SELECT department_id, NEW.student_key, 1 FROM courses WHERE key = NEW.course_key AND department_id IS NOT NULL
+        ON CONFLICT (department_id, student_key) DO UPDATE SET enrollments = enrollments + 1;
+        UPDATE department_stats SET
+            enrollments = enrollments + 1,
+            students = students + (SELECT enrollments = 1 FROM department_students
+                                   WHERE department_id = department_stats.department_id AND student_key = NEW.student_key)
+        WHERE department_id = (SELECT department_id FROM courses WHERE key = NEW.course_key);
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_stats_delete AFTER DELETE ON enrollments
+    BEGIN
+        UPDATE department_students SET enrollments = enrollments - 1
+        WHERE department_id = (SELECT department_id FROM courses WHERE key = OLD.course_key)
+          AND student_key = OLD.student_key;
+        UPDATE department_stats SET
+            enrollments = enrollments - 1,
+            students = students - (SELECT enrollments = 0 FROM department_students
+                                   WHERE department_id = department_stats.department_id AND student_key = OLD.student_key)
+        WHERE department_id = (SELECT department_id FROM courses WHERE key = OLD.course_key);
+        DELETE FROM department_students
+        WHERE department_id = (SELECT department_id FROM courses WHERE key = OLD.course_key)
+          AND student_key = OLD.student_key AND enrollments = 0;
+    END
+    ''')
+
+    rebuild_department_stats(c)
+
+
+def create_enrollment_changes(c):
+    # Append-only log of enrollment writes so in-memory copies can catch up with only
+    # what changed. Each insert prunes the entry CHANGE_LOG_SIZE positions back, which
+    # keeps the log bounded; a reader that fell further behind reloads in full.
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS enrollment_changes (
+        seq INTEGER PRIMARY KEY,
+        op TEXT NOT NULL,
+        student_key INTEGER NOT NULL,
+        course_key INTEGER NOT NULL,
+        grade TEXT
+    )
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS enrollment_changes_prune AFTER INSERT ON enrollment_changes
+    BEGIN
+        DELETE FROM enrollment_changes WHERE seq <= NEW.seq - {CHANGE_LOG_SIZE};
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_log_insert AFTER INSERT ON enrollments
+    BEGIN
+        INSERT INTO enrollment_changes (op, student_key, course_key, grade)
+        VALUES ('insert', NEW.student_key, NEW.course_key, NEW.grade);
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_log_delete AFTER DELETE ON enrollments
+    BEGIN
+        INSERT INTO enrollment_changes (op, student_key, course_key, grade)
+        VALUES ('delete', OLD.student_key, OLD.course_key, NULL);
+    END
+    ''')
+    # An update is logged as the old row going away and the new row arriving
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_log_update AFTER UPDATE ON enrollments
+    BEGIN
+        INSERT INTO enrollment_changes (op, student_key, course_key, grade)
+        VALUES ('delete', OLD.student_key, OLD.course_key, NULL);
+        INSERT INTO enrollment_changes (op, student_key, course_key, grade)
+        VALUES ('insert', NEW.student_key, NEW.course_key, NEW.grade);
+    END
+    ''')
+
+
+def create_activity_log(c):
+    # Append-only feed of user-visible events, written by triggers so every write path
+    # (forms, grade rosters, CSV imports) is covered. Newest-first reads seek on the
+    # created_at index; rows only ever leave through prune_activity_log.
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS activity_log (
+        id INTEGER PRIMARY KEY,
+        created_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+        type TEXT NOT NULL,
+        description TEXT NOT NULL
+    )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_activity_log_created_at ON activity_log (created_at)")
+
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS persons_activity_insert AFTER INSERT ON persons
+    BEGIN
+        INSERT INTO activity_log (type, description)
+        VALUES (NEW.type, CASE NEW.type
+            WHEN 'student' THEN 'New student ' || NEW.name || ' registered'
+            WHEN 'instructor' THEN 'New instructor ' || NEW.name || ' joined'
+            ELSE 'New ' || NEW.type || ' ' || NEW.name || ' added'
+        END);
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS courses_activity_insert AFTER INSERT ON courses
+    BEGIN
+        INSERT INTO activity_log (type, description) VALUES ('course', 'New course ' || NEW.name || ' added');
+    END
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS enrollments_activity_insert AFTER INSERT ON enrollments
+    BEGIN
+        INSERT INTO activity_log (type, description)
+        VALUES ('enrollment', {STUDENT_NAME_SQL.format(row="NEW")} || ' enrolled in ' || {COURSE_NAME_SQL.format(row="NEW")});
+    END
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS enrollments_activity_delete AFTER DELETE ON enrollments
+    BEGIN
+        INSERT INTO activity_log (type, description)
+        VALUES ('drop', {STUDENT_NAME_SQL.format(row="OLD")} || ' dropped ' || {COURSE_NAME_SQL.format(row="OLD")});
+    END
+    ''')
+    # Rosters rewrite every grade they show; only actual changes are logged
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS enrollments_activity_grade AFTER UPDATE OF grade ON enrollments
+    WHEN NEW.grade IS NOT OLD.grade
+    BEGIN
+        INSERT INTO activity_log (type, description)
+        VALUES ('grade', {STUDENT_NAME_SQL.format(row="NEW")} || CASE
+            WHEN NEW.grade IS NULL THEN ' had the grade cleared in '
+            ELSE ' received ' || NEW.grade || ' in '
+        END || {COURSE_NAME_SQL.format(row="NEW")});
+    END
+    ''')
+
+
+def prune_activity_batch(c, retention_days=ACTIVITY_RETENTION_DAYS, max_rows=ACTIVITY_MAX_ROWS,
+                         batch_size=ACTIVITY_PRUNE_BATCH):
+    # Ids grow with time, so everything to prune lies below one id: the oldest entry
+    # inside the retention window, or the max_rows-th newest id, whichever is higher.
+    # Both are index seeks and the delete is a rowid range, so a batch never scans the log.
+    c.execute("SELECT MAX(id) FROM activity_log")
+    last_id = c.fetchone()[0]
+    if last_id is None:
+        return 0
+    c.execute("""
+    SELECT id FROM activity_log
+    WHERE created_at >= datetime('now', 'localtime', ?)
+    ORDER BY created_at, id
+    LIMIT 1
+    """, (f"-{retention_days} days",))
+    row = c.fetchone()
+    keep_from = max(row[0] if row else last_id + 1, last_id - max_rows + 1)
+    c.execute("""
+    DELETE FROM activity_log WHERE id IN (
+        SELECT id FROM activity_log WHERE id < ? ORDER BY id LIMIT ?
+    )
+    """, (keep_from, batch_size))
+    return c.rowcount
+
+
+def prune_activity_log(writer, retention_days=ACTIVITY_RETENTION_DAYS, max_rows=ACTIVITY_MAX_ROWS,
+                       batch_size=ACTIVITY_PRUNE_BATCH):
+    # writer() is a context manager yielding a connection that commits on exit, such as
+    # ConnectionPool.writer. Each batch commits on its own so other writers never wait long.
+    total = 0
+    while True:
+        with writer() as conn:
+            deleted = prune_activity_batch(conn.cursor(), retention_days, max_rows, batch_size)
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+# Outcome of the periodic prunes, shown in the app's sidebar
+activity_prune_status = {"runs": 0, "pruned": 0, "last_error": None}
+
+
+def prune_activity_periodically(writer, interval=ACTIVITY_PRUNE_INTERVAL, stop=None, status=activity_prune_status):
+    # Prune now and then every interval seconds until stop (a threading.Event) is set;
+    # meant for a daemon thread, so a failed prune is kept in status["last_error"] and
+    # retried at the next interval
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            status["pruned"] += prune_activity_log(writer)
+            status["last_error"] = None
+        except Exception as e:
+            status["last_error"] = f"{type(e).__name__}: {e}"
+        status["runs"] += 1
+        stop.wait(interval)
+
+
+def create_course_meetings(c):
+    # Weekly meeting times and rooms. Enrollments are per course, so each course is a
+    # single section and its meetings are that section's timetable. Times are minutes
+    # after midnight on day 0 (Monday) to 6 (Sunday), end exclusive.
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS course_meetings (
+        id INTEGER PRIMARY KEY,
+        course_key INTEGER NOT NULL,
+        day INTEGER NOT NULL CHECK (day BETWEEN 0 AND 6),
+        start_minute INTEGER NOT NULL CHECK (start_minute BETWEEN 0 AND 1439),
+        end_minute INTEGER NOT NULL CHECK (end_minute > start_minute AND end_minute <= 1440),
+        room TEXT,
+        FOREIGN KEY (course_key) REFERENCES courses(key)
+    )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_course_meetings_course_key ON course_meetings (course_key)")
+    # Room bookings are checked by seeking to the room and day, then scanning by start time
+    c.execute("CREATE INDEX IF NOT EXISTS idx_course_meetings_room ON course_meetings (room, day, start_minute)")
+
+    # Timetable changes invalidate cached results like any other write
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS course_meetings_version_{event.lower()} AFTER {event} ON course_meetings
+        BEGIN
+            UPDATE data_version SET version = version + 1 WHERE id = 1;
+        END
+        ''')
+
+
+def create_course_capacity(c):
+    # Seat limits and ordered waitlists. A NULL capacity means no limit. A seat is held
+    # by an ungraded enrollment (graded ones are finished courses), and course_seats
+    # keeps that count per course so a registration finds a free seat with one
+    # primary key lookup instead of counting the course's enrollments.
+    c.execute("ALTER TABLE courses ADD COLUMN capacity INTEGER CHECK (capacity >= 0)")
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS course_seats (
+        course_key INTEGER PRIMARY KEY,
+        enrolled INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    c.execute('''
+    INSERT OR REPLACE INTO course_seats (course_key, enrolled)
+    SELECT c.key, (SELECT COUNT(*) FROM enrollments e WHERE e.course_key = c.key AND e.grade IS NULL)
+    FROM courses c
+    ''')
+    # Queue order is the id; (course_key) indexes carry the rowid, so a course's queue
+    # is read in order straight from the index
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS course_waitlist (
+        id INTEGER PRIMARY KEY,
+        course_key INTEGER NOT NULL,
+        student_key INTEGER NOT NULL,
+        requested_at TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+        UNIQUE (student_key, course_key),
+        FOREIGN KEY (course_key) REFERENCES courses(key),
+        FOREIGN KEY (student_key) REFERENCES students(key)
+    )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_course_waitlist_course_key ON course_waitlist (course_key)")
+
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS courses_seats_insert AFTER INSERT ON courses
+    BEGIN
+        INSERT OR IGNORE INTO course_seats (course_key) VALUES (NEW.key);
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS courses_seats_delete AFTER DELETE ON courses
+    BEGIN
+        DELETE FROM course_seats WHERE course_key = OLD.key;
+        DELETE FROM course_waitlist WHERE course_key = OLD.key;
+    END
+    ''')
+    # However a student gets enrolled, they no longer wait for the course
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_seats_insert AFTER INSERT ON enrollments
+    BEGIN
+        UPDATE course_seats SET enrolled = enrolled + (NEW.grade IS NULL) WHERE course_key = NEW.course_key;
+        DELETE FROM course_waitlist WHERE student_key = NEW.student_key AND course_key = NEW.course_key;
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_seats_delete AFTER DELETE ON enrollments
+    BEGIN
+        UPDATE course_seats SET enrolled = enrolled - (OLD.grade IS NULL) WHERE course_key = OLD.course_key;
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_seats_grade AFTER UPDATE OF grade ON enrollments
+    WHEN (NEW.grade IS NULL) != (OLD.grade IS NULL)
+    BEGIN
+        UPDATE course_seats SET enrolled = enrolled + (NEW.grade IS NULL) - (OLD.grade IS NULL)
+        WHERE course_key = NEW.course_key;
+    END
+    ''')
+    for event in ("INSERT", "DELETE"):
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS course_waitlist_version_{event.lower()} AFTER {event} ON course_waitlist
+        BEGIN
+            UPDATE data_version SET version = version + 1 WHERE id = 1;
+        END
+        ''')
+
+
+def count_graded_seats(c):
+    # A graded enrollment keeps its seat: grading does not reopen a course whose term is
+    # over, and clearing a grade cannot push a full course over capacity
+    c.execute("DROP TRIGGER IF EXISTS enrollments_seats_grade")
+    c.execute("DROP TRIGGER IF EXISTS enrollments_seats_insert")
+    c.execute("DROP TRIGGER IF EXISTS enrollments_seats_delete")
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_seats_insert AFTER INSERT ON enrollments
+    BEGIN
+        UPDATE course_seats SET enrolled = enrolled + 1 WHERE course_key = NEW.course_key;
+        DELETE FROM course_waitlist WHERE student_key = NEW.student_key AND course_key = NEW.course_key;
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS enrollments_seats_delete AFTER DELETE ON enrollments
+    BEGIN
+        UPDATE course_seats SET enrolled = enrolled - 1 WHERE course_key = OLD.course_key;
+    END
+    ''')
+    c.execute('''
+    UPDATE course_seats
+    SET enrolled = (SELECT COUNT(*) FROM enrollments e WHERE e.course_key = course_seats.course_key)
+    ''')
+
+
+def create_search_entries(c):
+    # Move the search rows into a plain table and make search_index an external-content
+    # FTS5 table over it keyed by rowid. Entity edits find their row through the
+    # (entity_id, kind) index, and the index entries are replaced by rowid, instead of
+    # filtering the FTS table on its unindexed entity_id column, which scans all of it.
+    for trigger in ("students_search_insert", "students_search_update", "instructors_search_insert",
+                    "persons_search_update", "courses_search_insert", "courses_search_update",
+                    "students_search_delete", "instructors_search_delete", "courses_search_delete"):
+        c.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    c.execute("DROP TABLE IF EXISTS search_index")
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS search_entries (
+        id INTEGER PRIMARY KEY,
+        kind TEXT NOT NULL,
+        entity_id TEXT NOT NULL,
+        name TEXT,
+        email TEXT,
+        roll_number TEXT,
+        UNIQUE (entity_id, kind)
+    )
+    ''')
+    c.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        kind,
+        entity_id UNINDEXED,
+        name,
+        email,
+        roll_number,
+        content = 'search_entries',
+        content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    ''')
+
+    # An external-content index is kept in step by hand: an entry is removed by giving
+    # FTS5 the values it was indexed with
+    columns = "kind, entity_id, name, email, roll_number"
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS search_entries_insert AFTER INSERT ON search_entries
+    BEGIN
+        INSERT INTO search_index (rowid, {columns})
+        VALUES (NEW.id, NEW.kind, NEW.entity_id, NEW.name, NEW.email, NEW.roll_number);
+    END
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS search_entries_delete AFTER DELETE ON search_entries
+    BEGIN
+        INSERT INTO search_index (search_index, rowid, {columns})
+        VALUES ('delete', OLD.id, OLD.kind, OLD.entity_id, OLD.name, OLD.email, OLD.roll_number);
+    END
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS search_entries_update AFTER UPDATE ON search_entries
+    BEGIN
+        INSERT INTO search_index (search_index, rowid, {columns})
+        VALUES ('delete', OLD.id, OLD.kind, OLD.entity_id, OLD.name, OLD.email, OLD.roll_number);
+        INSERT INTO search_index (rowid, {columns})
+        VALUES (NEW.id, NEW.kind, NEW.entity_id, NEW.name, NEW.email, NEW.roll_number);
+    END
+    ''')
+
+    # Students and instructors are indexed when their detail row is inserted, after the persons row
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS students_search_insert AFTER INSERT ON students
+    BEGIN
+        INSERT INTO search_entries ({columns})
+        SELECT 'student', NEW.id, p.name, p.email, NEW.roll_number FROM persons p WHERE p.id = NEW.id;
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS students_search_update AFTER UPDATE OF roll_number ON students
+    BEGIN
+        UPDATE search_entries SET roll_number = NEW.roll_number WHERE entity_id = NEW.id AND kind = 'student';
+    END
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS instructors_search_insert AFTER INSERT ON instructors
+    BEGIN
+        INSERT INTO search_entries ({columns})
+        SELECT 'instructor', NEW.id, p.name, p.email, NULL FROM persons p WHERE p.id = NEW.id;
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS persons_search_update AFTER UPDATE OF name, email ON persons
+    BEGIN
+        UPDATE search_entries SET name = NEW.name, email = NEW.email WHERE entity_id = NEW.id AND kind = NEW.type;
+    END
+    ''')
+    c.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS courses_search_insert AFTER INSERT ON courses
+    BEGIN
+        INSERT INTO search_entries ({columns}) VALUES ('course', NEW.id, NEW.name, NULL, NULL);
+    END
+    ''')
+    c.execute('''
+    CREATE TRIGGER IF NOT EXISTS courses_search_update AFTER UPDATE OF name ON courses
+    BEGIN
+        UPDATE search_entries SET name = NEW.name WHERE entity_id = NEW.id AND kind = 'course';
+    END
+    ''')
+    for table, kind in (("students", "student"), ("instructors", "instructor"), ("courses", "course")):
+        c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM search_entries WHERE entity_id = OLD.id AND kind = '{kind}';
+        END
+        ''')
+
+    # Index the rows that already exist in one pass
+    c.execute(f'''
+    INSERT INTO search_entries ({columns})
+    SELECT 'student', s.id, p.name, p.email, s.roll_number FROM students s JOIN persons p ON s.id = p.id
+    UNION ALL
+    SELECT 'instructor', i.id, p.name, p.email, NULL FROM instructors i JOIN persons p ON i.id = p.id
+    UNION ALL
+    SELECT 'course', id, name, NULL, NULL FROM courses
+    ''')
+    c.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+
+
+# Ordered schema migrations. The schema version stored in PRAGMA user_version is
+# the number of migrations applied, so new migrations must only ever be appended.
+MIGRATIONS = [
+    ("Create base tables", create_base_tables),
+    ("Add trigger-maintained entity counters", create_entity_counts),
+    ("Add data version counter", create_data_version),
+    ("Add secondary indexes", create_secondary_indexes),
+    ("Add pagination sort indexes", create_sort_indexes),
+    ("Store enrollments by integer surrogate keys", compact_enrollment_keys),
+    ("Add full-text search index", create_search_index),
+    ("Add trigger-maintained department statistics", create_department_stats),
+    ("Log enrollment changes for incremental snapshots", create_enrollment_changes),
+    ("Add activity feed log", create_activity_log),
+    ("Add course meeting times and rooms", create_course_meetings),
+    ("Add course capacity and waitlists", create_course_capacity),
+    ("Keep seats held by graded enrollments", count_graded_seats),
+    ("Key the search index by rowid", create_search_entries),
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def apply_pragmas(conn, read_only=False):
+    if not read_only:
+        conn.execute(JOURNAL_PRAGMA)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    # Apply each pending migration in its own transaction together with the version bump
+    applied = []
+    current = get_schema_version(conn)
+    for version, (description, migration) in enumerate(MIGRATIONS, start=1):
+        if version <= current:
+            continue
+        c = conn.cursor()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            migration(c)
+            c.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append((version, description))
+    return applied
+
+
+def connect(path=DB_PATH, read_only=False, factory=sqlite3.Connection):
+    # Connections are handed between Streamlit threads, but only ever used by one at a time
+    if read_only:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False,
+                               timeout=CONNECTION_TIMEOUT, factory=factory)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=CONNECTION_TIMEOUT, factory=factory)
+    apply_pragmas(conn, read_only)
+    return conn
+
+
+# Database setup
+def setup_database(path=DB_PATH, factory=sqlite3.Connection):
+    conn = connect(path, factory=factory)
+    migrate(conn)
+    return conn
+
+
+class ConnectionPool:
+    """Read-only connections for parallel readers plus one dedicated writer.
+
+    Under WAL readers never block the writer or each other, so each request checks
+    out its own reader. Writes are serialized on the single writer connection,
+    which commits when the ``writer()`` block exits cleanly and rolls back otherwise.
+    """
+
+    def __init__(self, path=DB_PATH, readers=DEFAULT_READERS, timeout=CONNECTION_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        # The writer runs the migrations first so readers always see the current schema
+        self._writer = setup_database(path, factory=InstrumentedConnection)
+        self._writer_lock = threading.Lock()
+        self._readers = queue.LifoQueue()
+        for _ in range(readers):
+            self._readers.put(connect(path, read_only=True, factory=InstrumentedConnection))
+        self.size = readers
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "reader": {"checkouts": 0, "waits": 0, "wait_time": 0.0, "max_wait": 0.0},
+            "writer": {"checkouts": 0, "waits": 0, "wait_time": 0.0, "max_wait": 0.0},
+        }
+
+    def _record(self, kind, waited, wait_time):
+        with self._metrics_lock:
+            metrics = self._metrics[kind]
+            metrics["checkouts"] += 1
+            if waited:
+                metrics["waits"] += 1
+                metrics["wait_time"] += wait_time
+                metrics["max_wait"] = max(metrics["max_wait"], wait_time)
+
+    @contextmanager
+    def reader(self):
+        start = time.perf_counter()
+        try:
+            conn = self._readers.get_nowait()
+            waited = False
+        except queue.Empty:
+            try:
+                conn = self._readers.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No reader connection available after {self.timeout}s")
+            waited = True
+        self._record("reader", waited, time.perf_counter() - start)
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def writer(self):
+        start = time.perf_counter()
+        waited = not self._writer_lock.acquire(blocking=False)
+        if waited and not self._writer_lock.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Writer connection not available after {self.timeout}s")
+        self._record("writer", waited, time.perf_counter() - start)
+        try:
+            yield self._writer
+            self._writer.commit()
+        except Exception:
+            self._writer.rollback()
+            raise
+        finally:
+            self._writer_lock.release()
+
+    def stats(self):
+        with self._metrics_lock:
+            stats = {kind: dict(metrics) for kind, metrics in self._metrics.items()}
+        stats["readers_idle"] = self._readers.qsize()
+        stats["readers_total"] = self.size
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=DB_PATH, readers=DEFAULT_READERS):
+    # One pool per database file, shared by every session in the process
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = ConnectionPool(path, readers)
+        return _pools[path]
+
+
+if __name__ == "__main__":
+    # Upgrade an existing database in place:
+    # python database.py [path] [--rebuild-department-stats] [--prune-activity]
+    parser = argparse.ArgumentParser(description="Apply schema migrations and maintenance to the database")
+    parser.add_argument("path", nargs="?", default=DB_PATH)
+    parser.add_argument("--rebuild-department-stats", action="store_true",
+                        help="recompute department_stats from the base tables")
+    parser.add_argument("--prune-activity", action="store_true",
+                        help=f"drop activity older than {ACTIVITY_RETENTION_DAYS} days or beyond the newest "
+                             f"{ACTIVITY_MAX_ROWS} entries")
+    args = parser.parse_args()
+
+    conn = connect(args.path)
+    print(f"Schema version before: {get_schema_version(conn)}")
+    applied = migrate(conn)
+    for version, description in applied:
+        print(f"Applied migration {version}: {description}")
+    print(f"Schema version after: {get_schema_version(conn)} (latest {SCHEMA_VERSION})")
+    if args.rebuild_department_stats:
+        with conn:
+            rebuild_department_stats(conn.cursor())
+        print("Rebuilt department statistics")
+    if args.prune_activity:
+        print(f"Pruned {prune_activity_log(lambda: conn)} activity entries")
+    if applied:
+        # Rebuilt tables leave free pages behind; reclaim them so the file actually shrinks
+        conn.execute("VACUUM")
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    print(f"Database size: {page_count * page_size / 1024 / 1024:.1f} MB")
+    conn.close()
@@ -0,0 +1,255 @@
+import argparse
+import bisect
+import itertools
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, timedelta
+
+from database import setup_database, GRADES
+
+# Preset database sizes; "large" is roughly a production-sized university
+SCALES = {
+    "small": {"departments": 10, "instructors": 200, "courses": 400, "students": 5000, "enrollments": 50000},
+    "medium": {"departments": 25, "instructors": 800, "courses": 1500, "students": 25000, "enrollments": 400000},
+    "large": {"departments": 50, "instructors": 2000, "courses": 4000, "students": 100000, "enrollments": 2000000},
+}
+
+# Rows per executemany call
+INSERT_BATCH_SIZE = 10000
+
+FIRST_NAMES = [
+    "Aisha", "Ali", "Amelia", "Ana", "Ben", "Carlos", "Chen", "Chloe", "Daniel", "David", "Elena", "Emma",
+    "Fatima", "Grace", "Hana", "Hassan", "Ivan", "James", "Jin", "Julia", "Kai", "Laura", "Leo", "Lina",
+    "Lucas", "Maria", "Maya", "Mohammed", "Nadia", "Noah", "Olga", "Omar", "Priya", "Rahul", "Sara",
+    "Sofia", "Tariq", "Tom", "Wei", "Yusuf", "Zara", "Zoë",
+]
+LAST_NAMES = [
+    "Ahmed", "Brown", "Chen", "Costa", "Davis", "Garcia", "Gupta", "Hansen", "Ivanova", "Johnson", "Khan",
+    "Kim", "Kowalski", "Lee", "Lopez", "Martin", "Müller", "Nguyen", "Novak", "Okafor", "Patel", "Rossi",
+    "Santos", "Schmidt", "Silva", "Smith", "Suzuki", "Tanaka", "Wang", "Williams", "Wilson", "Yilmaz",
+]
+SUBJECTS = [
+    "Computer Science", "Mathematics", "Physics", "Chemistry", "Biology", "Economics", "History",
+    "Philosophy", "Psychology", "Sociology", "Linguistics", "Statistics", "Electrical Engineering",
+    "Mechanical Engineering", "Civil Engineering", "Architecture", "Music", "Fine Arts", "Geography",
+    "Political Science", "Law", "Medicine", "Nursing", "Pharmacy", "Astronomy", "Geology", "Education",
+    "Business", "Finance", "Marketing", "Journalism", "Anthropology", "Literature", "Theology",
+]
+COURSE_TOPICS = [
+    "Introduction to", "Foundations of", "Topics in", "Advanced", "Applied", "Seminar in",
+    "Methods in", "Principles of", "Research in", "History of",
+]
+POSITIONS = ["Lecturer", "Assistant Professor", "Associate Professor", "Professor"]
+POSITION_WEIGHTS = [30, 35, 22, 13]
+POSITION_SALARY = {"Lecturer": 55000, "Assistant Professor": 72000, "Associate Professor": 88000, "Professor": 110000}
+# Roughly a B-centred distribution
+GRADE_WEIGHTS = [8, 9, 11, 13, 11, 10, 9, 7, 6, 5, 11]
+FIRST_ENTRY_YEAR = 2018
+# Weekly meeting patterns as (days, minutes per meeting); every pattern starts on the
+# same 90-minute grid, so two meetings on one day overlap only when their starts match
+MEETING_PATTERNS = [((0, 2, 4), 50), ((1, 3), 75), ((0, 2), 75)]
+MEETING_STARTS = list(range(8 * 60, 17 * 60, 90))
+BUILDINGS = ["Main", "North", "Science", "Arts", "Library", "Engineering"]
+# Meetings a room can hold per week is len(MEETING_STARTS) * 5, so about this many courses each
+COURSES_PER_ROOM = 8
+
+
+def zipf_weights(count, exponent):
+    # Rank-based popularity: a few items are very popular, most are not
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def make_id(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def insert_rows(conn, sql, rows):
+    c = conn.cursor()
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, INSERT_BATCH_SIZE))
+        if not batch:
+            break
+        c.executemany(sql, batch)
+
+
+def generate(conn, departments, instructors, courses, students, enrollments, seed=42, progress=print):
+    """Fill an empty database with synthetic, deterministically seeded data.
+
+    Department sizes and course popularity follow Zipf-like skew, and students take
+    most of their courses in their home department, so per-department and per-course
+    queries see the uneven distributions a real university has.
+    """
+    rng = random.Random(seed)
+    c = conn.cursor()
+    current_year = date.today().year
+
+    dept_names = [SUBJECTS[i % len(SUBJECTS)] + (f" {i // len(SUBJECTS) + 1}" if i >= len(SUBJECTS) else "")
+                  for i in range(departments)]
+    dept_ids = [make_id(rng) for _ in range(departments)]
+    dept_weights = zipf_weights(departments, 0.7)
+    insert_rows(conn, "INSERT INTO departments (id, name) VALUES (?, ?)", zip(dept_ids, dept_names))
+    progress(f"{departments} departments")
+
+    # Instructors
+    instructor_ids = [make_id(rng) for _ in range(instructors)]
+    instructor_depts = rng.choices(range(departments), weights=dept_weights, k=instructors)
+    persons = []
+    details = []
+    for n, (instructor_id, dept) in enumerate(zip(instructor_ids, instructor_depts)):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        position = rng.choices(POSITIONS, weights=POSITION_WEIGHTS)[0]
+        salary = round(POSITION_SALARY[position] * rng.uniform(0.85, 1.25), -2)
+        persons.append((instructor_id, f"Dr. {first} {last}", rng.randint(30, 68),
+                        f"{first}.{last}.{n}@faculty.example.edu".lower(), "instructor"))
+        details.append((instructor_id, salary, dept_ids[dept], position))
+    insert_rows(conn, "INSERT INTO persons (id, name, age, email, type) VALUES (?, ?, ?, ?, ?)", persons)
+    insert_rows(conn, "INSERT INTO instructors (id, salary, department_id, position) VALUES (?, ?, ?, ?)", details)
+    progress(f"{instructors} instructors")
+
+    # Courses, taught by an instructor of the same department where one exists
+    dept_instructors = {}
+    for instructor_id, dept in zip(instructor_ids, instructor_depts):
+        dept_instructors.setdefault(dept, []).append(instructor_id)
+    course_depts = rng.choices(range(departments), weights=dept_weights, k=courses)
+    course_rows = []
+    for n, dept in enumerate(course_depts):
+        topic = rng.choice(COURSE_TOPICS)
+        teachers = dept_instructors.get(dept) or instructor_ids
+        instructor_id = rng.choice(teachers) if teachers and rng.random() < 0.95 else None
+        course_rows.append((make_id(rng), f"{topic} {SUBJECTS[dept % len(SUBJECTS)]} {100 + n}", dept_ids[dept],
+                            instructor_id, rng.choice([2, 3, 3, 3, 4, 4]), f"Synthetic course {n}"))
+    insert_rows(conn, """INSERT INTO courses (id, name, department_id, instructor_id, credits, description)
+                 VALUES (?, ?, ?, ?, ?, ?)""", course_rows)
+    c.execute("SELECT id, key FROM courses")
+    course_keys = dict(c.fetchall())
+    progress(f"{courses} courses")
+
+    # Students
+    student_depts = rng.choices(range(departments), weights=dept_weights, k=students)
+    persons = []
+    details = []
+    student_years = []
+    for n, dept in enumerate(student_depts):
+        student_id = make_id(rng)
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        entry_year = rng.randint(FIRST_ENTRY_YEAR, current_year)
+        persons.append((student_id, f"{first} {last}", rng.randint(17, 35),
+                        f"{first}.{last}.{n}@students.example.edu".lower(), "student"))
+        details.append((student_id, f"S{entry_year}{n:07d}", entry_year, f"BS {SUBJECTS[dept % len(SUBJECTS)]}"))
+        student_years.append(entry_year)
+    insert_rows(conn, "INSERT INTO persons (id, name, age, email, type) VALUES (?, ?, ?, ?, ?)", persons)
+    insert_rows(conn, "INSERT INTO students (id, roll_number, entry_year, program) VALUES (?, ?, ?, ?)", details)
+    c.execute("SELECT key FROM students ORDER BY key")
+    student_keys = [row[0] for row in c.fetchall()]
+    progress(f"{students} students")
+
+    # Enrollments: course popularity is skewed overall and within each department
+    course_order = list(range(courses))
+    rng.shuffle(course_order)
+    popularity = dict(zip(course_order, zipf_weights(courses, 0.9)))
+    all_cumulative = list(itertools.accumulate(popularity[i] for i in range(courses)))
+    by_dept = {}
+    for i, dept in enumerate(course_depts):
+        by_dept.setdefault(dept, []).append(i)
+    dept_cumulative = {dept: list(itertools.accumulate(popularity[i] for i in members))
+                       for dept, members in by_dept.items()}
+    course_key_list = [course_keys[row[0]] for row in course_rows]
+
+    def pick_course(dept):
+        if dept in by_dept and rng.random() < 0.7:
+            members, cumulative = by_dept[dept], dept_cumulative[dept]
+        else:
+            members, cumulative = None, all_cumulative
+        index = bisect.bisect_left(cumulative, rng.random() * cumulative[-1])
+        index = min(index, len(cumulative) - 1)
+        return members[index] if members else index
+
+    def enrollment_rows():
+        per_student = enrollments / max(students, 1)
+        remaining = enrollments
+        for n, (student_key, dept, entry_year) in enumerate(zip(student_keys, student_depts, student_years)):
+            if remaining <= 0:
+                break
+            # Load varies per student; the last students absorb any rounding difference
+            wanted = max(1, round(rng.gauss(per_student, per_student / 3)))
+            wanted = min(wanted, remaining, courses, 200)
+            if n == students - 1:
+                wanted = min(remaining, courses)
+            chosen = set()
+            attempts = 0
+            while len(chosen) < wanted and attempts < wanted * 10:
+                chosen.add(pick_course(dept))
+                attempts += 1
+            for course in chosen:
+                year = rng.randint(entry_year, current_year)
+                enrolled_on = date(year, 1, 1) + timedelta(days=rng.randint(0, 364))
+                # Recent enrollments are often still ungraded
+                graded = year < current_year or rng.random() < 0.3
+                grade = rng.choices(GRADES, weights=GRADE_WEIGHTS)[0] if graded else None
+                yield (student_key, course_key_list[course], min(enrolled_on, date.today()).isoformat(), grade)
+            remaining -= len(chosen)
+
+    insert_rows(conn, "INSERT INTO enrollments (student_key, course_key, enrollment_date, grade) VALUES (?, ?, ?, ?)",
+                enrollment_rows())
+    c.execute("SELECT count FROM entity_counts WHERE entity = 'enrollments'")
+    progress(f"{c.fetchone()[0]} enrollments")
+
+    # Meeting times, from a generator of their own so the rows above stay as they were
+    meeting_rng = random.Random(seed + 1)
+    rooms = [f"{BUILDINGS[n % len(BUILDINGS)]} {100 + n // len(BUILDINGS)}"
+             for n in range(courses // COURSES_PER_ROOM + 1)]
+    booked = set()
+    meetings = []
+    for course_key in course_key_list:
+        days, length = meeting_rng.choice(MEETING_PATTERNS)
+        start = meeting_rng.choice(MEETING_STARTS)
+        # A few tries for a free room, otherwise the course has no room yet
+        room = None
+        for candidate in meeting_rng.sample(rooms, min(len(rooms), 10)):
+            if not any((candidate, day, start) in booked for day in days):
+                room = candidate
+                booked.update((room, day, start) for day in days)
+                break
+        meetings.extend((course_key, day, start, start + length, room) for day in days)
+    insert_rows(conn, """INSERT INTO course_meetings (course_key, day, start_minute, end_minute, room)
+                 VALUES (?, ?, ?, ?, ?)""", meetings)
+    progress(f"{len(meetings)} course meetings")
+    conn.commit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic university database for load testing")
+    parser.add_argument("path", help="database file to create")
+    parser.add_argument("--scale", choices=list(SCALES.keys()), default="small",
+                        help="preset sizes (default: %(default)s); individual options override it")
+    for name in SCALES["small"]:
+        parser.add_argument(f"--{name}", type=int)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--force", action="store_true", help="replace the file if it already exists")
+    args = parser.parse_args(argv)
+
+    if os.path.exists(args.path):
+        if not args.force:
+            parser.error(f"{args.path} already exists (use --force to replace it)")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.path + suffix):
+                os.remove(args.path + suffix)
+
+    sizes = {name: getattr(args, name) if getattr(args, name) is not None else value
+             for name, value in SCALES[args.scale].items()}
+    start = time.perf_counter()
+    conn = setup_database(args.path)
+    generate(conn, seed=args.seed,
+             progress=lambda message: print(f"{time.perf_counter() - start:7.1f}s  {message}"), **sizes)
+    conn.execute("ANALYZE")
+    conn.close()
+    print(f"Wrote {args.path} ({os.path.getsize(args.path) / 1024 / 1024:.1f} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import csv
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows fetched from the cursor and written per step
+EXPORT_CHUNK_SIZE = 10000
+
+EXPORT_FORMATS = {
+    "CSV": {"extension": "csv", "mime": "text/csv"},
+    "Parquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+# Export query and column types for each table; the types keep Parquet chunks consistent
+EXPORTS = {
+    "students": {
+        "query": """
+        SELECT p.id, p.name, p.age, p.email, s.roll_number, s.entry_year, s.program
+        FROM persons p
+        JOIN students s ON p.id = s.id
+        WHERE p.type = 'student'
+        """,
+        "types": ["string", "string", "int64", "string", "string", "int64", "string"],
+    },
+    "instructors": {
+        "query": """
+        SELECT p.id, p.name, p.age, p.email, i.salary, d.name as department, i.position
+        FROM persons p
+        JOIN instructors i ON p.id = i.id
+        LEFT JOIN departments d ON i.department_id = d.id
+        WHERE p.type = 'instructor'
+        """,
+        "types": ["string", "string", "int64", "string", "float64", "string", "string"],
+    },
+    "courses": {
+        "query": """
+        SELECT c.id, c.name, d.name as department, p.name as instructor, c.credits, c.description
+        FROM courses c
+        LEFT JOIN departments d ON c.department_id = d.id
+        LEFT JOIN persons p ON c.instructor_id = p.id
+        """,
+        "types": ["string", "string", "string", "string", "int64", "string"],
+    },
+    "departments": {
+        "query": "SELECT id, name FROM departments",
+        "types": ["string", "string"],
+    },
+}
+
+
+def iter_chunks(cursor, chunk_size):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+def write_csv(cursor, columns, path, chunk_size):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rows in iter_chunks(cursor, chunk_size):
+            writer.writerows(rows)
+
+
+def write_parquet(cursor, columns, types, path, chunk_size):
+    schema = pa.schema([(column, pa.type_for_alias(type_name)) for column, type_name in zip(columns, types)])
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in iter_chunks(cursor, chunk_size):
+            # Transpose the row chunk into columns and write it as one row group
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+
+
+def export_table(conn, table, file_format="CSV", chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream an export query into a temporary file and return its path.
+
+    Rows are read from the cursor ``chunk_size`` at a time, so memory use is
+    bounded by the chunk size rather than by the table size. The caller owns the
+    returned file and is responsible for deleting it.
+    """
+    spec = EXPORTS[table]
+    extension = EXPORT_FORMATS[file_format]["extension"]
+    with tempfile.NamedTemporaryFile(prefix=f"{table}_", suffix=f".{extension}", delete=False) as f:
+        path = f.name
+
+    cursor = conn.cursor()
+    cursor.execute(spec["query"])
+    columns = [description[0] for description in cursor.description]
+    if file_format == "Parquet":
+        write_parquet(cursor, columns, spec["types"], path, chunk_size)
+    else:
+        write_csv(cursor, columns, path, chunk_size)
+    cursor.close()
+    return path
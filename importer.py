@@ -0,0 +1,268 @@
+import argparse
+import json
+import math
+import os
+import sys
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+from database import setup_database, DB_PATH, GRADES
+
+# Rows validated and committed per transaction
+DEFAULT_CHUNK_SIZE = 5000
+
+# Values per IN (...) lookup, kept below SQLite's host parameter limit
+LOOKUP_BATCH_SIZE = 900
+
+# Columns accepted for each import kind, and the subset that must be present
+IMPORT_COLUMNS = {
+    "students": ["name", "age", "email", "roll_number", "entry_year", "program"],
+    "instructors": ["name", "age", "email", "salary", "department", "position"],
+    "enrollments": ["roll_number", "course_id", "enrollment_date", "grade"],
+}
+
+REQUIRED_COLUMNS = {
+    "students": ["name", "email", "roll_number"],
+    "instructors": ["name", "email", "department"],
+    "enrollments": ["roll_number", "course_id"],
+}
+
+INSERT_SQL = {
+    "persons": "INSERT INTO persons (id, name, age, email, type) VALUES (?, ?, ?, ?, ?)",
+    "students": "INSERT INTO students (id, roll_number, entry_year, program) VALUES (?, ?, ?, ?)",
+    "instructors": "INSERT INTO instructors (id, salary, department_id, position) VALUES (?, ?, ?, ?)",
+    "enrollments": "INSERT INTO enrollments (student_key, course_key, enrollment_date, grade) VALUES (?, ?, ?, ?)",
+}
+
+
+def lookup(c, query, values):
+    # Run a "... IN ({})" lookup in batches and return all matching rows
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        batch = values[start:start + LOOKUP_BATCH_SIZE]
+        c.execute(query.format(", ".join("?" * len(batch))), batch)
+        rows.extend(c.fetchall())
+    return rows
+
+
+def parse_number(value, field, cast=int, minimum=None, maximum=None):
+    # Empty optional numbers become NULL
+    if value == "":
+        return None
+    try:
+        number = cast(value)
+    except ValueError:
+        raise ValueError(f"{field} must be a number, got '{value}'")
+    # float() accepts "nan" and "inf", which no bound check catches
+    if not math.isfinite(number):
+        raise ValueError(f"{field} must be a finite number, got '{value}'")
+    if minimum is not None and maximum is not None and not minimum <= number <= maximum:
+        raise ValueError(f"{field} must be between {minimum} and {maximum}, got {value}")
+    if minimum is not None and number < minimum:
+        raise ValueError(f"{field} must be at least {minimum}, got {value}")
+    if maximum is not None and number > maximum:
+        raise ValueError(f"{field} must be at most {maximum}, got {value}")
+    return number
+
+
+def check_required(record, kind):
+    missing = [column for column in REQUIRED_COLUMNS[kind] if not record[column]]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+
+def existing_emails(c, records):
+    return {row[0] for row in lookup(c, "SELECT email FROM persons WHERE email IN ({})",
+                                     {r["email"] for r in records if r["email"]})}
+
+
+def prepare_students(c, records, first_row, context):
+    taken_rolls = {row[0] for row in lookup(c, "SELECT roll_number FROM students WHERE roll_number IN ({})",
+                                            {r["roll_number"] for r in records if r["roll_number"]})}
+    taken_emails = existing_emails(c, records)
+    rows = {"persons": [], "students": []}
+    errors = []
+    for row_number, record in enumerate(records, start=first_row):
+        try:
+            check_required(record, "students")
+            age = parse_number(record["age"], "age", minimum=16, maximum=100)
+            entry_year = parse_number(record["entry_year"], "entry_year", minimum=2000, maximum=datetime.now().year)
+            if record["roll_number"] in taken_rolls:
+                raise ValueError(f"roll number {record['roll_number']} already exists")
+            if record["email"] in taken_emails:
+                raise ValueError(f"email {record['email']} already exists")
+        except ValueError as e:
+            errors.append((row_number, str(e)))
+            continue
+        # Later rows in the same chunk must not reuse these keys either
+        taken_rolls.add(record["roll_number"])
+        taken_emails.add(record["email"])
+        student_id = str(uuid.uuid4())
+        rows["persons"].append((student_id, record["name"], age, record["email"], "student"))
+        rows["students"].append((student_id, record["roll_number"], entry_year, record["program"] or None))
+    return rows, errors
+
+
+def prepare_instructors(c, records, first_row, context):
+    taken_emails = existing_emails(c, records)
+    rows = {"persons": [], "instructors": []}
+    errors = []
+    for row_number, record in enumerate(records, start=first_row):
+        try:
+            check_required(record, "instructors")
+            age = parse_number(record["age"], "age", minimum=22, maximum=100)
+            salary = parse_number(record["salary"], "salary", cast=float, minimum=0)
+            if record["department"] not in context["departments"]:
+                raise ValueError(f"unknown department {record['department']}")
+            if record["email"] in taken_emails:
+                raise ValueError(f"email {record['email']} already exists")
+        except ValueError as e:
+            errors.append((row_number, str(e)))
+            continue
+        taken_emails.add(record["email"])
+        instructor_id = str(uuid.uuid4())
+        rows["persons"].append((instructor_id, record["name"], age, record["email"], "instructor"))
+        rows["instructors"].append((instructor_id, salary, context["departments"][record["department"]],
+                                    record["position"] or None))
+    return rows, errors
+
+
+def prepare_enrollments(c, records, first_row, context):
+    student_keys = dict(lookup(c, "SELECT roll_number, key FROM students WHERE roll_number IN ({})",
+                               {r["roll_number"] for r in records if r["roll_number"]}))
+    enrolled = set(lookup(c, "SELECT student_key, course_key FROM enrollments WHERE student_key IN ({})",
+                          set(student_keys.values())))
+    today = datetime.now().strftime("%Y-%m-%d")
+    rows = {"enrollments": []}
+    errors = []
+    for row_number, record in enumerate(records, start=first_row):
+        try:
+            check_required(record, "enrollments")
+            student_key = student_keys.get(record["roll_number"])
+            if student_key is None:
+                raise ValueError(f"unknown roll number {record['roll_number']}")
+            course_key = context["courses"].get(record["course_id"])
+            if course_key is None:
+                raise ValueError(f"unknown course id {record['course_id']}")
+            if (student_key, course_key) in enrolled:
+                raise ValueError(f"{record['roll_number']} is already enrolled in {record['course_id']}")
+            if record["grade"] and record["grade"] not in GRADES:
+                raise ValueError(f"invalid grade {record['grade']}")
+            enrollment_date = record["enrollment_date"] or today
+            datetime.strptime(enrollment_date, "%Y-%m-%d")
+        except ValueError as e:
+            errors.append((row_number, str(e)))
+            continue
+        enrolled.add((student_key, course_key))
+        rows["enrollments"].append((student_key, course_key, enrollment_date, record["grade"] or None))
+    return rows, errors
+
+
+PREPARERS = {
+    "students": prepare_students,
+    "instructors": prepare_instructors,
+    "enrollments": prepare_enrollments,
+}
+
+
+def load_context(c, kind):
+    # Small lookup tables resolved once per import rather than once per chunk
+    context = {}
+    if kind == "instructors":
+        c.execute("SELECT name, id FROM departments")
+        context["departments"] = dict(c.fetchall())
+    elif kind == "enrollments":
+        c.execute("SELECT id, key FROM courses")
+        context["courses"] = dict(c.fetchall())
+    return context
+
+
+def read_checkpoint(checkpoint_path):
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            return json.load(f)["rows_done"]
+    return 0
+
+
+def import_csv(writer, kind, source, chunk_size=DEFAULT_CHUNK_SIZE, skip_rows=0,
+               checkpoint_path=None, progress=None):
+    """Stream a CSV into the database in validated, chunked transactions.
+
+    ``writer()`` is a context manager yielding a connection that commits on exit,
+    such as ConnectionPool.writer; it is entered once per chunk, so other writers
+    only ever wait for one chunk. Rows that fail validation are reported in
+    ``errors`` as (row number, message) and skipped. The number of rows processed
+    so far is written to ``checkpoint_path`` so a failed import can be resumed by
+    passing it back as ``skip_rows``.
+    """
+    with writer() as conn:
+        context = load_context(conn.cursor(), kind)
+    prepare = PREPARERS[kind]
+    result = {"rows": skip_rows, "inserted": 0, "errors": []}
+
+    reader = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size,
+                         skiprows=range(1, skip_rows + 1))
+    for chunk in reader:
+        missing = [column for column in REQUIRED_COLUMNS[kind] if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"CSV is missing required columns: {', '.join(missing)}")
+        # Optional columns default to empty and surrounding whitespace is ignored
+        chunk = chunk.reindex(columns=IMPORT_COLUMNS[kind], fill_value="")
+        records = [{k: v.strip() for k, v in record.items()} for record in chunk.to_dict("records")]
+
+        # Validated and inserted under the same write lock, so the duplicate checks hold
+        with writer() as conn:
+            c = conn.cursor()
+            rows, errors = prepare(c, records, result["rows"] + 1, context)
+            for table, values in rows.items():
+                c.executemany(INSERT_SQL[table], values)
+
+        result["rows"] += len(records)
+        result["inserted"] += len(rows[kind])
+        result["errors"].extend(errors)
+        if checkpoint_path:
+            with open(checkpoint_path, "w") as f:
+                json.dump({"kind": kind, "rows_done": result["rows"]}, f)
+        if progress:
+            progress(result)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import students, instructors or enrollments from CSV")
+    parser.add_argument("kind", choices=list(IMPORT_COLUMNS.keys()))
+    parser.add_argument("csv_path")
+    parser.add_argument("--db", default=DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--resume", action="store_true", help="continue from the last committed chunk")
+    parser.add_argument("--errors", help="write rejected rows to this CSV file")
+    args = parser.parse_args(argv)
+
+    checkpoint_path = args.csv_path + ".progress.json"
+    skip_rows = read_checkpoint(checkpoint_path) if args.resume else 0
+    if skip_rows:
+        print(f"Resuming after row {skip_rows}")
+
+    conn = setup_database(args.db)
+    # The connection commits each chunk when used as a context manager
+    result = import_csv(lambda: conn, args.kind, args.csv_path, args.chunk_size, skip_rows, checkpoint_path,
+                        progress=lambda r: print(f"{r['rows']} rows processed, {r['inserted']} inserted", end="\r"))
+    conn.close()
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    print(f"\nImported {result['inserted']} {args.kind}, rejected {len(result['errors'])} rows")
+    if args.errors:
+        pd.DataFrame(result["errors"], columns=["row", "error"]).to_csv(args.errors, index=False)
+        print(f"Rejected rows written to {args.errors}")
+    else:
+        for row_number, message in result["errors"][:20]:
+            print(f"  row {row_number}: {message}")
+    return 0 if not result["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,30 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
 import uuid
 import os
+import threading
 from datetime import datetime
 import altair as alt  # Added missing import for altair
+from cache import query_cache, estimate_size
+from querylog import query_log
+from reports import report_runner, report_snapshot, REPORT_FROM_SNAPSHOT
+from database import GRADES, prune_activity_periodically, activity_prune_status
+from queries import (
+    use_database, get_data_version, get_departments, get_instructors,
+    get_entity_counts, get_department_stats, PAGE_SIZES, PAGED_VIEWS, get_page,
+    ENROLLMENT_ROW_LIMIT, get_course_options, get_filtered_enrollments,
+    search_entities, get_student, get_instructor, get_course, get_course_roster, save_grades,
+    get_student_courses, get_instructor_courses, get_available_courses, get_assignable_courses,
+    get_department_courses, get_department_instructors, get_activity,
+    get_cohorts, get_cohort_students, bulk_enroll, frame_memory, get_transcript, transcript_gpa,
+    get_course_meetings, add_course_meeting, delete_course_meeting,
+    register_course, drop_course, leave_waitlist, set_course_capacity, get_course_seats, get_course_waitlist,
+    get_student_waitlists, AGE_BAND_YEARS,
+)
+import analytics
+from schedule import DAYS, format_meeting, format_time, registration_conflicts
+from importer import import_csv, IMPORT_COLUMNS, REQUIRED_COLUMNS
+from exporter import export_table, EXPORT_FORMATS
 
 # Setup page configuration
 st.set_page_config(
@@ -14,83 +34,17 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Database setup
-def setup_database():
-    conn = sqlite3.connect('university.db', check_same_thread=False)
-    c = conn.cursor()
-    
-    # Create tables if they don't exist
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS departments (
-        id TEXT PRIMARY KEY,
-        name TEXT UNIQUE NOT NULL
-    )
-    ''')
-    
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS courses (
-        id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        department_id TEXT,
-        instructor_id TEXT,
-        credits INTEGER,
-        description TEXT,
-        FOREIGN KEY (department_id) REFERENCES departments(id),
-        FOREIGN KEY (instructor_id) REFERENCES instructors(id)
-    )
-    ''')
-    
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS persons (
-        id TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        age INTEGER,
-        email TEXT UNIQUE,
-        type TEXT NOT NULL
-    )
-    ''')
-    
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS students (
-        id TEXT PRIMARY KEY,
-        roll_number TEXT UNIQUE NOT NULL,
-        entry_year INTEGER,
-        program TEXT,
-        FOREIGN KEY (id) REFERENCES persons(id)
-    )
-    ''')
-    
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS instructors (
-        id TEXT PRIMARY KEY,
-        salary REAL,
-        department_id TEXT,
-        position TEXT,
-        FOREIGN KEY (id) REFERENCES persons(id),
-        FOREIGN KEY (department_id) REFERENCES departments(id)
-    )
-    ''')
-    
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS enrollments (
-        student_id TEXT,
-        course_id TEXT,
-        enrollment_date TEXT,
-        grade TEXT,
-        PRIMARY KEY (student_id, course_id),
-        FOREIGN KEY (student_id) REFERENCES students(id),
-        FOREIGN KEY (course_id) REFERENCES courses(id)
-    )
-    ''')
-    
-    conn.commit()
-    return conn
+# Attribute every statement of this rerun to the page shown (see the Query Profile panel)
+query_log.start_run()
 
-# Create a connection to the database
-conn = setup_database()
+# Enrollments are stored by integer keys; callers pass the external student and course ids
+ENROLL_SQL = """
+INSERT INTO enrollments (student_key, course_key, enrollment_date, grade)
+SELECT s.key, c.key, ?, ? FROM students s, courses c WHERE s.id = ? AND c.id = ?
+"""
 
 # Add some sample data if tables are empty
-def add_sample_data():
+def add_sample_data(conn):
     c = conn.cursor()
     
     # Check if departments table is empty
@@ -166,99 +120,187 @@ def add_sample_data():
         
         # Add enrollments
         enrollments = [
-            (student_ids[0], course_ids[0], datetime.now().strftime("%Y-%m-%d"), None),
-            (student_ids[0], course_ids[1], datetime.now().strftime("%Y-%m-%d"), None),
-            (student_ids[1], course_ids[1], datetime.now().strftime("%Y-%m-%d"), None),
-            (student_ids[2], course_ids[2], datetime.now().strftime("%Y-%m-%d"), None)
+            (datetime.now().strftime("%Y-%m-%d"), None, student_ids[0], course_ids[0]),
+            (datetime.now().strftime("%Y-%m-%d"), None, student_ids[0], course_ids[1]),
+            (datetime.now().strftime("%Y-%m-%d"), None, student_ids[1], course_ids[1]),
+            (datetime.now().strftime("%Y-%m-%d"), None, student_ids[2], course_ids[2])
         ]
-        c.executemany("INSERT INTO enrollments (student_id, course_id, enrollment_date, grade) VALUES (?, ?, ?, ?)", enrollments)
+        c.executemany(ENROLL_SQL, enrollments)
         
         conn.commit()
 
-# Add sample data if needed
-add_sample_data()
+# One-time setup per process, not per rerun: opening the pool runs the schema
+# migrations, then the sample data check runs once
+@st.cache_resource
+def init_database():
+    # Shared connection pool: parallel read-only connections and one writer
+    pool = use_database()
+    with pool.writer() as conn:
+        add_sample_data(conn)
+    # Build the analytics snapshot in the background so the first statistics view is fast
+    if analytics.USE_SNAPSHOT:
+        threading.Thread(target=analytics.enrollment_snapshot.get, daemon=True).start()
+    # Keep the activity feed within its retention limits for as long as the server runs,
+    # starting without holding up the first page
+    threading.Thread(target=prune_activity_periodically, args=(pool.writer,), daemon=True,
+                     name="activity-prune").start()
+    return pool
+
+pool = init_database()
+
+# UI helpers; the queries they render live in queries.py
+def show_paged_table(view, key):
+    spec = PAGED_VIEWS[view]
+    cursors_key = f"{key}_cursors"
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        sort_by = st.selectbox("Sort by", list(spec["sort_columns"].keys()),
+                               format_func=lambda x: x.replace("_", " ").title(), key=f"{key}_sort")
+    with col2:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+    
+    # The cursor stack holds the start of every page visited so far; reset it when the ordering changes
+    if st.session_state.get(f"{key}_ordering") != (sort_by, page_size):
+        st.session_state[f"{key}_ordering"] = (sort_by, page_size)
+        st.session_state[cursors_key] = [None]
+    cursors = st.session_state[cursors_key]
+    
+    page, next_cursor = get_page(view, sort_by, cursors[-1], page_size)
+    st.dataframe(page, use_container_width=True, hide_index=True)
+    
+    total = get_entity_counts()[spec["count"]]
+    first_row = (len(cursors) - 1) * page_size
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        st.button("Previous", key=f"{key}_previous", disabled=len(cursors) == 1,
+                  on_click=lambda: cursors.pop())
+    with col2:
+        st.button("Next", key=f"{key}_next", disabled=next_cursor is None,
+                  on_click=lambda: cursors.append(next_cursor))
+    with col3:
+        st.caption(f"Page {len(cursors)} · rows {first_row + 1 if len(page) else 0}–{first_row + len(page)} of {total}")
+
+def show_bulk_import(kind, key):
+    st.markdown("<div class='card'>", unsafe_allow_html=True)
+    st.subheader(f"Bulk Import {kind.title()}")
+    st.caption(f"CSV columns: {', '.join(IMPORT_COLUMNS[kind])} (required: {', '.join(REQUIRED_COLUMNS[kind])})")
+    
+    uploaded_file = st.file_uploader("CSV File", type="csv", key=f"{key}_file")
+    if uploaded_file is not None and st.button(f"Import {kind.title()}", key=f"{key}_button"):
+        progress_text = st.empty()
+        try:
+            # Rows that already exist are rejected, so re-uploading after a failure resumes the import
+            # The writer is checked out per chunk, so registrations and grade saves interleave
+            result = import_csv(pool.writer, kind, uploaded_file,
+                                progress=lambda r: progress_text.write(f"{r['rows']} rows processed, {r['inserted']} inserted"))
+            st.success(f"Imported {result['inserted']} {kind} from {result['rows']} rows!")
+            if result["errors"]:
+                st.warning(f"{len(result['errors'])} rows were rejected")
+                st.dataframe(pd.DataFrame(result["errors"], columns=["Row", "Error"]), use_container_width=True, hide_index=True)
+        except Exception as e:
+            st.error(f"Error importing {kind}: {e}")
+    st.markdown("</div>", unsafe_allow_html=True)
 
-# Utility functions
-def get_departments():
-    return pd.read_sql_query("SELECT * FROM departments", conn)
+def show_export(table, label):
+    file_format = st.radio("Export Format", list(EXPORT_FORMATS.keys()), horizontal=True, key=f"export_{table}_format")
+    if st.button(f"Export {label} Data"):
+        fmt = EXPORT_FORMATS[file_format]
+        # Rows are streamed from the cursor into a temp file instead of building the file in memory
+        with pool.reader() as conn:
+            path = export_table(conn, table, file_format)
+        try:
+            with open(path, "rb") as f:
+                st.download_button(
+                    label=f"Download {file_format}",
+                    data=f,
+                    file_name=f"{table}_data.{fmt['extension']}",
+                    mime=fmt["mime"]
+                )
+        finally:
+            os.remove(path)
 
-def get_courses():
-    query = """
-    SELECT c.id, c.name, d.name as department, p.name as instructor, c.credits, c.description
-    FROM courses c
-    LEFT JOIN departments d ON c.department_id = d.id
-    LEFT JOIN persons p ON c.instructor_id = p.id
-    """
-    return pd.read_sql_query(query, conn)
+def entity_labels(matches):
+    labels = {}
+    for entity_id, name, email, roll_number in matches:
+        detail = roll_number or email
+        labels[entity_id] = f"{name} ({detail})" if detail else name
+    return labels
 
-def get_students():
-    query = """
-    SELECT p.id, p.name, p.age, p.email, s.roll_number, s.entry_year, s.program
-    FROM persons p
-    JOIN students s ON p.id = s.id
-    WHERE p.type = 'student'
-    """
-    return pd.read_sql_query(query, conn)
+def select_entity(kind, key, none_label=None):
+    # Type-ahead search that returns the primary key of the chosen row; with none_label
+    # the first option is None, shown under that label
+    text = st.text_input(f"Search {kind.title()}s", key=f"{key}_search", placeholder="Name, email or roll number")
+    labels = entity_labels(search_entities(kind, text))
+    options = list(labels.keys())
+    if none_label is not None:
+        options.insert(0, None)
+        labels[None] = none_label
+    return st.selectbox(f"Select {kind.title()}", options, format_func=labels.get, key=f"{key}_select")
 
-def get_instructors():
-    query = """
-    SELECT p.id, p.name, p.age, p.email, i.salary, d.name as department, i.position
-    FROM persons p
-    JOIN instructors i ON p.id = i.id
-    LEFT JOIN departments d ON i.department_id = d.id
-    WHERE p.type = 'instructor'
-    """
-    return pd.read_sql_query(query, conn)
+def select_entities(kind, key, label):
+    # Type-ahead multi-select: the options are the current matches plus everything already
+    # picked, so choices survive new searches without loading every row
+    picked = st.session_state.get(f"{key}_picked", {})
+    text = st.text_input(f"Search {kind.title()}s", key=f"{key}_search", placeholder="Name, email or roll number")
+    labels = dict(picked)
+    labels.update(entity_labels(search_entities(kind, text)))
+    selected = st.multiselect(label, list(labels.keys()), format_func=labels.get, key=f"{key}_select")
+    st.session_state[f"{key}_picked"] = {entity_id: labels[entity_id] for entity_id in selected}
+    return selected
 
-def get_enrollments():
-    query = """
-    SELECT 
-        e.student_id, 
-        p.name as student_name, 
-        s.roll_number,
-        e.course_id, 
-        c.name as course_name, 
-        e.enrollment_date, 
-        e.grade
-    FROM enrollments e
-    JOIN students s ON e.student_id = s.id
-    JOIN persons p ON s.id = p.id
-    JOIN courses c ON e.course_id = c.id
-    """
-    return pd.read_sql_query(query, conn)
+@st.fragment
+def show_grade_roster(course_id):
+    roster = get_course_roster(course_id)
+    if roster.empty:
+        st.info("No students enrolled in this course")
+        return
+    
+    message = st.session_state.pop("roster_message", None)
+    if message:
+        st.success(message)
+    
+    editor_key = f"roster_{course_id}"
+    edited = st.data_editor(
+        roster,
+        column_config={
+            "student_id": None,
+            "student_name": "Student Name",
+            "roll_number": "Roll Number",
+            "enrollment_date": "Enrollment Date",
+            "grade": st.column_config.SelectboxColumn("Grade", options=GRADES),
+        },
+        disabled=["student_name", "roll_number", "enrollment_date"],
+        hide_index=True,
+        use_container_width=True,
+        key=editor_key,
+    )
+    
+    if st.button("Save Grades", key=f"{editor_key}_save"):
+        before = roster.set_index("student_id")["grade"].fillna("")
+        after = edited.set_index("student_id")["grade"].fillna("")
+        changed = after[after != before]
+        if changed.empty:
+            st.info("No grade changes to save")
+        else:
+            try:
+                count = save_grades(course_id, [(grade or None, student_id) for student_id, grade in changed.items()])
+                st.session_state["roster_message"] = f"Updated {count} grade{'s' if count != 1 else ''}!"
+                # Drop the pending edits and reload just this roster
+                del st.session_state[editor_key]
+                st.rerun(scope="fragment")
+            except Exception as e:
+                st.error(f"Error updating grades: {e}")
 
-def get_student_courses(student_id):
-    query = """
-    SELECT 
-        c.id, 
-        c.name, 
-        d.name as department, 
-        p.name as instructor, 
-        c.credits, 
-        e.enrollment_date,
-        e.grade
-    FROM enrollments e
-    JOIN courses c ON e.course_id = c.id
-    LEFT JOIN departments d ON c.department_id = d.id
-    LEFT JOIN persons p ON c.instructor_id = p.id
-    WHERE e.student_id = ?
-    """
-    return pd.read_sql_query(query, conn, params=(student_id,))
+# Seconds between progress refreshes while a report is computed in the background
+REPORT_POLL_SECONDS = 0.5
 
-def get_instructor_courses(instructor_id):
-    query = """
-    SELECT 
-        c.id, 
-        c.name, 
-        d.name as department, 
-        c.credits, 
-        c.description,
-        (SELECT COUNT(*) FROM enrollments WHERE course_id = c.id) as enrolled_students
-    FROM courses c
-    LEFT JOIN departments d ON c.department_id = d.id
-    WHERE c.instructor_id = ?
-    """
-    return pd.read_sql_query(query, conn, params=(instructor_id,))
+@st.fragment(run_every=REPORT_POLL_SECONDS)
+def show_report_progress(job):
+    # Only this fragment polls; the whole page reruns once to draw the finished report
+    if job.done.is_set():
+        st.rerun()
+    st.progress(job.progress, text=job.message)
 
 # Custom styling
 def apply_custom_styles():
@@ -332,6 +374,60 @@ menu_selection = st.sidebar.radio("",
     format_func=lambda x: f"{menu_icons[menu_options.index(x)]} {x}")
 
 st.sidebar.markdown("---")
+
+# Shared query cache statistics for sizing the cache
+with st.sidebar.expander("Cache Statistics"):
+    cache_stats = query_cache.stats()
+    st.write(f"**Hits:** {cache_stats['hits']}")
+    st.write(f"**Misses:** {cache_stats['misses']}")
+    st.write(f"**Hit Rate:** {cache_stats['hit_rate']:.1%}")
+    st.write(f"**Entries:** {cache_stats['entries']}")
+    st.write(f"**Memory:** {cache_stats['bytes'] / 1024 / 1024:.2f} MB of {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB")
+    st.write(f"**Evictions:** {cache_stats['evictions']}")
+    st.write(f"**Data Version:** {cache_stats['data_version']}")
+    snapshot_stats = analytics.enrollment_snapshot.stats()
+    st.write(f"**Analytics Snapshot:** {snapshot_stats['rows']} enrollments, "
+             f"{snapshot_stats['bytes'] / 1024 / 1024:.2f} MB, {snapshot_stats['full_loads']} full / "
+             f"{snapshot_stats['incremental_loads']} incremental loads")
+    report_stats = report_runner.stats()
+    st.write(f"**Reports:** {report_stats['computed']} computed, {report_stats['reused']} reused")
+    snapshot_stats = report_snapshot.stats()
+    if snapshot_stats["version"] is not None:
+        st.write(f"**Report Snapshot:** version {snapshot_stats['version']}, {snapshot_stats['age']:.0f} s old, "
+                 f"{snapshot_stats['size'] / 1024 / 1024:.1f} MB, built in {snapshot_stats['build_seconds']:.2f} s "
+                 f"({snapshot_stats['builds']} builds{', rebuilding' if snapshot_stats['building'] else ''})")
+    if snapshot_stats["last_error"]:
+        st.write(f"**Report Snapshot Error:** {snapshot_stats['last_error']}")
+    st.write(f"**Activity Prunes:** {activity_prune_status['runs']} runs, "
+             f"{activity_prune_status['pruned']} entries removed")
+    if activity_prune_status["last_error"]:
+        st.write(f"**Activity Prune Error:** {activity_prune_status['last_error']}")
+
+# Savings from the compact dtypes of the full-table frames, and this session's own footprint
+with st.sidebar.expander("Memory Usage"):
+    if frame_memory:
+        memory_df = pd.DataFrame.from_dict(frame_memory, orient="index")
+        memory_df["loaded_kb"] = memory_df["loaded_bytes"] / 1024
+        memory_df["compact_kb"] = memory_df["compact_bytes"] / 1024
+        memory_df["saved"] = (1 - memory_df["compact_bytes"] / memory_df["loaded_bytes"]).map("{:.0%}".format)
+        st.dataframe(memory_df[["rows", "loaded_kb", "compact_kb", "saved"]].round(1), use_container_width=True)
+    else:
+        st.write("No full-table frames loaded yet")
+    session_bytes = sum(estimate_size(value) for value in st.session_state.to_dict().values())
+    st.write(f"**This Session:** {len(st.session_state)} state entries, {session_bytes / 1024:.1f} KB")
+
+# Connection pool checkout metrics
+with st.sidebar.expander("Connection Pool"):
+    pool_stats = pool.stats()
+    st.write(f"**Idle Readers:** {pool_stats['readers_idle']} of {pool_stats['readers_total']}")
+    for kind in ("reader", "writer"):
+        metrics = pool_stats[kind]
+        st.write(f"**{kind.title()} Checkouts:** {metrics['checkouts']} ({metrics['waits']} waited, "
+                 f"{metrics['wait_time'] * 1000:.1f} ms total, {metrics['max_wait'] * 1000:.1f} ms max)")
+
+# Filled in at the end of the script, once every query of this rerun has run
+query_profile = st.sidebar.expander("Query Profile")
+
 st.sidebar.markdown("© 2025 University Management System")
 
 # Main content
@@ -345,10 +441,11 @@ if menu_selection == "Dashboard":
     col1, col2, col3, col4 = st.columns(4)
     
     # Get counts for each entity
-    student_count = len(get_students())
-    instructor_count = len(get_instructors())
-    course_count = len(get_courses())
-    department_count = len(get_departments())
+    counts = get_entity_counts()
+    student_count = counts["students"]
+    instructor_count = counts["instructors"]
+    course_count = counts["courses"]
+    department_count = counts["departments"]
     
     with col1:
         st.markdown("<div class='card'>", unsafe_allow_html=True)
@@ -370,42 +467,34 @@ if menu_selection == "Dashboard":
         st.markdown(f"<h3>Departments</h3><h2 class='highlight'>{department_count}</h2>", unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
     
-    # Recent activity (placeholder)
+    # Recent activity, newest first, one page at a time from the activity log
     st.markdown("<div class='section-header'>Recent Activity</div>", unsafe_allow_html=True)
     
-    # Mock recent activity data
-    recent_activities = [
-        {"type": "enrollment", "description": "Alice Johnson enrolled in Introduction to Programming", "timestamp": "2025-05-09 14:30:22"},
-        {"type": "grade", "description": "Prof. Robert Johnson updated grades for Classical Mechanics", "timestamp": "2025-05-08 10:15:45"},
-        {"type": "course", "description": "New course Advanced Database Systems added", "timestamp": "2025-05-07 16:22:10"},
-        {"type": "student", "description": "New student David Wilson registered", "timestamp": "2025-05-06 09:05:38"}
-    ]
+    # Start of every page visited so far; the first page always shows the newest entries
+    activity_cursors = st.session_state.setdefault("activity_cursors", [None])
+    activity_df, older_cursor = get_activity(activity_cursors[-1])
     
-    activity_df = pd.DataFrame(recent_activities)
     st.markdown("<div class='card'>", unsafe_allow_html=True)
-    st.dataframe(activity_df, use_container_width=True, hide_index=True)
+    if len(activity_df) > 0:
+        st.dataframe(activity_df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No activity recorded yet")
     st.markdown("</div>", unsafe_allow_html=True)
     
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        st.button("Newer", key="activity_newer", disabled=len(activity_cursors) == 1,
+                  on_click=lambda: activity_cursors.pop())
+    with col2:
+        st.button("Older", key="activity_older", disabled=older_cursor is None,
+                  on_click=lambda: activity_cursors.append(older_cursor))
+    
     # Department statistics
     st.markdown("<div class='section-header'>Department Statistics</div>", unsafe_allow_html=True)
     
-    # Count students and instructors per department
-    c = conn.cursor()
-    c.execute("""
-    SELECT d.name as department, 
-           COUNT(DISTINCT i.id) as instructor_count,
-           (SELECT COUNT(DISTINCT s.id) 
-            FROM students s 
-            JOIN enrollments e ON s.id = e.student_id 
-            JOIN courses c ON e.course_id = c.id 
-            WHERE c.department_id = d.id) as student_count
-    FROM departments d
-    LEFT JOIN instructors i ON d.id = i.department_id
-    GROUP BY d.name
-    """)
-    
-    dept_stats = c.fetchall()
-    dept_stats_df = pd.DataFrame(dept_stats, columns=["Department", "Instructors", "Students"])
+    # Students and instructors per department
+    dept_stats_df = get_department_stats()[["name", "instructors", "students"]]
+    dept_stats_df.columns = ["Department", "Instructors", "Students"]
     
     st.markdown("<div class='card'>", unsafe_allow_html=True)
     st.bar_chart(dept_stats_df.set_index("Department"))
@@ -416,22 +505,14 @@ elif menu_selection == "Students":
     st.markdown("<div class='section-header'>Student Management</div>", unsafe_allow_html=True)
     
     # Tabs for different student operations
-    student_tabs = st.tabs(["View Students", "Add Student", "Student Details"])
+    student_tabs = st.tabs(["View Students", "Add Student", "Student Details", "Bulk Import"])
     
     with student_tabs[0]:
         # View students
-        students_df = get_students()
-        st.dataframe(students_df, use_container_width=True, hide_index=True)
+        show_paged_table("students", "view_students")
         
         # Export option
-        if st.button("Export Students Data"):
-            csv = students_df.to_csv(index=False)
-            st.download_button(
-                label="Download CSV",
-                data=csv,
-                file_name="students_data.csv",
-                mime="text/csv"
-            )
+        show_export("students", "Students")
     
     with student_tabs[1]:
         # Add new student
@@ -453,25 +534,25 @@ elif menu_selection == "Students":
         if st.button("Add Student"):
             if name and email and roll_number:
                 try:
-                    # Check if roll number already exists
-                    c = conn.cursor()
-                    c.execute("SELECT COUNT(*) FROM students WHERE roll_number = ?", (roll_number,))
-                    if c.fetchone()[0] > 0:
-                        st.error("Roll number already exists!")
-                    else:
-                        # Create a new student
-                        student_id = str(uuid.uuid4())
-                        
-                        # Insert into persons table
-                        c.execute("INSERT INTO persons (id, name, age, email, type) VALUES (?, ?, ?, ?, ?)",
-                                 (student_id, name, age, email, "student"))
-                        
-                        # Insert into students table
-                        c.execute("INSERT INTO students (id, roll_number, entry_year, program) VALUES (?, ?, ?, ?)",
-                                 (student_id, roll_number, entry_year, program))
-                        
-                        conn.commit()
-                        st.success("Student added successfully!")
+                    with pool.writer() as conn:
+                        # Check if roll number already exists
+                        c = conn.cursor()
+                        c.execute("SELECT COUNT(*) FROM students WHERE roll_number = ?", (roll_number,))
+                        if c.fetchone()[0] > 0:
+                            st.error("Roll number already exists!")
+                        else:
+                            # Create a new student
+                            student_id = str(uuid.uuid4())
+                            
+                            # Insert into persons table
+                            c.execute("INSERT INTO persons (id, name, age, email, type) VALUES (?, ?, ?, ?, ?)",
+                                     (student_id, name, age, email, "student"))
+                            
+                            # Insert into students table
+                            c.execute("INSERT INTO students (id, roll_number, entry_year, program) VALUES (?, ?, ?, ?)",
+                                     (student_id, roll_number, entry_year, program))
+                            
+                            st.success("Student added successfully!")
                 except Exception as e:
                     st.error(f"Error adding student: {e}")
             else:
@@ -480,13 +561,10 @@ elif menu_selection == "Students":
     
     with student_tabs[2]:
         # Student details and course registration
-        students = get_students()
-        student_names = students["name"].tolist()
-        selected_student = st.selectbox("Select Student", student_names)
+        student_id = select_entity("student", "student_details")
         
-        if selected_student:
-            student_id = students[students["name"] == selected_student]["id"].values[0]
-            student_details = students[students["id"] == student_id]
+        if student_id:
+            student_details = get_student(student_id)
             
             col1, col2 = st.columns(2)
             
@@ -506,28 +584,33 @@ elif menu_selection == "Students":
                 st.subheader("Course Registration")
                 
                 # Get courses the student is not enrolled in
-                c = conn.cursor()
-                c.execute("""
-                SELECT c.id, c.name 
-                FROM courses c 
-                WHERE c.id NOT IN (
-                    SELECT course_id FROM enrollments WHERE student_id = ?
-                )
-                """, (student_id,))
-                
-                available_courses = c.fetchall()
+                available_courses = get_available_courses(student_id)
                 
                 if available_courses:
-                    course_options = {course[1]: course[0] for course in available_courses}
-                    selected_course = st.selectbox("Select Course to Register", list(course_options.keys()))
+                    course_options = {course[0]: course[1] for course in available_courses}
+                    course_id = st.selectbox("Select Course to Register", list(course_options.keys()), format_func=course_options.get)
+                    selected_course = course_options[course_id]
                     
-                    if st.button("Register Course"):
-                        course_id = course_options[selected_course]
+                    # Checked against the student's current timetable before anything is written
+                    # Advisory only: a clash is shown but does not block the registration
+                    conflicts = registration_conflicts(student_id, course_id)
+                    if conflicts:
+                        st.warning("Timetable clash:\n" + "\n".join(f"- {conflict}" for conflict in conflicts))
+                    
+                    capacity, enrolled, waiting = get_course_seats(course_id)
+                    if capacity is not None:
+                        st.caption(f"{enrolled} of {capacity} seats taken" + (f", {waiting} waitlisted" if waiting else ""))
+                    
+                    if st.button("Register Course", disabled=bool(conflicts)):
                         try:
-                            c.execute("INSERT INTO enrollments (student_id, course_id, enrollment_date, grade) VALUES (?, ?, ?, ?)",
-                                     (student_id, course_id, datetime.now().strftime("%Y-%m-%d"), None))
-                            conn.commit()
-                            st.success(f"Successfully registered for {selected_course}!")
+                            # A full course puts the student on its waitlist instead
+                            outcome, position = register_course(student_id, course_id)
+                            if outcome == "enrolled":
+                                st.success(f"Successfully registered for {selected_course}!")
+                            elif outcome == "waitlisted":
+                                st.info(f"{selected_course} is full; added to the waitlist at position {position}.")
+                            else:
+                                st.info(f"Already enrolled in {selected_course}.")
                         except Exception as e:
                             st.error(f"Error registering for course: {e}")
                 else:
@@ -541,44 +624,69 @@ elif menu_selection == "Students":
             if not student_courses.empty:
                 st.dataframe(student_courses, use_container_width=True, hide_index=True)
                 
-                # Drop course option
-                course_names = student_courses["name"].tolist()
-                selected_course_to_drop = st.selectbox("Select Course to Drop", course_names)
+                # Drop course option, chosen by primary key since course names can repeat
+                drop_options = dict(zip(student_courses["id"], student_courses["name"]))
+                course_id = st.selectbox("Select Course to Drop", list(drop_options.keys()), format_func=drop_options.get)
                 
                 if st.button("Drop Course"):
-                    course_id = student_courses[student_courses["name"] == selected_course_to_drop]["id"].values[0]
                     try:
-                        c = conn.cursor()
-                        c.execute("DELETE FROM enrollments WHERE student_id = ? AND course_id = ?", (student_id, course_id))
-                        conn.commit()
-                        st.success(f"Successfully dropped {selected_course_to_drop}!")
-                        st.experimental_rerun()
+                        # The freed seat goes to the first student on the waitlist
+                        drop_course(student_id, course_id)
+                        st.success(f"Successfully dropped {drop_options[course_id]}!")
+                        st.rerun()
                     except Exception as e:
                         st.error(f"Error dropping course: {e}")
             else:
                 st.info("Not enrolled in any courses")
+            
+            # Courses the student is waiting for a seat in
+            student_waitlists = get_student_waitlists(student_id)
+            if not student_waitlists.empty:
+                st.markdown("<div class='section-header'>Waitlists</div>", unsafe_allow_html=True)
+                st.dataframe(student_waitlists, use_container_width=True, hide_index=True,
+                             column_config={"id": None, "name": "Course", "position": "Position",
+                                            "requested_at": "Requested At"})
+                
+                waitlist_options = dict(zip(student_waitlists["id"], student_waitlists["name"]))
+                waitlisted_course = st.selectbox("Select Waitlist to Leave", list(waitlist_options.keys()),
+                                                 format_func=waitlist_options.get)
+                if st.button("Leave Waitlist"):
+                    try:
+                        leave_waitlist(student_id, waitlisted_course)
+                        st.success(f"Left the waitlist for {waitlist_options[waitlisted_course]}!")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Error leaving waitlist: {e}")
+            
+            # Transcript with the credit-weighted GPA over graded courses
+            st.markdown("<div class='section-header'>Transcript</div>", unsafe_allow_html=True)
+            
+            transcript = get_transcript(student_id)
+            gpa, graded_credits = transcript_gpa(transcript)
+            col1, col2, col3 = st.columns(3)
+            col1.metric("GPA", f"{gpa:.2f}" if gpa is not None else "–")
+            col2.metric("Graded Credits", graded_credits)
+            col3.metric("Courses", len(transcript))
+            if not transcript.empty:
+                st.dataframe(transcript, use_container_width=True, hide_index=True)
+    
+    with student_tabs[3]:
+        # Bulk import students from CSV
+        show_bulk_import("students", "import_students")
 
 # Instructors section
 elif menu_selection == "Instructors":
     st.markdown("<div class='section-header'>Instructor Management</div>", unsafe_allow_html=True)
     
     # Tabs for different instructor operations
-    instructor_tabs = st.tabs(["View Instructors", "Add Instructor", "Instructor Details"])
+    instructor_tabs = st.tabs(["View Instructors", "Add Instructor", "Instructor Details", "Bulk Import"])
     
     with instructor_tabs[0]:
         # View instructors
-        instructors_df = get_instructors()
-        st.dataframe(instructors_df, use_container_width=True, hide_index=True)
+        show_paged_table("instructors", "view_instructors")
         
         # Export option
-        if st.button("Export Instructors Data"):
-            csv = instructors_df.to_csv(index=False)
-            st.download_button(
-                label="Download CSV",
-                data=csv,
-                file_name="instructors_data.csv",
-                mime="text/csv"
-            )
+        show_export("instructors", "Instructors")
     
     with instructor_tabs[1]:
         # Add new instructor
@@ -606,16 +714,16 @@ elif menu_selection == "Instructors":
                     instructor_id = str(uuid.uuid4())
                     department_id = department_options[selected_department]
                     
-                    # Insert into persons table
-                    c = conn.cursor()
-                    c.execute("INSERT INTO persons (id, name, age, email, type) VALUES (?, ?, ?, ?, ?)",
-                             (instructor_id, name, age, email, "instructor"))
-                    
-                    # Insert into instructors table
-                    c.execute("INSERT INTO instructors (id, salary, department_id, position) VALUES (?, ?, ?, ?)",
-                             (instructor_id, salary, department_id, position))
+                    with pool.writer() as conn:
+                        # Insert into persons table
+                        c = conn.cursor()
+                        c.execute("INSERT INTO persons (id, name, age, email, type) VALUES (?, ?, ?, ?, ?)",
+                                 (instructor_id, name, age, email, "instructor"))
+                        
+                        # Insert into instructors table
+                        c.execute("INSERT INTO instructors (id, salary, department_id, position) VALUES (?, ?, ?, ?)",
+                                 (instructor_id, salary, department_id, position))
                     
-                    conn.commit()
                     st.success("Instructor added successfully!")
                 except Exception as e:
                     st.error(f"Error adding instructor: {e}")
@@ -625,13 +733,10 @@ elif menu_selection == "Instructors":
     
     with instructor_tabs[2]:
         # Instructor details and course assignment
-        instructors = get_instructors()
-        instructor_names = instructors["name"].tolist()
-        selected_instructor = st.selectbox("Select Instructor", instructor_names)
+        instructor_id = select_entity("instructor", "instructor_details")
         
-        if selected_instructor:
-            instructor_id = instructors[instructors["name"] == selected_instructor]["id"].values[0]
-            instructor_details = instructors[instructors["id"] == instructor_id]
+        if instructor_id:
+            instructor_details = get_instructor(instructor_id)
             
             col1, col2 = st.columns(2)
             
@@ -660,30 +765,27 @@ elif menu_selection == "Instructors":
             st.subheader("Assign New Course")
             
             # Get courses not assigned to this instructor
-            c = conn.cursor()
-            c.execute("""
-            SELECT c.id, c.name 
-            FROM courses c 
-            WHERE c.instructor_id IS NULL OR c.instructor_id != ?
-            """, (instructor_id,))
-            
-            available_courses = c.fetchall()
+            available_courses = get_assignable_courses(instructor_id)
             
             if available_courses:
-                course_options = {course[1]: course[0] for course in available_courses}
-                selected_course = st.selectbox("Select Course to Assign", list(course_options.keys()))
+                course_options = {course[0]: course[1] for course in available_courses}
+                course_id = st.selectbox("Select Course to Assign", list(course_options.keys()), format_func=course_options.get)
+                selected_course = course_options[course_id]
                 
                 if st.button("Assign Course"):
-                    course_id = course_options[selected_course]
                     try:
-                        c.execute("UPDATE courses SET instructor_id = ? WHERE id = ?", (instructor_id, course_id))
-                        conn.commit()
+                        with pool.writer() as conn:
+                            conn.execute("UPDATE courses SET instructor_id = ? WHERE id = ?", (instructor_id, course_id))
                         st.success(f"Successfully assigned to teach {selected_course}!")
                     except Exception as e:
                         st.error(f"Error assigning course: {e}")
             else:
                 st.info("No available courses to assign")
             st.markdown("</div>", unsafe_allow_html=True)
+    
+    with instructor_tabs[3]:
+        # Bulk import instructors from CSV
+        show_bulk_import("instructors", "import_instructors")
 
 # Courses section
 elif menu_selection == "Courses":
@@ -694,18 +796,10 @@ elif menu_selection == "Courses":
     
     with course_tabs[0]:
         # View courses
-        courses_df = get_courses()
-        st.dataframe(courses_df, use_container_width=True, hide_index=True)
+        show_paged_table("courses", "view_courses")
         
         # Export option
-        if st.button("Export Courses Data"):
-            csv = courses_df.to_csv(index=False)
-            st.download_button(
-                label="Download CSV",
-                data=csv,
-                file_name="courses_data.csv",
-                mime="text/csv"
-            )
+        show_export("courses", "Courses")
     
     with course_tabs[1]:
         # Add new course
@@ -717,6 +811,7 @@ elif menu_selection == "Courses":
         with col1:
             course_name = st.text_input("Course Name")
             credits = st.number_input("Credits", min_value=1, max_value=6, value=3)
+            capacity = st.number_input("Capacity", min_value=1, value=None, placeholder="Unlimited")
             description = st.text_area("Description")
         
         with col2:
@@ -738,13 +833,12 @@ elif menu_selection == "Courses":
                     instructor_id = instructor_options[selected_instructor]
                     
                     # Insert into courses table
-                    c = conn.cursor()
-                    c.execute("""
-                    INSERT INTO courses (id, name, department_id, instructor_id, credits, description) 
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """, (course_id, course_name, department_id, instructor_id, credits, description))
+                    with pool.writer() as conn:
+                        conn.execute("""
+                        INSERT INTO courses (id, name, department_id, instructor_id, credits, capacity, description) 
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        """, (course_id, course_name, department_id, instructor_id, credits, capacity, description))
                     
-                    conn.commit()
                     st.success("Course added successfully!")
                 except Exception as e:
                     st.error(f"Error adding course: {e}")
@@ -754,13 +848,10 @@ elif menu_selection == "Courses":
     
     with course_tabs[2]:
         # Course details and enrollment management
-        courses = get_courses()
-        course_names = courses["name"].tolist()
-        selected_course = st.selectbox("Select Course", course_names)
+        course_id = select_entity("course", "course_details")
         
-        if selected_course:
-            course_id = courses[courses["name"] == selected_course]["id"].values[0]
-            course_details = courses[courses["id"] == course_id]
+        if course_id:
+            course_details = get_course(course_id)
             
             col1, col2 = st.columns(2)
             
@@ -771,6 +862,8 @@ elif menu_selection == "Courses":
                 st.write(f"**Department:** {course_details['department'].values[0]}")
                 st.write(f"**Instructor:** {course_details['instructor'].values[0]}")
                 st.write(f"**Credits:** {course_details['credits'].values[0]}")
+                capacity, enrolled, waiting = get_course_seats(course_id)
+                st.write(f"**Seats:** {enrolled} taken of " + (f"{capacity}, {waiting} waitlisted" if capacity is not None else "unlimited"))
                 st.write(f"**Description:** {course_details['description'].values[0]}")
                 st.markdown("</div>", unsafe_allow_html=True)
             
@@ -778,58 +871,86 @@ elif menu_selection == "Courses":
                 st.markdown("<div class='card'>", unsafe_allow_html=True)
                 st.subheader("Course Enrollment")
                 
-                # Get enrolled students
-                c = conn.cursor()
-                c.execute("""
-                SELECT p.name, s.roll_number, e.enrollment_date, e.grade
-                FROM enrollments e
-                JOIN students s ON e.student_id = s.id
-                JOIN persons p ON s.id = p.id
-                WHERE e.course_id = ?
-                """, (course_id,))
-                
-                enrolled_students = c.fetchall()
+                # Editable roster; saving only reruns this fragment
+                show_grade_roster(course_id)
+                st.markdown("</div>", unsafe_allow_html=True)
+            
+            # Weekly meeting times and rooms
+            st.markdown("<div class='section-header'>Schedule</div>", unsafe_allow_html=True)
+            
+            meetings = get_course_meetings(course_id)
+            if not meetings.empty:
+                meetings_df = pd.DataFrame({
+                    "Day": [DAYS[day] for day in meetings["day"]],
+                    "Start": [format_time(minute) for minute in meetings["start_minute"]],
+                    "End": [format_time(minute) for minute in meetings["end_minute"]],
+                    "Room": meetings["room"],
+                })
+                st.dataframe(meetings_df, use_container_width=True, hide_index=True)
                 
-                if enrolled_students:
-                    enrolled_df = pd.DataFrame(enrolled_students, columns=["Student Name", "Roll Number", "Enrollment Date", "Grade"])
-                    st.dataframe(enrolled_df, use_container_width=True, hide_index=True)
-                    
-                    # Update grades
-                    st.subheader("Update Grades")
-                    student_options = [row[0] for row in enrolled_students]
-                    selected_student = st.selectbox("Select Student", student_options)
-                    
-                    # Get current grade for the selected student
-                    current_grade = None
-                    for student in enrolled_students:
-                        if student[0] == selected_student:
-                            current_grade = student[3]
-                            break
-                    
-                    grade_options = ["A", "A-", "B+", "B", "B-", "C+", "C", "C-", "D+", "D", "F", None]
-                    selected_grade = st.selectbox("Select Grade", grade_options, index=grade_options.index(current_grade) if current_grade in grade_options else len(grade_options)-1)
-                    
-                    if st.button("Update Grade"):
-                        try:
-                            # Get student ID
-                            c.execute("""
-                            SELECT s.id 
-                            FROM students s
-                            JOIN persons p ON s.id = p.id
-                            WHERE p.name = ?
-                            """, (selected_student,))
-                            student_id = c.fetchone()[0]
-                            
-                            c.execute("UPDATE enrollments SET grade = ? WHERE student_id = ? AND course_id = ?", 
-                                    (selected_grade, student_id, course_id))
-                            conn.commit()
-                            st.success(f"Grade updated for {selected_student}!")
-                            st.experimental_rerun()
-                        except Exception as e:
-                            st.error(f"Error updating grade: {e}")
+                meeting_options = {meeting.id: f"{format_meeting(meeting.day, meeting.start_minute, meeting.end_minute)}"
+                                   f" {meeting.room or ''}" for meeting in meetings.itertuples()}
+                meeting_id = st.selectbox("Select Meeting to Remove", list(meeting_options.keys()),
+                                          format_func=meeting_options.get, key="remove_meeting_id")
+                if st.button("Remove Meeting"):
+                    try:
+                        delete_course_meeting(meeting_id)
+                        st.success("Meeting removed!")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Error removing meeting: {e}")
+            else:
+                st.info("No meeting times scheduled")
+            
+            with st.form("add_meeting_form"):
+                col1, col2, col3, col4 = st.columns(4)
+                day = col1.selectbox("Day", range(len(DAYS)), format_func=DAYS.__getitem__)
+                start_time = col2.time_input("Start", value=datetime.strptime("09:00", "%H:%M").time(), step=900)
+                end_time = col3.time_input("End", value=datetime.strptime("10:15", "%H:%M").time(), step=900)
+                room = col4.text_input("Room").strip()
+                submit_meeting = st.form_submit_button("Add Meeting")
+            
+            if submit_meeting:
+                start_minute = start_time.hour * 60 + start_time.minute
+                end_minute = end_time.hour * 60 + end_time.minute
+                if end_minute <= start_minute:
+                    st.warning("The meeting must end after it starts!")
                 else:
-                    st.info("No students enrolled in this course")
-                st.markdown("</div>", unsafe_allow_html=True)
+                    try:
+                        # Refused, with the clashing bookings, when the room is taken at that time
+                        bookings = add_course_meeting(course_id, day, start_minute, end_minute, room)
+                        if bookings:
+                            st.error(f"{room} is already booked: " + ", ".join(
+                                f"{course} ({format_time(start)}–{format_time(end)})" for course, start, end in bookings))
+                        else:
+                            st.success("Meeting added!")
+                            st.rerun()
+                    except Exception as e:
+                        st.error(f"Error adding meeting: {e}")
+            
+            # Seat limit and the queue of students waiting for a seat
+            st.markdown("<div class='section-header'>Seats and Waitlist</div>", unsafe_allow_html=True)
+            
+            message = st.session_state.pop("capacity_message", None)
+            if message:
+                st.success(message)
+            
+            new_capacity = st.number_input("Capacity", min_value=0, value=capacity, placeholder="Unlimited",
+                                           key=f"capacity_{course_id}")
+            if st.button("Update Capacity"):
+                try:
+                    promoted = set_course_capacity(course_id, new_capacity)
+                    st.session_state["capacity_message"] = "Capacity updated!" + (
+                        f" Enrolled from the waitlist: {', '.join(promoted)}." if promoted else "")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error updating capacity: {e}")
+            
+            waitlist = get_course_waitlist(course_id)
+            if not waitlist.empty:
+                st.dataframe(waitlist, use_container_width=True, hide_index=True)
+            else:
+                st.info("Nobody is waiting for a seat")
 
 # Departments section
 elif menu_selection == "Departments":
@@ -844,14 +965,7 @@ elif menu_selection == "Departments":
         st.dataframe(departments_df, use_container_width=True, hide_index=True)
         
         # Export option
-        if st.button("Export Departments Data"):
-            csv = departments_df.to_csv(index=False)
-            st.download_button(
-                label="Download CSV",
-                data=csv,
-                file_name="departments_data.csv",
-                mime="text/csv"
-            )
+        show_export("departments", "Departments")
     
     with dept_tabs[1]:
         # Add new department
@@ -867,11 +981,10 @@ elif menu_selection == "Departments":
                     department_id = str(uuid.uuid4())
                     
                     # Insert into departments table
-                    c = conn.cursor()
-                    c.execute("INSERT INTO departments (id, name) VALUES (?, ?)",
-                             (department_id, department_name))
+                    with pool.writer() as conn:
+                        conn.execute("INSERT INTO departments (id, name) VALUES (?, ?)",
+                                     (department_id, department_name))
                     
-                    conn.commit()
                     st.success("Department added successfully!")
                 except Exception as e:
                     st.error(f"Error adding department: {e}")
@@ -895,23 +1008,14 @@ elif menu_selection == "Departments":
                 st.subheader("Department Information")
                 
                 # Get department stats
-                c = conn.cursor()
-                c.execute("""
-                SELECT 
-                    (SELECT COUNT(*) FROM instructors WHERE department_id = ?) as instructor_count,
-                    (SELECT COUNT(*) FROM courses WHERE department_id = ?) as course_count,
-                    (SELECT COUNT(DISTINCT e.student_id) 
-                     FROM enrollments e 
-                     JOIN courses c ON e.course_id = c.id 
-                     WHERE c.department_id = ?) as student_count
-                """, (department_id, department_id, department_id))
-                
-                stats = c.fetchone()
+                dept_stats = get_department_stats()
+                stats = dept_stats[dept_stats["id"] == department_id].iloc[0]
                 
                 st.write(f"**Name:** {selected_department}")
-                st.write(f"**Instructors:** {stats[0]}")
-                st.write(f"**Courses:** {stats[1]}")
-                st.write(f"**Students Enrolled:** {stats[2]}")
+                st.write(f"**Instructors:** {stats['instructors']}")
+                st.write(f"**Courses:** {stats['courses']}")
+                st.write(f"**Students Enrolled:** {stats['students']}")
+                st.write(f"**Enrollments:** {stats['enrollments']}")
                 st.markdown("</div>", unsafe_allow_html=True)
             
             with col2:
@@ -919,14 +1023,7 @@ elif menu_selection == "Departments":
                 st.subheader("Department Courses")
                 
                 # Get department courses
-                c.execute("""
-                SELECT c.name, p.name as instructor, c.credits
-                FROM courses c
-                LEFT JOIN persons p ON c.instructor_id = p.id
-                WHERE c.department_id = ?
-                """, (department_id,))
-                
-                courses = c.fetchall()
+                courses = get_department_courses(department_id)
                 
                 if courses:
                     courses_df = pd.DataFrame(courses, columns=["Course Name", "Instructor", "Credits"])
@@ -938,14 +1035,7 @@ elif menu_selection == "Departments":
             # Department instructors
             st.markdown("<div class='section-header'>Department Instructors</div>", unsafe_allow_html=True)
             
-            c.execute("""
-            SELECT p.name, i.position, i.salary
-            FROM instructors i
-            JOIN persons p ON i.id = p.id
-            WHERE i.department_id = ?
-            """, (department_id,))
-            
-            instructors = c.fetchall()
+            instructors = get_department_instructors(department_id)
             
             if instructors:
                 instructors_df = pd.DataFrame(instructors, columns=["Name", "Position", "Salary"])
@@ -957,39 +1047,69 @@ elif menu_selection == "Departments":
 elif menu_selection == "Enrollments":
     st.markdown("<div class='section-header'>Enrollment Management</div>", unsafe_allow_html=True)
     
-    # View all enrollments
-    enrollments_df = get_enrollments()
+    # Course options come from a small lookup query rather than the full enrollment join;
+    # students are found by type-ahead search, as there are far too many to list
+    course_options = get_course_options()
+    course_names = dict(zip(course_options["id"], course_options["name"]))
     
     # Add filters
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        course_filter = st.selectbox("Filter by Course", ["All"] + list(enrollments_df["course_name"].unique()))
+        course_filter = st.selectbox("Filter by Course", [None] + list(course_names.keys()),
+                                     format_func=lambda x: "All" if x is None else course_names[x])
     
     with col2:
-        student_filter = st.selectbox("Filter by Student", ["All"] + list(enrollments_df["student_name"].unique()))
+        student_filter = select_entity("student", "enrollment_student_filter", none_label="All")
     
     with col3:
-        grade_filter = st.selectbox("Filter by Grade", ["All", "Graded", "Ungraded"] + 
-                                  [g for g in enrollments_df["grade"].unique() if g is not None])
-    
-    # Apply filters
-    if course_filter != "All":
-        enrollments_df = enrollments_df[enrollments_df["course_name"] == course_filter]
-    
-    if student_filter != "All":
-        enrollments_df = enrollments_df[enrollments_df["student_name"] == student_filter]
+        grade_filter = st.selectbox("Filter by Grade", ["All", "Graded", "Ungraded"] + GRADES)
     
-    if grade_filter == "Graded":
-        enrollments_df = enrollments_df[enrollments_df["grade"].notna()]
-    elif grade_filter == "Ungraded":
-        enrollments_df = enrollments_df[enrollments_df["grade"].isna()]
-    elif grade_filter != "All":
-        enrollments_df = enrollments_df[enrollments_df["grade"] == grade_filter]
+    # Apply filters in SQL
+    enrollments_df = get_filtered_enrollments(course_filter, student_filter, grade_filter)
     
     # Display filtered enrollments
+    if len(enrollments_df) > ENROLLMENT_ROW_LIMIT:
+        enrollments_df = enrollments_df.head(ENROLLMENT_ROW_LIMIT)
+        st.caption(f"Showing the first {ENROLLMENT_ROW_LIMIT} matching enrollments. Narrow the filters to see more.")
     st.dataframe(enrollments_df, use_container_width=True, hide_index=True)
     
+    # Enroll a cohort and/or hand-picked students into several courses at once
+    with st.expander("Bulk Enroll"):
+        cohorts = get_cohorts()
+        col1, col2 = st.columns(2)
+        with col1:
+            cohort_year = st.selectbox("Entry Year", [None] + sorted(cohorts["entry_year"].dropna().unique().tolist(), reverse=True),
+                                       format_func=lambda x: "Any" if x is None else str(x), key="bulk_entry_year")
+        with col2:
+            cohort_program = st.selectbox("Program", [None] + sorted(cohorts["program"].dropna().unique().tolist()),
+                                          format_func=lambda x: "Any" if x is None else x, key="bulk_program")
+        use_cohort = st.checkbox("Include every student in this cohort", key="bulk_use_cohort")
+        extra_students = select_entities("student", "bulk_students", "Additional Students")
+        bulk_courses = st.multiselect("Courses", list(course_names.keys()), format_func=course_names.get, key="bulk_courses")
+        bulk_date = st.date_input("Enrollment Date", datetime.now(), key="bulk_date")
+        
+        bulk_students = set(extra_students)
+        if use_cohort:
+            bulk_students.update(get_cohort_students(cohort_year, cohort_program))
+        st.caption(f"{len(bulk_students)} students × {len(bulk_courses)} courses = "
+                   f"{len(bulk_students) * len(bulk_courses)} enrollments requested")
+        
+        if st.button("Enroll", key="bulk_enroll", disabled=not bulk_students or not bulk_courses):
+            try:
+                result = bulk_enroll(bulk_students, bulk_courses, bulk_date.strftime("%Y-%m-%d"))
+                st.success(f"Added {result['inserted']} enrollments, skipped {result['skipped']} that already existed.")
+                if result["waitlisted"]:
+                    st.info(f"{result['waitlisted']} enrollments did not fit in full courses and were waitlisted.")
+                if result["unknown"]:
+                    st.warning(f"{result['unknown']} selected students or courses no longer exist and were ignored.")
+            except Exception as e:
+                st.error(f"Error enrolling students: {e}")
+    
+    # Bulk import enrollments from CSV
+    with st.expander("Bulk Import Enrollments"):
+        show_bulk_import("enrollments", "import_enrollments")
+    
     # Enrollment statistics
     st.markdown("<div class='section-header'>Enrollment Statistics</div>", unsafe_allow_html=True)
     
@@ -1000,17 +1120,7 @@ elif menu_selection == "Enrollments":
         st.subheader("Courses by Enrollment")
         
         # Get top courses by enrollment
-        c = conn.cursor()
-        c.execute("""
-        SELECT c.name, COUNT(e.student_id) as enrollments
-        FROM enrollments e
-        JOIN courses c ON e.course_id = c.id
-        GROUP BY c.name
-        ORDER BY enrollments DESC
-        LIMIT 10
-        """)
-        
-        top_courses = c.fetchall()
+        top_courses = analytics.top_courses()
         
         if top_courses:
             top_courses_df = pd.DataFrame(top_courses, columns=["Course", "Enrollments"])
@@ -1024,15 +1134,7 @@ elif menu_selection == "Enrollments":
         st.subheader("Grade Distribution")
         
         # Get grade distribution
-        c.execute("""
-        SELECT grade, COUNT(*) as count
-        FROM enrollments
-        WHERE grade IS NOT NULL
-        GROUP BY grade
-        ORDER BY grade
-        """)
-        
-        grades = c.fetchall()
+        grades = analytics.grade_distribution()
         
         if grades:
             grades_df = pd.DataFrame(grades, columns=["Grade", "Count"])
@@ -1050,134 +1152,197 @@ elif menu_selection == "Reports":
         "Student Demographics": "Analyze student age distribution and programs",
         "Instructor Salary Analysis": "View salary distribution by department and position",
         "Course Popularity": "See which courses are most popular",
-        "Department Comparison": "Compare departments by various metrics"
+        "Department Comparison": "Compare departments by various metrics",
+        "Academic Performance": "GPA distributions by department and the dean's list",
+        "Schedule Conflicts": "Timetable clashes across every student's current courses"
     }
     
     selected_report = st.selectbox("Select Report", list(report_options.keys()))
     
-    if selected_report == "Student Demographics":
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
-        st.subheader("Student Demographics")
-        
-        col1, col2 = st.columns(2)
-        
+    # Reports are computed by background workers, once per data version for all sessions.
+    # In snapshot mode they read a periodically refreshed copy of the database, so heavy
+    # reports never hold the readers or the file that registrations use.
+    if REPORT_FROM_SNAPSHOT:
+        with st.spinner("Preparing report snapshot..."):
+            snapshot = report_snapshot.get(wait=True)
+        behind = get_data_version() - snapshot.version
+        col1, col2 = st.columns([4, 1])
         with col1:
-            # Age distribution
-            students = get_students()
-            st.bar_chart(students["age"].value_counts().sort_index(), use_container_width=True)
-            st.caption("Student Age Distribution")
-        
+            freshness = "up to date" if behind == 0 else f"{behind} changes behind"
+            refreshing = " Refreshing in the background." if report_snapshot.stats()["building"] else ""
+            st.caption(f"Data as of {snapshot.created.strftime('%Y-%m-%d %H:%M:%S')} "
+                       f"({snapshot.age():.0f} s ago, {freshness}). "
+                       f"Refreshed automatically every {report_snapshot.max_age / 60:g} minutes.{refreshing}")
         with col2:
-            # Program distribution
-            program_counts = students["program"].value_counts()
-            st.bar_chart(program_counts, use_container_width=True)
-            st.caption("Student Program Distribution")
-        
-        # Entry year analysis
-        st.subheader("Entry Year Analysis")
-        entry_year_counts = students["entry_year"].value_counts().sort_index()
-        st.line_chart(entry_year_counts, use_container_width=True)
-        st.caption("Students by Entry Year")
-        
-        st.markdown("</div>", unsafe_allow_html=True)
+            st.button("Refresh Data", key="refresh_report_snapshot", on_click=report_snapshot.start_refresh,
+                      disabled=behind == 0)
+        job = report_runner.request(selected_report, snapshot.version)
+    else:
+        job = report_runner.request(selected_report, get_data_version())
     
-    elif selected_report == "Instructor Salary Analysis":
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
-        st.subheader("Instructor Salary Analysis")
-        
-        # Salary by position
-        instructors = get_instructors()
-        salary_by_position = instructors.groupby("position")["salary"].mean().sort_values(ascending=False)
-        st.bar_chart(salary_by_position, use_container_width=True)
-        st.caption("Average Salary by Position")
-        
-        # Salary by department
-        salary_by_dept = instructors.groupby("department")["salary"].mean().sort_values(ascending=False)
-        st.bar_chart(salary_by_dept, use_container_width=True)
-        st.caption("Average Salary by Department")
+    if not job.done.is_set():
+        show_report_progress(job)
+    elif job.error:
+        st.error(f"Error computing report: {job.error}")
+    else:
+        result = job.result
         
-        # Salary distribution
-        st.subheader("Salary Distribution")
-        st.altair_chart(alt.Chart(instructors).mark_bar().encode(
-            alt.X("salary:Q", bin=True),
-            y='count()',
-        ), use_container_width=True)
-        
-        st.markdown("</div>", unsafe_allow_html=True)
-    
-    elif selected_report == "Course Popularity":
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
-        st.subheader("Course Popularity")
-        
-        # Get course enrollments
-        c = conn.cursor()
-        c.execute("""
-        SELECT c.name, d.name as department, COUNT(e.student_id) as enrollments
-        FROM enrollments e
-        JOIN courses c ON e.course_id = c.id
-        JOIN departments d ON c.department_id = d.id
-        GROUP BY c.name
-        ORDER BY enrollments DESC
-        """)
-        
-        course_popularity = c.fetchall()
-        
-        if course_popularity:
-            popularity_df = pd.DataFrame(course_popularity, columns=["Course", "Department", "Enrollments"])
+        if selected_report == "Student Demographics":
+            st.markdown("<div class='card'>", unsafe_allow_html=True)
+            st.subheader("Student Demographics")
             
-            # Top 10 courses
-            st.subheader("Top 10 Courses by Enrollment")
-            top_10 = popularity_df.head(10)
-            st.bar_chart(top_10.set_index("Course"))
+            col1, col2 = st.columns(2)
             
-            # By department
-            st.subheader("Enrollments by Department")
-            dept_enrollments = popularity_df.groupby("Department")["Enrollments"].sum().sort_values(ascending=False)
-            st.bar_chart(dept_enrollments)
-        else:
-            st.info("No enrollment data available")
+            with col1:
+                # Age distribution
+                st.bar_chart(result["age_counts"], use_container_width=True)
+                st.caption(f"Student Age Distribution ({AGE_BAND_YEARS}-year bands)")
+            
+            with col2:
+                # Program distribution
+                st.bar_chart(result["program_counts"], use_container_width=True)
+                st.caption("Student Program Distribution")
+            
+            # Entry year analysis
+            st.subheader("Entry Year Analysis")
+            st.line_chart(result["entry_year_counts"], use_container_width=True)
+            st.caption("Students by Entry Year")
+            
+            st.markdown("</div>", unsafe_allow_html=True)
         
-        st.markdown("</div>", unsafe_allow_html=True)
-    
-    elif selected_report == "Department Comparison":
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
-        st.subheader("Department Comparison")
+        elif selected_report == "Instructor Salary Analysis":
+            st.markdown("<div class='card'>", unsafe_allow_html=True)
+            st.subheader("Instructor Salary Analysis")
+            
+            # Salary by position
+            st.bar_chart(result["salary_by_position"], use_container_width=True)
+            st.caption("Average Salary by Position")
+            
+            # Salary by department
+            st.bar_chart(result["salary_by_department"], use_container_width=True)
+            st.caption("Average Salary by Department")
+            
+            # Salary distribution
+            st.subheader("Salary Distribution")
+            # Bins are counted in SQL, so the chart only receives one row per bar
+            st.altair_chart(alt.Chart(result["salary_histogram"]).mark_bar().encode(
+                alt.X("bin_start:Q", bin="binned", title="Salary"),
+                alt.X2("bin_end:Q"),
+                alt.Y("count:Q", title="Instructors"),
+            ), use_container_width=True)
+            
+            st.markdown("</div>", unsafe_allow_html=True)
         
-        # Get department stats
-        c = conn.cursor()
-        c.execute("""
-        SELECT 
-            d.name as department,
-            COUNT(DISTINCT i.id) as instructors,
-            COUNT(DISTINCT c.id) as courses,
-            (SELECT COUNT(DISTINCT e.student_id) 
-             FROM enrollments e 
-             JOIN courses co ON e.course_id = co.id 
-             WHERE co.department_id = d.id) as students
-        FROM departments d
-        LEFT JOIN instructors i ON d.id = i.department_id
-        LEFT JOIN courses c ON d.id = c.department_id
-        GROUP BY d.name
-        """)
+        elif selected_report == "Course Popularity":
+            st.markdown("<div class='card'>", unsafe_allow_html=True)
+            st.subheader("Course Popularity")
+            
+            if not result["top_courses"].empty:
+                # Top 10 courses
+                st.subheader("Top 10 Courses by Enrollment")
+                st.bar_chart(result["top_courses"].set_index("Course")["Enrollments"])
+                
+                # By department
+                st.subheader("Enrollments by Department")
+                st.bar_chart(result["department_enrollments"])
+            else:
+                st.info("No enrollment data available")
+            
+            st.markdown("</div>", unsafe_allow_html=True)
         
-        dept_stats = c.fetchall()
+        elif selected_report == "Department Comparison":
+            st.markdown("<div class='card'>", unsafe_allow_html=True)
+            st.subheader("Department Comparison")
+            
+            dept_stats_df = result["department_stats"]
+            
+            if not dept_stats_df.empty:
+                # Comparison metrics
+                metric = st.selectbox("Select Metric", ["Instructors", "Courses", "Students", "Enrollments"])
+                
+                if metric:
+                    st.bar_chart(dept_stats_df.set_index("Department")[metric])
+                    
+                    # Detailed comparison
+                    st.subheader("Detailed Comparison")
+                    st.dataframe(dept_stats_df.set_index("Department"), use_container_width=True)
+            else:
+                st.info("No department data available")
+            
+            st.markdown("</div>", unsafe_allow_html=True)
         
-        if dept_stats:
-            dept_stats_df = pd.DataFrame(dept_stats, columns=["Department", "Instructors", "Courses", "Students"])
+        elif selected_report == "Academic Performance":
+            st.markdown("<div class='card'>", unsafe_allow_html=True)
+            st.subheader("Academic Performance")
             
-            # Comparison metrics
-            metric = st.selectbox("Select Metric", ["Instructors", "Courses", "Students"])
+            gpa_summary = result["gpa_summary"]
             
-            if metric:
-                st.bar_chart(dept_stats_df.set_index("Department")[metric])
+            if not gpa_summary.empty:
+                # Each student's GPA over a department's courses, binned per department
+                st.subheader("GPA Distribution by Department")
+                st.altair_chart(alt.Chart(result["gpa_histogram"]).mark_bar().encode(
+                    alt.X("bin_start:Q", bin="binned", title="GPA"),
+                    alt.X2("bin_end:Q"),
+                    alt.Y("students:Q", title="Students", stack=None),
+                    alt.Color("department:N", title="Department", legend=None),
+                    alt.Row("department:N", title=None, header=alt.Header(labelAngle=0, labelAlign="left")),
+                ).properties(height=60), use_container_width=True)
+                st.dataframe(gpa_summary.round(2), use_container_width=True)
                 
-                # Detailed comparison
-                st.subheader("Detailed Comparison")
-                st.dataframe(dept_stats_df.set_index("Department"), use_container_width=True)
-        else:
-            st.info("No department data available")
+                st.subheader("Dean's List")
+                st.caption(f"{result['deans_list_eligible']} students with a GPA of at least {analytics.DEANS_LIST_GPA} "
+                           f"over {analytics.DEANS_LIST_MIN_CREDITS} or more graded credits"
+                           + (f"; showing the top {analytics.DEANS_LIST_LIMIT}"
+                              if result["deans_list_eligible"] > analytics.DEANS_LIST_LIMIT else ""))
+                st.dataframe(result["deans_list"].drop(columns="id").round({"gpa": 2}), use_container_width=True,
+                             hide_index=True)
+            else:
+                st.info("No graded enrollments yet")
+            
+            st.markdown("</div>", unsafe_allow_html=True)
         
-        st.markdown("</div>", unsafe_allow_html=True)
+        elif selected_report == "Schedule Conflicts":
+            st.markdown("<div class='card'>", unsafe_allow_html=True)
+            st.subheader("Schedule Conflicts")
+            
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Meetings Scanned", f"{result['meetings_scanned']:,}")
+            col2.metric("Students with Clashes", f"{result['students']:,}")
+            col3.metric("Clashing Course Pairs", f"{result['clashes']:,}")
+            
+            if not result["top_pairs"].empty:
+                st.subheader("Most Common Clashes")
+                st.dataframe(result["top_pairs"], use_container_width=True, hide_index=True)
+            else:
+                st.info("No timetable clashes")
+            
+            st.markdown("</div>", unsafe_allow_html=True)
+        
+        st.caption(f"Computed in {job.elapsed:.2f} s at data version {job.version}")
 
 # Add some space at the bottom
-st.markdown("<br><br>", unsafe_allow_html=True)
\ No newline at end of file
+st.markdown("<br><br>", unsafe_allow_html=True)
+
+# Per-rerun query counts and database time, plus the process-wide slow query log
+run = query_log.finish_run(menu_selection)
+with query_profile:
+    st.write(f"**This Run:** {run['queries']} queries, {run['total_ms']:.1f} ms in SQLite, "
+             f"{run['elapsed_ms']:.1f} ms total")
+    if run["statements"]:
+        statements_df = pd.DataFrame(run["statements"], columns=["call_site", "ms", "rows"])
+        st.dataframe(statements_df.sort_values("ms", ascending=False).round(2), use_container_width=True, hide_index=True)
+    
+    st.write("**Per Page**")
+    pages_df = pd.DataFrame.from_dict(query_log.pages(), orient="index")
+    pages_df["avg_queries"] = pages_df["queries"] / pages_df["runs"]
+    pages_df["avg_ms"] = pages_df["total_ms"] / pages_df["runs"]
+    pages_df["avg_run_ms"] = pages_df["elapsed_ms"] / pages_df["runs"]
+    st.dataframe(pages_df[["runs", "avg_queries", "avg_ms", "max_ms", "avg_run_ms"]].round(1), use_container_width=True)
+    
+    slow_queries = query_log.slow_queries()
+    st.write(f"**Slow Queries** (≥ {query_log.slow_ms} ms): {len(slow_queries)}")
+    for slow in slow_queries[:10]:
+        st.caption(f"{slow['time']} · {slow['call_site']} · {slow['ms']} ms · {slow['rows']} rows")
+        st.code(slow["sql"], language="sql")
+        if slow["plan"]:
+            st.code(slow["plan"], language="text")
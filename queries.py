@@ -0,0 +1,931 @@
+import functools
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from cache import query_cache
+from database import get_pool, DB_PATH, DEFAULT_READERS, COUNTED_TABLES, GRADE_POINTS
+
+# Read queries shared by the Streamlit pages and the benchmark runner. Nothing here
+# touches Streamlit, so the module can be imported outside a running app.
+
+# Pool used by every query below; set with use_database() before the first query
+pool = None
+
+def use_database(path=DB_PATH, readers=DEFAULT_READERS):
+    global pool
+    pool = get_pool(path, readers)
+    return pool
+
+# Connection that reads on this thread go to instead of the pool, see reading_from()
+_local = threading.local()
+
+@contextmanager
+def reading_from(conn):
+    # Send every read on this thread to conn for the duration of the block; used to run
+    # reports against a snapshot of the database instead of the live file
+    _local.conn = conn
+    try:
+        yield conn
+    finally:
+        _local.conn = None
+
+def reading_connection():
+    # The connection set by reading_from() on this thread, or None for the live pool
+    return getattr(_local, "conn", None)
+
+@contextmanager
+def reader():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        yield conn
+        return
+    # Otherwise every read checks out its own pooled connection for the duration of the query
+    with pool.reader() as conn:
+        yield conn
+
+def read_frame(query, params=()):
+    with reader() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+def fetch_all(query, params=()):
+    with reader() as conn:
+        return conn.execute(query, params).fetchall()
+
+def fetch_one(query, params=()):
+    with reader() as conn:
+        return conn.execute(query, params).fetchone()
+
+def get_data_version():
+    return fetch_one("SELECT version FROM data_version WHERE id = 1")[0]
+
+def cached_query(func):
+    # Share results across sessions until the next write bumps the data version
+    @functools.wraps(func)
+    def wrapper(*args):
+        return query_cache.get_or_load((func.__name__,) + args, get_data_version(), lambda: func(*args))
+    return wrapper
+
+# Dtypes the full-table loaders convert to. Repeated strings become categoricals (each
+# distinct value stored once plus a small integer code per row) and bounded integers get
+# the smallest nullable type that holds their range: ages and credits fit in a byte,
+# entry years in two. Names, emails and ids unique per row stay Arrow-backed strings.
+COMPACT_DTYPES = {
+    "students": {"age": "UInt8", "entry_year": "UInt16", "program": "category"},
+    "instructors": {"age": "UInt8", "department": "category", "position": "category"},
+    "courses": {"department": "category", "instructor": "category", "credits": "UInt8"},
+    "enrollments": {
+        "student_id": "category", "student_name": "category", "roll_number": "category",
+        "course_id": "category", "course_name": "category", "enrollment_date": "category", "grade": "category",
+    },
+}
+
+# Footprint of the last frame each loader produced, before and after compact_frame
+frame_memory = {}
+
+def compact_column(column, dtype):
+    # The schema has no CHECK constraints, so a stored value may be out of range, fractional
+    # or not a number at all; pandas refuses such casts and the column keeps its dtype
+    try:
+        return column.astype(dtype)
+    except (TypeError, ValueError):
+        return column
+
+def compact_frame(name, frame):
+    loaded_bytes = int(frame.memory_usage(deep=True).sum())
+    frame = frame.assign(**{column: compact_column(frame[column], dtype)
+                            for column, dtype in COMPACT_DTYPES[name].items() if column in frame})
+    frame_memory[name] = {
+        "rows": len(frame),
+        "loaded_bytes": loaded_bytes,
+        "compact_bytes": int(frame.memory_usage(deep=True).sum()),
+    }
+    return frame
+
+@cached_query
+def get_departments():
+    return read_frame("SELECT * FROM departments")
+
+@cached_query
+def get_courses():
+    query = """
+    SELECT c.id, c.name, d.name as department, p.name as instructor, c.credits, c.description
+    FROM courses c
+    LEFT JOIN departments d ON c.department_id = d.id
+    LEFT JOIN persons p ON c.instructor_id = p.id
+    """
+    return compact_frame("courses", read_frame(query))
+
+@cached_query
+def get_students():
+    query = """
+    SELECT p.id, p.name, p.age, p.email, s.roll_number, s.entry_year, s.program
+    FROM persons p
+    JOIN students s ON p.id = s.id
+    WHERE p.type = 'student'
+    """
+    return compact_frame("students", read_frame(query))
+
+@cached_query
+def get_instructors():
+    query = """
+    SELECT p.id, p.name, p.age, p.email, i.salary, d.name as department, i.position
+    FROM persons p
+    JOIN instructors i ON p.id = i.id
+    LEFT JOIN departments d ON i.department_id = d.id
+    WHERE p.type = 'instructor'
+    """
+    return compact_frame("instructors", read_frame(query))
+
+@cached_query
+def get_enrollments():
+    query = """
+    SELECT 
+        s.id as student_id, 
+        p.name as student_name, 
+        s.roll_number,
+        c.id as course_id, 
+        c.name as course_name, 
+        e.enrollment_date, 
+        e.grade
+    FROM enrollments e
+    JOIN students s ON e.student_key = s.key
+    JOIN persons p ON s.id = p.id
+    JOIN courses c ON e.course_key = c.key
+    """
+    return compact_frame("enrollments", read_frame(query))
+
+def get_entity_counts():
+    # Single round trip over the trigger-maintained counters
+    counts = dict(fetch_all("SELECT entity, count FROM entity_counts"))
+    return {table: counts.get(table, 0) for table in COUNTED_TABLES}
+
+@cached_query
+def get_department_stats():
+    # One row per department from the trigger-maintained department_stats table
+    return read_frame("""
+    SELECT d.id, d.name, ds.instructors, ds.courses, ds.students, ds.enrollments
+    FROM department_stats ds
+    JOIN departments d ON d.id = ds.department_id
+    ORDER BY d.name
+    """)
+
+# Keyset-paginated views: each sort option maps a result column to its SQL expression
+PAGE_SIZES = [25, 50, 100, 250]
+
+PAGED_VIEWS = {
+    "students": {
+        "query": """
+        SELECT p.id, p.name, p.age, p.email, s.roll_number, s.entry_year, s.program
+        FROM persons p
+        JOIN students s ON p.id = s.id
+        WHERE p.type = 'student'
+        """,
+        "id": "p.id",
+        "sort_columns": {"name": "p.name", "roll_number": "s.roll_number"},
+        "count": "students",
+    },
+    "instructors": {
+        "query": """
+        SELECT p.id, p.name, p.age, p.email, i.salary, d.name as department, i.position
+        FROM persons p
+        JOIN instructors i ON p.id = i.id
+        LEFT JOIN departments d ON i.department_id = d.id
+        WHERE p.type = 'instructor'
+        """,
+        "id": "p.id",
+        "sort_columns": {"name": "p.name"},
+        "count": "instructors",
+    },
+    "courses": {
+        "query": """
+        SELECT c.id, c.name, d.name as department, p.name as instructor, c.credits, c.description
+        FROM courses c
+        LEFT JOIN departments d ON c.department_id = d.id
+        LEFT JOIN persons p ON c.instructor_id = p.id
+        WHERE 1 = 1
+        """,
+        "id": "c.id",
+        "sort_columns": {"name": "c.name"},
+        "count": "courses",
+    },
+}
+
+@cached_query
+def get_page(view, sort_by, after=None, page_size=PAGE_SIZES[0]):
+    # Seek past the last (sort value, id) of the previous page instead of using OFFSET,
+    # so every page costs one index range scan regardless of table size
+    spec = PAGED_VIEWS[view]
+    sort_expr = spec["sort_columns"][sort_by]
+    query = spec["query"]
+    params = []
+    if after is not None:
+        query += f" AND ({sort_expr}, {spec['id']}) > (?, ?)"
+        params.extend(after)
+    query += f" ORDER BY {sort_expr}, {spec['id']} LIMIT ?"
+    params.append(page_size + 1)
+    page = read_frame(query, params)
+    
+    next_cursor = None
+    if len(page) > page_size:
+        page = page.head(page_size)
+        last = page.iloc[-1]
+        next_cursor = (last[sort_by], last["id"])
+    return page, next_cursor
+
+# Entries per page of the Dashboard activity feed
+ACTIVITY_PAGE_SIZE = 20
+
+@cached_query
+def get_activity(before=None, page_size=ACTIVITY_PAGE_SIZE):
+    # Newest first. Older pages seek below the (created_at, id) of the last entry shown,
+    # so every page is one backwards range scan of the created_at index however long the log is
+    query = "SELECT id, type, description, created_at as timestamp FROM activity_log"
+    params = []
+    if before is not None:
+        query += " WHERE (created_at, id) < (?, ?)"
+        params.extend(before)
+    query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    params.append(page_size + 1)
+    page = read_frame(query, params)
+    
+    next_cursor = None
+    if len(page) > page_size:
+        page = page.head(page_size)
+        last = page.iloc[-1]
+        next_cursor = (last["timestamp"], int(last["id"]))
+    return page.drop(columns="id"), next_cursor
+
+# Maximum number of rows rendered in the Enrollments table
+ENROLLMENT_ROW_LIMIT = 1000
+
+@cached_query
+def get_course_options():
+    return read_frame("SELECT id, name FROM courses ORDER BY name")
+
+@cached_query
+def get_student_options():
+    query = """
+    SELECT s.id, p.name, s.roll_number
+    FROM students s
+    JOIN persons p ON s.id = p.id
+    ORDER BY p.name
+    """
+    return read_frame(query)
+
+@cached_query
+def get_filtered_enrollments(course_id=None, student_id=None, grade_filter="All", limit=ENROLLMENT_ROW_LIMIT):
+    # Filters become WHERE clauses so only matching rows leave SQLite
+    conditions = []
+    params = []
+    if course_id is not None:
+        conditions.append("c.id = ?")
+        params.append(course_id)
+    if student_id is not None:
+        conditions.append("s.id = ?")
+        params.append(student_id)
+    if grade_filter == "Graded":
+        conditions.append("e.grade IS NOT NULL")
+    elif grade_filter == "Ungraded":
+        conditions.append("e.grade IS NULL")
+    elif grade_filter != "All":
+        conditions.append("e.grade = ?")
+        params.append(grade_filter)
+    
+    query = """
+    SELECT 
+        s.id as student_id, 
+        p.name as student_name, 
+        s.roll_number,
+        c.id as course_id, 
+        c.name as course_name, 
+        e.enrollment_date, 
+        e.grade
+    FROM enrollments e
+    JOIN students s ON e.student_key = s.key
+    JOIN persons p ON s.id = p.id
+    JOIN courses c ON e.course_key = c.key
+    """
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " LIMIT ?"
+    params.append(limit + 1)
+    return read_frame(query, params)
+
+# Number of matches offered by the type-ahead search boxes
+SEARCH_LIMIT = 20
+
+# Rows offered before anything has been typed, read in index order
+SEARCH_BROWSE_QUERIES = {
+    "student": """
+    SELECT s.id, p.name, p.email, s.roll_number
+    FROM persons p
+    JOIN students s ON p.id = s.id
+    WHERE p.type = 'student'
+    ORDER BY p.name, p.id
+    LIMIT ?
+    """,
+    "instructor": """
+    SELECT i.id, p.name, p.email, NULL
+    FROM persons p
+    JOIN instructors i ON p.id = i.id
+    WHERE p.type = 'instructor'
+    ORDER BY p.name, p.id
+    LIMIT ?
+    """,
+    "course": "SELECT id, name, NULL, NULL FROM courses ORDER BY name, id LIMIT ?",
+}
+
+def search_entities(kind, text, limit=SEARCH_LIMIT):
+    # Every word becomes a quoted prefix term so user input is never parsed as FTS syntax
+    words = [word.replace('"', "") for word in text.split()]
+    terms = [f'"{word}"*' for word in words if word]
+    if not terms:
+        return fetch_all(SEARCH_BROWSE_QUERIES[kind], (limit,))
+    match = f"kind : {kind} AND " + " AND ".join(terms)
+    return fetch_all("""
+    SELECT entity_id, name, email, roll_number
+    FROM search_index
+    WHERE search_index MATCH ?
+    ORDER BY rank
+    LIMIT ?
+    """, (match, limit))
+
+@cached_query
+def get_student(student_id):
+    query = """
+    SELECT p.id, p.name, p.age, p.email, s.roll_number, s.entry_year, s.program
+    FROM persons p
+    JOIN students s ON p.id = s.id
+    WHERE p.id = ?
+    """
+    return read_frame(query, (student_id,))
+
+@cached_query
+def get_instructor(instructor_id):
+    query = """
+    SELECT p.id, p.name, p.age, p.email, i.salary, d.name as department, i.position
+    FROM persons p
+    JOIN instructors i ON p.id = i.id
+    LEFT JOIN departments d ON i.department_id = d.id
+    WHERE p.id = ?
+    """
+    return read_frame(query, (instructor_id,))
+
+@cached_query
+def get_course(course_id):
+    query = """
+    SELECT c.id, c.name, d.name as department, p.name as instructor, c.credits, c.capacity, c.description
+    FROM courses c
+    LEFT JOIN departments d ON c.department_id = d.id
+    LEFT JOIN persons p ON c.instructor_id = p.id
+    WHERE c.id = ?
+    """
+    return read_frame(query, (course_id,))
+
+@cached_query
+def get_course_meetings(course_id):
+    query = """
+    SELECT m.id, m.day, m.start_minute, m.end_minute, m.room
+    FROM course_meetings m
+    WHERE m.course_key = (SELECT key FROM courses WHERE id = ?)
+    ORDER BY m.day, m.start_minute
+    """
+    return read_frame(query, (course_id,))
+
+@cached_query
+def get_student_meetings(student_id):
+    # Current timetable: graded enrollments are finished courses
+    query = """
+    SELECT c.id as course_id, c.name as course, m.day, m.start_minute, m.end_minute, m.room
+    FROM enrollments e
+    JOIN course_meetings m ON m.course_key = e.course_key
+    JOIN courses c ON c.key = e.course_key
+    WHERE e.student_key = (SELECT key FROM students WHERE id = ?) AND e.grade IS NULL
+    ORDER BY m.day, m.start_minute
+    """
+    return read_frame(query, (student_id,))
+
+@cached_query
+def get_all_meetings():
+    # Every meeting by course key, for the term-wide conflict sweep
+    return read_frame("SELECT course_key, day, start_minute, end_minute FROM course_meetings ORDER BY course_key")
+
+# Meetings that overlap [start, end) in the same room on the same day
+ROOM_BOOKINGS_SQL = """
+SELECT c.name as course, m.start_minute, m.end_minute
+FROM course_meetings m
+JOIN courses c ON c.key = m.course_key
+WHERE m.room = ? AND m.day = ? AND m.start_minute < ? AND m.end_minute > ?
+"""
+
+def add_course_meeting(course_id, day, start_minute, end_minute, room):
+    # The room check and the insert share one IMMEDIATE transaction, so two adds cannot
+    # both find the room free. Returns the clashing bookings, empty when the meeting was added.
+    room = room or None
+    with pool.writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT key FROM courses WHERE id = ?", (course_id,)).fetchone()
+        if row is None:
+            raise ValueError("Course not found")
+        if room is not None:
+            bookings = conn.execute(ROOM_BOOKINGS_SQL, (room, day, end_minute, start_minute)).fetchall()
+            if bookings:
+                return bookings
+        conn.execute("""
+        INSERT INTO course_meetings (course_key, day, start_minute, end_minute, room)
+        VALUES (?, ?, ?, ?, ?)
+        """, (row[0], day, start_minute, end_minute, room))
+    return []
+
+def delete_course_meeting(meeting_id):
+    with pool.writer() as conn:
+        conn.execute("DELETE FROM course_meetings WHERE id = ?", (meeting_id,))
+
+@cached_query
+def get_course_roster(course_id):
+    query = """
+    SELECT s.id as student_id, p.name as student_name, s.roll_number, e.enrollment_date, e.grade
+    FROM enrollments e
+    JOIN students s ON e.student_key = s.key
+    JOIN persons p ON s.id = p.id
+    WHERE e.course_key = (SELECT key FROM courses WHERE id = ?)
+    ORDER BY p.name
+    """
+    return read_frame(query, (course_id,))
+
+def save_grades(course_id, changes):
+    # changes is a list of (grade, student_id); all rows are written in one transaction.
+    # Graded or not, an enrollment keeps its seat, so grading never touches the waitlist.
+    with pool.writer() as conn:
+        course_key = course_key_of(conn, course_id)
+        conn.executemany("""
+        UPDATE enrollments SET grade = ?
+        WHERE course_key = ? AND student_key = (SELECT key FROM students WHERE id = ?)
+        """, [(grade, course_key, student_id) for grade, student_id in changes])
+    return len(changes)
+
+@cached_query
+def get_cohorts():
+    # Students per entry year and program, the groups registrars enroll together
+    return read_frame("""
+    SELECT entry_year, program, COUNT(*) as students
+    FROM students
+    GROUP BY entry_year, program
+    ORDER BY entry_year DESC, program
+    """)
+
+@cached_query
+def get_cohort_students(entry_year=None, program=None):
+    conditions = []
+    params = []
+    if entry_year is not None:
+        conditions.append("entry_year = ?")
+        params.append(entry_year)
+    if program is not None:
+        conditions.append("program = ?")
+        params.append(program)
+    query = "SELECT id FROM students"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return [row[0] for row in fetch_all(query, params)]
+
+# Inserts an enrollment only while the course has a free seat and nobody waiting for it;
+# the seat check is part of the statement, so no other write can come in between
+REGISTER_SQL = """
+INSERT INTO enrollments (student_key, course_key, enrollment_date, grade)
+SELECT s.key, c.key, ?, NULL
+FROM students s, courses c
+JOIN course_seats cs ON cs.course_key = c.key
+WHERE s.id = ? AND c.id = ?
+  AND (c.capacity IS NULL OR cs.enrolled < c.capacity)
+  AND NOT EXISTS (SELECT 1 FROM course_waitlist w WHERE w.course_key = c.key)
+  AND NOT EXISTS (SELECT 1 FROM enrollments e WHERE e.student_key = s.key AND e.course_key = c.key)
+"""
+
+def register_course(student_id, course_id, enrollment_date=None):
+    """Enroll a student in a free seat, or put them at the end of the course's waitlist.
+
+    Everything runs in one BEGIN IMMEDIATE transaction, which takes SQLite's write
+    lock up front, so the seat check holds against writers in other processes too.
+    Returns ("enrolled", None), ("waitlisted", position) or ("already enrolled", None).
+    Timetable clashes are not checked here: schedule.registration_conflicts() is an
+    advisory warning, and a student may still take two courses that overlap.
+    """
+    enrollment_date = enrollment_date or datetime.now().strftime("%Y-%m-%d")
+    with pool.writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute(REGISTER_SQL, (enrollment_date, student_id, course_id)).rowcount:
+            return "enrolled", None
+        row = conn.execute("""
+        SELECT s.key, c.key, EXISTS (SELECT 1 FROM enrollments e WHERE e.student_key = s.key AND e.course_key = c.key)
+        FROM students s, courses c
+        WHERE s.id = ? AND c.id = ?
+        """, (student_id, course_id)).fetchone()
+        if row is None:
+            raise ValueError("Student or course not found")
+        student_key, course_key, enrolled = row
+        if enrolled:
+            return "already enrolled", None
+        conn.execute("""
+        INSERT INTO course_waitlist (course_key, student_key) VALUES (?, ?)
+        ON CONFLICT (student_key, course_key) DO NOTHING
+        """, (course_key, student_key))
+        return "waitlisted", waitlist_position(conn, course_key, student_key)
+
+def course_key_of(conn, course_id):
+    row = conn.execute("SELECT key FROM courses WHERE id = ?", (course_id,)).fetchone()
+    if row is None:
+        raise ValueError("Course not found")
+    return row[0]
+
+def waitlist_position(conn, course_key, student_key):
+    return conn.execute("""
+    SELECT COUNT(*) FROM course_waitlist
+    WHERE course_key = ? AND id <= (SELECT id FROM course_waitlist WHERE course_key = ? AND student_key = ?)
+    """, (course_key, course_key, student_key)).fetchone()[0]
+
+def promote_waitlist(conn, course_key, enrollment_date=None):
+    # Move students from the head of the waitlist into the free seats, inside the caller's
+    # transaction; the enrollment trigger takes them off the waitlist. Returns their names.
+    capacity, enrolled = conn.execute("""
+    SELECT c.capacity, cs.enrolled FROM courses c JOIN course_seats cs ON cs.course_key = c.key WHERE c.key = ?
+    """, (course_key,)).fetchone()
+    free = -1 if capacity is None else max(capacity - enrolled, 0)
+    if free == 0:
+        return []
+    promoted = conn.execute("""
+    SELECT w.student_key, p.name
+    FROM course_waitlist w
+    JOIN students s ON s.key = w.student_key
+    JOIN persons p ON p.id = s.id
+    WHERE w.course_key = ?
+    ORDER BY w.id
+    LIMIT ?
+    """, (course_key, free)).fetchall()
+    enrollment_date = enrollment_date or datetime.now().strftime("%Y-%m-%d")
+    conn.executemany("""
+    INSERT INTO enrollments (student_key, course_key, enrollment_date, grade) VALUES (?, ?, ?, NULL)
+    """, [(student_key, course_key, enrollment_date) for student_key, _ in promoted])
+    return [name for _, name in promoted]
+
+def drop_course(student_id, course_id):
+    # Drop the enrollment and hand the seat to the next students waiting, in one transaction
+    with pool.writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        course_key = course_key_of(conn, course_id)
+        conn.execute("""
+        DELETE FROM enrollments
+        WHERE student_key = (SELECT key FROM students WHERE id = ?) AND course_key = ?
+        """, (student_id, course_key))
+        return promote_waitlist(conn, course_key)
+
+def leave_waitlist(student_id, course_id):
+    with pool.writer() as conn:
+        conn.execute("""
+        DELETE FROM course_waitlist
+        WHERE student_key = (SELECT key FROM students WHERE id = ?)
+          AND course_key = (SELECT key FROM courses WHERE id = ?)
+        """, (student_id, course_id))
+
+def set_course_capacity(course_id, capacity):
+    # None removes the limit; added seats go to the waitlist straight away
+    with pool.writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        course_key = course_key_of(conn, course_id)
+        conn.execute("UPDATE courses SET capacity = ? WHERE key = ?", (capacity, course_key))
+        return promote_waitlist(conn, course_key)
+
+@cached_query
+def get_course_seats(course_id):
+    # (capacity or None, seats taken, students waiting)
+    return fetch_one("""
+    SELECT c.capacity, cs.enrolled, (SELECT COUNT(*) FROM course_waitlist w WHERE w.course_key = c.key)
+    FROM courses c
+    JOIN course_seats cs ON cs.course_key = c.key
+    WHERE c.id = ?
+    """, (course_id,))
+
+@cached_query
+def get_course_waitlist(course_id):
+    query = """
+    SELECT ROW_NUMBER() OVER (ORDER BY w.id) as position, p.name as student_name, s.roll_number, w.requested_at
+    FROM course_waitlist w
+    JOIN students s ON s.key = w.student_key
+    JOIN persons p ON p.id = s.id
+    WHERE w.course_key = (SELECT key FROM courses WHERE id = ?)
+    ORDER BY w.id
+    """
+    return read_frame(query, (course_id,))
+
+@cached_query
+def get_student_waitlists(student_id):
+    query = """
+    SELECT
+        c.id,
+        c.name,
+        (SELECT COUNT(*) FROM course_waitlist w2 WHERE w2.course_key = w.course_key AND w2.id <= w.id) as position,
+        w.requested_at
+    FROM course_waitlist w
+    JOIN courses c ON c.key = w.course_key
+    WHERE w.student_key = (SELECT key FROM students WHERE id = ?)
+    ORDER BY w.requested_at
+    """
+    return read_frame(query, (student_id,))
+
+def bulk_enroll(student_ids, course_ids, enrollment_date=None):
+    # Enroll every student in every course in one transaction. The id sets go in as JSON
+    # arrays, so any number of them fits in one statement; pairs that are already
+    # enrolled are removed by an anti-join and the rest are inserted set-based. Courses
+    # with a capacity take students up to their free seats and waitlist the others.
+    student_ids, course_ids = set(student_ids), set(course_ids)
+    students, courses = json.dumps(sorted(student_ids)), json.dumps(sorted(course_ids))
+    enrollment_date = enrollment_date or datetime.now().strftime("%Y-%m-%d")
+    candidates = """
+    SELECT s.key as student_key, c.key as course_key,
+           ROW_NUMBER() OVER (PARTITION BY c.key ORDER BY s.key) as n,
+           CASE
+               WHEN c.capacity IS NULL THEN NULL
+               WHEN EXISTS (SELECT 1 FROM course_waitlist w WHERE w.course_key = c.key) THEN 0
+               ELSE MAX(c.capacity - cs.enrolled, 0)
+           END as free
+    FROM students s
+    CROSS JOIN courses c
+    JOIN course_seats cs ON cs.course_key = c.key
+    LEFT JOIN enrollments e ON e.student_key = s.key AND e.course_key = c.key
+    WHERE s.id IN (SELECT value FROM json_each(?))
+      AND c.id IN (SELECT value FROM json_each(?))
+      AND e.student_key IS NULL
+    """
+    with pool.writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        found_students, found_courses = conn.execute("""
+        SELECT (SELECT COUNT(*) FROM students WHERE id IN (SELECT value FROM json_each(?))),
+               (SELECT COUNT(*) FROM courses WHERE id IN (SELECT value FROM json_each(?)))
+        """, (students, courses)).fetchone()
+        inserted = conn.execute(f"""
+        INSERT INTO enrollments (student_key, course_key, enrollment_date, grade)
+        WITH candidates AS ({candidates})
+        SELECT student_key, course_key, ?, NULL FROM candidates WHERE free IS NULL OR n <= free
+        """, (students, courses, enrollment_date)).rowcount
+        # Whoever is left is in a full course
+        waitlisted = conn.execute(f"""
+        INSERT INTO course_waitlist (course_key, student_key)
+        WITH candidates AS ({candidates})
+        SELECT course_key, student_key FROM candidates WHERE true ORDER BY course_key, n
+        ON CONFLICT (student_key, course_key) DO NOTHING
+        """, (students, courses)).rowcount
+    # Ids that match no student or course are neither inserted nor skipped
+    return {
+        "inserted": inserted,
+        "waitlisted": waitlisted,
+        "skipped": found_students * found_courses - inserted - waitlisted,
+        "unknown": len(student_ids) - found_students + len(course_ids) - found_courses,
+    }
+
+def get_student_courses(student_id):
+    query = """
+    SELECT 
+        c.id, 
+        c.name, 
+        d.name as department, 
+        p.name as instructor, 
+        c.credits, 
+        e.enrollment_date,
+        e.grade
+    FROM enrollments e
+    JOIN students s ON e.student_key = s.key
+    JOIN courses c ON e.course_key = c.key
+    LEFT JOIN departments d ON c.department_id = d.id
+    LEFT JOIN persons p ON c.instructor_id = p.id
+    WHERE s.id = ?
+    """
+    return read_frame(query, (student_id,))
+
+# Grade points of e.grade as an inline CASE; joining a VALUES table instead makes the
+# planner drive the GPA aggregates from the grade table and is many times slower
+GRADE_POINTS_SQL = "CASE e.grade {} END".format(
+    " ".join(f"WHEN '{grade}' THEN {points}" for grade, points in GRADE_POINTS.items()))
+
+@cached_query
+def get_transcript(student_id):
+    # Every course of one student with its credits and grade points; ungraded courses have no points
+    query = f"""
+    SELECT 
+        c.name as course, 
+        d.name as department, 
+        e.enrollment_date, 
+        c.credits, 
+        e.grade, 
+        {GRADE_POINTS_SQL} as points
+    FROM enrollments e
+    JOIN courses c ON e.course_key = c.key
+    LEFT JOIN departments d ON c.department_id = d.id
+    WHERE e.student_key = (SELECT key FROM students WHERE id = ?)
+    ORDER BY e.enrollment_date, c.name
+    """
+    return read_frame(query, (student_id,))
+
+def transcript_gpa(transcript):
+    # Credit-weighted GPA over the graded courses of a transcript, None before any grade
+    graded = transcript[transcript["points"].notna() & (transcript["credits"] > 0)]
+    credits = graded["credits"].sum()
+    if not credits:
+        return None, 0
+    return (graded["points"] * graded["credits"]).sum() / credits, int(credits)
+
+@cached_query
+def get_student_gpas():
+    # GPA of every student with graded credits, as one aggregate
+    query = f"""
+    SELECT e.student_key, SUM(c.credits) as credits, SUM(c.credits * {GRADE_POINTS_SQL}) / SUM(c.credits) as gpa
+    FROM enrollments e
+    JOIN courses c ON e.course_key = c.key
+    WHERE e.grade IS NOT NULL AND c.credits > 0
+    GROUP BY e.student_key
+    """
+    return read_frame(query).set_index("student_key")
+
+@cached_query
+def get_department_student_gpas():
+    # GPA of each student over the graded courses of each department
+    query = f"""
+    SELECT d.name as department, e.student_key, SUM(c.credits) as credits,
+           SUM(c.credits * {GRADE_POINTS_SQL}) / SUM(c.credits) as gpa
+    FROM enrollments e
+    JOIN courses c ON e.course_key = c.key
+    JOIN departments d ON c.department_id = d.id
+    WHERE e.grade IS NOT NULL AND c.credits > 0
+    GROUP BY c.department_id, e.student_key
+    """
+    return read_frame(query)
+
+@cached_query
+def get_students_by_key(keys):
+    # keys is a tuple of student keys, passed as one JSON array
+    query = """
+    SELECT s.key as student_key, s.id, p.name, s.roll_number, s.program, s.entry_year
+    FROM students s
+    JOIN persons p ON s.id = p.id
+    WHERE s.key IN (SELECT value FROM json_each(?))
+    """
+    return read_frame(query, (json.dumps(list(keys)),))
+
+def get_instructor_courses(instructor_id):
+    query = """
+    SELECT 
+        c.id, 
+        c.name, 
+        d.name as department, 
+        c.credits, 
+        c.description,
+        (SELECT COUNT(*) FROM enrollments WHERE course_key = c.key) as enrolled_students
+    FROM courses c
+    LEFT JOIN departments d ON c.department_id = d.id
+    WHERE c.instructor_id = ?
+    """
+    return read_frame(query, (instructor_id,))
+
+def get_available_courses(student_id):
+    # Courses the student is not enrolled in yet
+    return fetch_all("""
+    SELECT c.id, c.name 
+    FROM courses c 
+    WHERE c.key NOT IN (
+        SELECT e.course_key FROM enrollments e
+        JOIN students s ON e.student_key = s.key
+        WHERE s.id = ?
+    )
+    """, (student_id,))
+
+def get_assignable_courses(instructor_id):
+    # Courses not assigned to this instructor
+    return fetch_all("""
+    SELECT c.id, c.name 
+    FROM courses c 
+    WHERE c.instructor_id IS NULL OR c.instructor_id != ?
+    """, (instructor_id,))
+
+def get_department_courses(department_id):
+    return fetch_all("""
+    SELECT c.name, p.name as instructor, c.credits
+    FROM courses c
+    LEFT JOIN persons p ON c.instructor_id = p.id
+    WHERE c.department_id = ?
+    """, (department_id,))
+
+def get_department_instructors(department_id):
+    return fetch_all("""
+    SELECT p.name, i.position, i.salary
+    FROM instructors i
+    JOIN persons p ON i.id = p.id
+    WHERE i.department_id = ?
+    """, (department_id,))
+
+def get_top_courses(limit=10):
+    return fetch_all("""
+    SELECT c.name, COUNT(e.student_key) as enrollments
+    FROM enrollments e
+    JOIN courses c ON e.course_key = c.key
+    GROUP BY c.name
+    ORDER BY enrollments DESC
+    LIMIT ?
+    """, (limit,))
+
+def get_grade_distribution():
+    return fetch_all("""
+    SELECT grade, COUNT(*) as count
+    FROM enrollments
+    WHERE grade IS NOT NULL
+    GROUP BY grade
+    ORDER BY grade
+    """)
+
+def get_course_popularity(limit=-1):
+    # A negative limit returns every course
+    return fetch_all("""
+    SELECT c.name, d.name as department, COUNT(e.student_key) as enrollments
+    FROM enrollments e
+    JOIN courses c ON e.course_key = c.key
+    JOIN departments d ON c.department_id = d.id
+    GROUP BY c.name
+    ORDER BY enrollments DESC
+    LIMIT ?
+    """, (limit,))
+
+# Width of the age bands in the age distribution
+AGE_BAND_YEARS = 5
+
+# Chart aggregations: grouped in SQLite so charts receive one row per bar, not per person.
+# Ages are counted per band, labelled by its first year, so the chart stays small
+# whatever range of ages is stored.
+STUDENT_DISTRIBUTIONS = {
+    "age": f"""
+    SELECT CAST(age AS INTEGER) / {AGE_BAND_YEARS} * {AGE_BAND_YEARS} AS value, COUNT(*) AS count
+    FROM persons
+    WHERE type = 'student' AND age IS NOT NULL
+    GROUP BY value
+    ORDER BY value
+    """,
+    "program": """
+    SELECT program AS value, COUNT(*) AS count
+    FROM students
+    WHERE program IS NOT NULL
+    GROUP BY program
+    ORDER BY count DESC
+    """,
+    "entry_year": """
+    SELECT entry_year AS value, COUNT(*) AS count
+    FROM students
+    WHERE entry_year IS NOT NULL
+    GROUP BY entry_year
+    ORDER BY entry_year
+    """,
+}
+
+@cached_query
+def get_student_distribution(column):
+    return read_frame(STUDENT_DISTRIBUTIONS[column]).set_index("value")["count"]
+
+@cached_query
+def get_average_salaries(group_by):
+    if group_by == "position":
+        query = """
+        SELECT position AS value, AVG(salary) AS salary
+        FROM instructors
+        WHERE position IS NOT NULL
+        GROUP BY position
+        ORDER BY salary DESC
+        """
+    else:
+        query = """
+        SELECT d.name AS value, AVG(i.salary) AS salary
+        FROM instructors i
+        JOIN departments d ON i.department_id = d.id
+        GROUP BY d.id
+        ORDER BY salary DESC
+        """
+    return read_frame(query).set_index("value")["salary"]
+
+@cached_query
+def get_salary_histogram(bins=20):
+    # Equal-width bins between the lowest and highest salary, counted in one pass
+    return read_frame("""
+    WITH bounds AS (
+        SELECT MIN(salary) AS low, MAX((MAX(salary) - MIN(salary)) / ?, 1) AS width
+        FROM instructors
+        WHERE salary IS NOT NULL
+    ),
+    binned AS (
+        SELECT MIN(CAST((i.salary - b.low) / b.width AS INTEGER), ? - 1) AS bin, COUNT(*) AS count
+        FROM instructors i, bounds b
+        WHERE i.salary IS NOT NULL
+        GROUP BY bin
+    )
+    SELECT b.low + bin * b.width AS bin_start, b.low + (bin + 1) * b.width AS bin_end, count
+    FROM binned, bounds b
+    ORDER BY bin
+    """, (bins, bins))
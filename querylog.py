@@ -0,0 +1,232 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Statements at least this slow are kept in the slow-query log with their plan (milliseconds)
+SLOW_QUERY_MS = 100
+
+# Number of slow statements kept; older ones are dropped first
+SLOW_LOG_SIZE = 50
+
+# Statements remembered per rerun for the sidebar breakdown; counters keep going past it
+RUN_STATEMENT_LIMIT = 500
+
+# Only these statements can be explained
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# Frames that only forward SQL; the call site is the first frame past them
+_SKIP_FILES = {os.path.abspath(__file__)}
+_SKIP_FUNCTIONS = {"read_frame", "fetch_all", "fetch_one", "wrapper", "<lambda>", "get_or_load"}
+_REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def call_site():
+    # Innermost frame in this repository that is not just a query helper
+    frame = sys._getframe(1)
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if (path.startswith(_REPO_DIR) and path not in _SKIP_FILES
+                and frame.f_code.co_name not in _SKIP_FUNCTIONS):
+            location = f"{os.path.basename(path)}:{frame.f_lineno}"
+            name = frame.f_code.co_name
+            return location if name == "<module>" else f"{name} ({location})"
+        frame = frame.f_back
+    return "unknown"
+
+
+def compact_sql(sql):
+    return " ".join(sql.split())
+
+
+def explain(conn, sql, params):
+    if not compact_sql(sql).upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        rows = conn.execute_untracked(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except (sqlite3.Error, ValueError):
+        return None
+    # (id, parent, notused, detail); indent each step under its parent
+    depth = {0: -1}
+    lines = []
+    for step_id, parent, _, detail in rows:
+        depth[step_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[step_id] + detail)
+    return "\n".join(lines)
+
+
+class QueryLog:
+    """Process-wide record of every statement run through an InstrumentedConnection.
+
+    Each statement's latency, row count and call site is added to per-call-site
+    totals and to the current thread's rerun (see ``start_run``). Statements slower
+    than ``slow_ms`` are kept in a bounded ring buffer together with their
+    EXPLAIN QUERY PLAN output.
+    """
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, size=SLOW_LOG_SIZE):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self._slow = deque(maxlen=size)
+        self._sites = {}
+        self._pages = {}
+        self._local = threading.local()
+
+    def begin(self, sql, params):
+        return {
+            "sql": sql,
+            "params": params,
+            "call_site": call_site(),
+            "ms": 0.0,
+            "rows": 0,
+            "slow": False,
+            "counted": False,
+        }
+
+    def add(self, conn, entry, elapsed, rows):
+        # Called after the execute and after every fetch of the same statement
+        ms = elapsed * 1000
+        entry["ms"] += ms
+        entry["rows"] += max(rows, 0)
+        first = not entry["counted"]
+        entry["counted"] = True
+        became_slow = not entry["slow"] and entry["ms"] >= self.slow_ms
+        if became_slow:
+            entry["slow"] = True
+
+        with self._lock:
+            site = self._sites.setdefault(entry["call_site"], {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0})
+            site["calls"] += first
+            site["total_ms"] += ms
+            site["max_ms"] = max(site["max_ms"], entry["ms"])
+            site["rows"] += max(rows, 0)
+
+        run = getattr(self._local, "run", None)
+        if run is not None:
+            run["total_ms"] += ms
+            if first:
+                run["queries"] += 1
+                if len(run["statements"]) < RUN_STATEMENT_LIMIT:
+                    run["statements"].append(entry)
+
+        if became_slow:
+            record = {
+                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "entry": entry,
+                "plan": explain(conn, entry["sql"], entry["params"]) if entry["params"] is not None else None,
+            }
+            with self._lock:
+                self._slow.append(record)
+
+    def start_run(self):
+        # Statements run on this thread from now on belong to the current rerun
+        self._local.run = {"queries": 0, "total_ms": 0.0, "statements": [], "started": time.perf_counter()}
+
+    def finish_run(self, page):
+        # Close the rerun started on this thread and add it to the page's totals
+        run = getattr(self._local, "run", None)
+        if run is None:
+            return None
+        self._local.run = None
+        # Wall time of the whole rerun, database or not
+        run["elapsed_ms"] = (time.perf_counter() - run["started"]) * 1000
+        with self._lock:
+            totals = self._pages.setdefault(page, {"runs": 0, "queries": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                                   "elapsed_ms": 0.0})
+            totals["runs"] += 1
+            totals["elapsed_ms"] += run["elapsed_ms"]
+            totals["queries"] += run["queries"]
+            totals["total_ms"] += run["total_ms"]
+            totals["max_ms"] = max(totals["max_ms"], run["total_ms"])
+        return run
+
+    def slow_queries(self):
+        # Newest first; a statement keeps accumulating fetch time after it is logged
+        with self._lock:
+            records = list(self._slow)
+        return [{
+            "time": record["time"],
+            "call_site": record["entry"]["call_site"],
+            "ms": round(record["entry"]["ms"], 1),
+            "rows": record["entry"]["rows"],
+            "sql": compact_sql(record["entry"]["sql"]),
+            "params": repr(record["entry"]["params"])[:200],
+            "plan": record["plan"],
+        } for record in reversed(records)]
+
+    def call_sites(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._sites.items()}
+
+    def pages(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._pages.items()}
+
+    def reset(self):
+        with self._lock:
+            self._slow.clear()
+            self._sites.clear()
+            self._pages.clear()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # Times execute and every fetch of the statement, so row-heavy reads are charged in full
+
+    _entry = None
+
+    def _timed(self, method, *args):
+        entry = self._entry
+        start = time.perf_counter()
+        result = method(*args)
+        if entry is not None:
+            rows = len(result) if isinstance(result, list) else int(result is not None)
+            query_log.add(self.connection, entry, time.perf_counter() - start, rows)
+        return result
+
+    def execute(self, sql, params=()):
+        self._entry = query_log.begin(sql, params)
+        start = time.perf_counter()
+        super().execute(sql, params)
+        # Writes are complete after execute; reads accumulate rows as they are fetched
+        rows = self.rowcount if self.description is None else 0
+        query_log.add(self.connection, self._entry, time.perf_counter() - start, rows)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._entry = query_log.begin(sql, None)
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_params)
+        query_log.add(self.connection, self._entry, time.perf_counter() - start, self.rowcount)
+        return self
+
+    def fetchone(self):
+        return self._timed(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._timed(super().fetchall)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection whose statements are recorded in ``query_log``."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def execute_untracked(self, sql, params=()):
+        # Used for the EXPLAIN itself so it does not show up in the log
+        return super().execute(sql, params)
+
+
+query_log = QueryLog()
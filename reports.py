@@ -0,0 +1,351 @@
+import atexit
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+import analytics
+import queries
+import schedule
+from database import connect, apply_pragmas
+from querylog import InstrumentedConnection
+from queries import (
+    reading_from, get_student_distribution, get_average_salaries, get_salary_histogram, get_department_stats,
+)
+
+# Reports computed at the same time; further requests queue behind them
+REPORT_WORKERS = 2
+
+# Most bars or points sent to the browser for a single chart
+CHART_MAX_POINTS = 50
+
+# Bins in the salary histogram
+SALARY_BINS = 20
+
+# Run reports against a periodically refreshed copy of the database; False reads the live file
+REPORT_FROM_SNAPSHOT = True
+
+# Seconds before the report snapshot is rebuilt in the background
+SNAPSHOT_MAX_AGE = 300
+
+# Pages copied per backup step, and the pause after each step that leaves the disk to the app
+SNAPSHOT_PAGES_PER_STEP = 1024
+SNAPSHOT_STEP_PAUSE = 0.002
+
+
+def cap_points(series, limit=CHART_MAX_POINTS):
+    # Keep the largest counts and fold the remainder into a single "Other" bar
+    if len(series) <= limit:
+        return series
+    top = series.nlargest(limit - 1)
+    return pd.concat([top, pd.Series({"Other": series.drop(top.index).sum()})])
+
+
+def student_demographics(progress):
+    progress(0.1, "Counting ages")
+    age_counts = get_student_distribution("age")
+    progress(0.4, "Counting programs")
+    program_counts = get_student_distribution("program")
+    progress(0.7, "Counting entry years")
+    entry_year_counts = get_student_distribution("entry_year")
+    return {
+        # Already one bar per age band, so nothing is cut from the axis
+        "age_counts": age_counts,
+        "program_counts": cap_points(program_counts),
+        "entry_year_counts": entry_year_counts.tail(CHART_MAX_POINTS),
+    }
+
+
+def instructor_salary_analysis(progress):
+    progress(0.1, "Averaging salaries by position")
+    salary_by_position = get_average_salaries("position")
+    progress(0.4, "Averaging salaries by department")
+    salary_by_department = get_average_salaries("department")
+    progress(0.7, "Binning salaries")
+    return {
+        "salary_by_position": salary_by_position.head(CHART_MAX_POINTS),
+        "salary_by_department": salary_by_department.head(CHART_MAX_POINTS),
+        "salary_histogram": get_salary_histogram(SALARY_BINS),
+    }
+
+
+def course_popularity(progress):
+    progress(0.1, "Counting enrollments per course")
+    top_courses = pd.DataFrame(analytics.course_popularity(10), columns=["Course", "Department", "Enrollments"])
+    progress(0.8, "Totalling departments")
+    # Department totals come from the trigger-maintained department_stats table
+    dept_stats = get_department_stats()
+    dept_enrollments = dept_stats[dept_stats["enrollments"] > 0].set_index("name")["enrollments"]
+    return {
+        "top_courses": top_courses,
+        "department_enrollments": cap_points(dept_enrollments.sort_values(ascending=False)),
+    }
+
+
+def department_comparison(progress):
+    progress(0.1, "Loading department statistics")
+    dept_stats = get_department_stats()[["name", "instructors", "courses", "students", "enrollments"]]
+    dept_stats.columns = ["Department", "Instructors", "Courses", "Students", "Enrollments"]
+    # The largest departments by enrollment when there are more than fit on a chart
+    dept_stats = dept_stats.sort_values("Enrollments", ascending=False).head(CHART_MAX_POINTS)
+    return {"department_stats": dept_stats.sort_values("Department")}
+
+
+def academic_performance(progress):
+    progress(0.1, "Computing GPAs by department")
+    distribution = analytics.department_gpa_distribution()
+    # The largest departments when there are more than fit on a chart
+    summary = distribution["summary"].nlargest(CHART_MAX_POINTS, "students").sort_index()
+    histogram = distribution["histogram"]
+    progress(0.7, "Selecting the dean's list")
+    deans_list, eligible = analytics.deans_list()
+    return {
+        "gpa_summary": summary,
+        "gpa_histogram": histogram[histogram["department"].isin(summary.index)],
+        "deans_list": deans_list,
+        "deans_list_eligible": eligible,
+    }
+
+
+def schedule_conflicts(progress):
+    progress(0.1, "Sweeping student timetables")
+    return schedule.conflict_report()
+
+
+REPORTS = {
+    "Student Demographics": student_demographics,
+    "Instructor Salary Analysis": instructor_salary_analysis,
+    "Course Popularity": course_popularity,
+    "Department Comparison": department_comparison,
+    "Academic Performance": academic_performance,
+    "Schedule Conflicts": schedule_conflicts,
+}
+
+
+class Snapshot:
+    # One finished copy of the database; the file is never written again
+    def __init__(self, path, version, created, build_seconds):
+        self.path = path
+        self.version = version
+        self.created = created
+        self.build_seconds = build_seconds
+
+    def age(self):
+        return (datetime.now() - self.created).total_seconds()
+
+    def connect(self):
+        # Immutable: SQLite takes no locks and keeps no journal for this file
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True, check_same_thread=False,
+                               factory=InstrumentedConnection)
+        apply_pragmas(conn, read_only=True)
+        return conn
+
+
+class ReportSnapshot:
+    """Point-in-time copy of the database that reports read instead of the live file.
+
+    The copy is made with the sqlite3 backup API inside one read transaction on a
+    connection of its own, a few pages per step, so it never holds a pooled reader
+    and writes that land meanwhile neither block on it nor restart it. A snapshot
+    older than ``max_age`` is rebuilt in the background while reports keep reading
+    the previous one; the old file is removed once the new one is swapped in.
+    """
+
+    def __init__(self, max_age=SNAPSHOT_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # Held for the whole of a build, so there is never more than one at a time
+        self._build_lock = threading.Lock()
+        self._current = None
+        self.builds = 0
+        self.last_error = None
+        # Snapshots are as large as the database; do not leave the last one behind
+        atexit.register(self.close)
+
+    def get(self, wait=False):
+        # Latest finished snapshot; a stale one is rebuilt in the background. Before the
+        # first build finishes this is None, unless wait=True makes the caller build it
+        with self._lock:
+            current = self._current
+        if current is None and wait:
+            with self._build_lock:
+                if self._current is None:
+                    self._refresh()
+            return self._current
+        if current is None or current.age() > self.max_age:
+            self.start_refresh()
+        return current
+
+    def start_refresh(self):
+        # A refresh asked for during a build is covered by that build
+        if not self._build_lock.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._refresh_in_background, daemon=True, name="report-snapshot").start()
+        return True
+
+    def _refresh_in_background(self):
+        try:
+            self._refresh()
+        except Exception:
+            # Kept in last_error; the previous snapshot stays in use
+            pass
+        finally:
+            self._build_lock.release()
+
+    def _refresh(self):
+        try:
+            snapshot = self._build(queries.pool.path)
+        except Exception as e:
+            self.last_error = str(e)
+            raise
+        with self._lock:
+            previous, self._current = self._current, snapshot
+            self.builds += 1
+            self.last_error = None
+        if previous is not None:
+            remove_snapshot_file(previous.path)
+
+    def _build(self, source_path):
+        start = time.perf_counter()
+        directory, name = os.path.split(os.path.abspath(source_path))
+        fd, path = tempfile.mkstemp(prefix=f"{os.path.splitext(name)[0]}-report-", suffix=".db", dir=directory)
+        os.close(fd)
+        source = connect(source_path, read_only=True)
+        target = sqlite3.connect(path)
+        try:
+            # Every step reads the snapshot this transaction started on
+            source.execute("BEGIN")
+            version = source.execute("SELECT version FROM data_version WHERE id = 1").fetchone()[0]
+            source.backup(target, pages=SNAPSHOT_PAGES_PER_STEP,
+                          progress=lambda status, remaining, total: time.sleep(SNAPSHOT_STEP_PAUSE))
+            source.execute("COMMIT")
+            # A standalone file that is only read from now on
+            target.execute("PRAGMA journal_mode = DELETE")
+        except Exception:
+            target.close()
+            remove_snapshot_file(path)
+            raise
+        finally:
+            source.close()
+        target.close()
+        return Snapshot(path, version, datetime.now(), time.perf_counter() - start)
+
+    def open(self):
+        # Connect under the lock, so the file cannot be swapped out and removed in between
+        with self._lock:
+            snapshot = self._current
+            return snapshot, snapshot.connect()
+
+    def close(self):
+        with self._lock:
+            current, self._current = self._current, None
+        if current is not None:
+            remove_snapshot_file(current.path)
+
+    def stats(self):
+        with self._lock:
+            current = self._current
+        return {
+            "version": current.version if current is not None else None,
+            "age": current.age() if current is not None else None,
+            "build_seconds": current.build_seconds if current is not None else None,
+            "size": os.path.getsize(current.path) if current is not None else 0,
+            "building": self._build_lock.locked(),
+            "builds": self.builds,
+            "last_error": self.last_error,
+        }
+
+
+def remove_snapshot_file(path):
+    # Reports still reading an old snapshot keep their open handle; where the platform
+    # refuses to remove an open file it is left behind
+    for suffix in ("", "-journal"):
+        try:
+            os.remove(path + suffix)
+        except OSError:
+            pass
+
+
+# Shared by every session in this process
+report_snapshot = ReportSnapshot()
+
+
+class ReportJob:
+    def __init__(self, name, version):
+        self.name = name
+        self.version = version
+        self.as_of = None
+        self.progress = 0.0
+        self.message = "Queued"
+        self.result = None
+        self.error = None
+        self.elapsed = None
+        self.done = threading.Event()
+
+    def update(self, fraction, message):
+        self.progress = fraction
+        self.message = message
+
+
+class ReportRunner:
+    """Computes reports on background threads, once per report and data version.
+
+    Every session asking for a report at a version that has already been requested
+    gets the same job back, whether it is still running or finished, so concurrent
+    viewers share a single computation. With REPORT_FROM_SNAPSHOT the version is
+    the report snapshot's, and the job reads only from that snapshot.
+    """
+
+    def __init__(self, workers=REPORT_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self.computed = 0
+        self.reused = 0
+
+    def request(self, name, version):
+        with self._lock:
+            job = self._jobs.get(name)
+            # A failed job is retried; a job at this or a newer version is shared
+            if job is not None and job.version >= version and job.error is None:
+                self.reused += 1
+                return job
+            job = ReportJob(name, version)
+            self._jobs[name] = job
+            self.computed += 1
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        start = time.perf_counter()
+        try:
+            if REPORT_FROM_SNAPSHOT:
+                # Whatever snapshot is current when the job starts; never older than requested
+                snapshot, conn = report_snapshot.open()
+                job.version, job.as_of = snapshot.version, snapshot.created
+                try:
+                    with reading_from(conn):
+                        job.result = REPORTS[job.name](job.update)
+                finally:
+                    conn.close()
+            else:
+                job.result = REPORTS[job.name](job.update)
+        except Exception as e:
+            job.error = str(e)
+        finally:
+            job.elapsed = time.perf_counter() - start
+            job.update(1.0, "Done")
+            job.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {"computed": self.computed, "reused": self.reused, "reports": len(self._jobs)}
+
+
+# Shared by every session in this process
+report_runner = ReportRunner()
@@ -0,0 +1,145 @@
+import bisect
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import analytics
+from queries import get_course_meetings, get_student_meetings, get_all_meetings
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# Course pairs listed in the conflict report
+CONFLICT_REPORT_PAIRS = 20
+
+
+def format_time(minute):
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def format_meeting(day, start_minute, end_minute):
+    return f"{DAYS[day][:3]} {format_time(start_minute)}–{format_time(end_minute)}"
+
+
+def week_minute(day, minute):
+    # Minutes since Monday 00:00, so meetings on different days never overlap
+    return day * MINUTES_PER_DAY + minute
+
+
+class SlotIndex:
+    """Interval index over weekly time slots given as (start, end, label), end exclusive.
+
+    Slots are sorted by start alongside a running maximum of their ends. An overlap
+    query bisects to the last slot starting before the query ends and walks back only
+    while some earlier slot still ends after the query starts.
+    """
+
+    def __init__(self, slots):
+        self.slots = sorted(slots)
+        self.starts = [slot[0] for slot in self.slots]
+        self.max_ends = list(itertools.accumulate((slot[1] for slot in self.slots), max))
+
+    def overlapping(self, start, end):
+        found = []
+        i = bisect.bisect_left(self.starts, end) - 1
+        while i >= 0 and self.max_ends[i] > start:
+            if self.slots[i][1] > start:
+                found.append(self.slots[i])
+            i -= 1
+        return found
+
+
+def registration_conflicts(student_id, course_id):
+    # Clashes between the meetings of course_id and the student's current timetable. Advisory:
+    # the write paths (register_course, bulk_enroll, the importer) do not refuse clashes
+    current = get_student_meetings(student_id)
+    index = SlotIndex(
+        (week_minute(m.day, m.start_minute), week_minute(m.day, m.end_minute), m.course)
+        for m in current[current["course_id"] != course_id].itertuples()
+    )
+    conflicts = []
+    for meeting in get_course_meetings(course_id).itertuples():
+        for start, end, course in index.overlapping(week_minute(meeting.day, meeting.start_minute),
+                                                    week_minute(meeting.day, meeting.end_minute)):
+            conflicts.append(f"{format_meeting(meeting.day, meeting.start_minute, meeting.end_minute)} clashes with "
+                             f"{course} ({format_meeting(start // MINUTES_PER_DAY, start % MINUTES_PER_DAY, end % MINUTES_PER_DAY or MINUTES_PER_DAY)})")
+    return conflicts
+
+
+def find_conflicts(students, courses, meetings):
+    """Sweep every student's weekly timetable at once and return the clashing pairs.
+
+    ``students`` and ``courses`` are parallel enrollment key arrays; ``meetings`` has
+    course_key, day, start_minute and end_minute sorted by course_key. Each enrollment
+    is expanded into its meetings and every student's week is laid end to end on one
+    time axis. After a single sort, a running maximum of end times tells for every
+    meeting whether any earlier one of the same student is still in progress, and
+    how far back the earlier meetings it overlaps can be.
+    """
+    if meetings.empty:
+        # No timetable yet, which is how every database starts out
+        return pd.DataFrame({"student_key": [], "course_a": [], "course_b": []}, dtype=np.int64), 0
+    # An empty or freshly read frame can come back with object columns
+    meetings = meetings.astype({column: np.int64 for column in ("course_key", "day", "start_minute", "end_minute")})
+    courses = courses.astype(np.int64)
+    course_keys = meetings["course_key"].to_numpy()
+    size = int(max(course_keys.max(initial=0), courses.max(initial=0))) + 1
+    per_course = np.bincount(course_keys, minlength=size)
+    first_meeting = np.cumsum(per_course) - per_course
+
+    # One row per (enrollment, meeting of its course)
+    per_enrollment = per_course[courses]
+    owner = np.repeat(np.arange(len(courses)), per_enrollment)
+    within = np.arange(len(owner)) - np.repeat(np.cumsum(per_enrollment) - per_enrollment, per_enrollment)
+    rows = first_meeting[courses[owner]] + within
+    offsets = students[owner].astype(np.int64) * MINUTES_PER_WEEK
+    starts = offsets + (meetings["day"].to_numpy() * MINUTES_PER_DAY + meetings["start_minute"].to_numpy())[rows]
+    ends = offsets + (meetings["day"].to_numpy() * MINUTES_PER_DAY + meetings["end_minute"].to_numpy())[rows]
+
+    order = np.argsort(starts, kind="stable")
+    starts, ends, owner = starts[order], ends[order], owner[order]
+    running_end = np.maximum.accumulate(ends)
+    # Meetings that start before an earlier one has ended, then step back one row at a
+    # time (for all of them at once) while an earlier meeting can still reach them
+    active = np.flatnonzero(starts[1:] < running_end[:-1]) + 1
+    earlier = active - 1
+    clashing, partners = [], []
+    while len(active):
+        hit = ends[earlier] > starts[active]
+        clashing.append(active[hit])
+        partners.append(earlier[hit])
+        reach = earlier > 0
+        reach[reach] = running_end[earlier[reach] - 1] > starts[active[reach]]
+        active, earlier = active[reach], earlier[reach] - 1
+    clashing = np.concatenate(clashing) if clashing else np.array([], dtype=np.int64)
+    partners = np.concatenate(partners) if partners else np.array([], dtype=np.int64)
+
+    pairs = pd.DataFrame({
+        "student_key": students[owner[clashing]],
+        "course_a": courses[owner[partners]],
+        "course_b": courses[owner[clashing]],
+    })
+    # Two meetings of the same course are not a timetable clash
+    pairs = pairs[pairs["course_a"] != pairs["course_b"]]
+    swap = pairs["course_a"] > pairs["course_b"]
+    pairs.loc[swap, ["course_a", "course_b"]] = pairs.loc[swap, ["course_b", "course_a"]].to_numpy()
+    return pairs.drop_duplicates(), len(owner)
+
+
+def conflict_report(limit=CONFLICT_REPORT_PAIRS):
+    # Clashes in every student's current timetable, i.e. their ungraded enrollments
+    state = analytics.current_state()
+    current = state.grades < 0
+    pairs, meetings_scanned = find_conflicts(state.students[current], state.courses[current], get_all_meetings())
+    names = pd.Series(state.course_dims["name"].to_numpy(), index=state.course_dims.index)
+    top = pairs.groupby(["course_a", "course_b"]).size().nlargest(limit).rename("Students").reset_index()
+    top.insert(0, "Course", names.reindex(top.pop("course_a")).to_numpy())
+    top.insert(1, "Clashes With", names.reindex(top.pop("course_b")).to_numpy())
+    return {
+        "meetings_scanned": meetings_scanned,
+        "students": int(pairs["student_key"].nunique()),
+        "clashes": len(pairs),
+        "top_pairs": top,
+    }
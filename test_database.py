@@ -0,0 +1,20 @@
+import threading
+
+import database
+
+
+def test_failed_prune_is_kept_in_status():
+    def writer():
+        raise TimeoutError("Writer connection not available")
+
+    stop = threading.Event()
+    status = {"runs": 0, "pruned": 0, "last_error": None}
+
+    def wait(interval):
+        # Stop after the first prune instead of sleeping through the interval
+        stop.set()
+
+    stop.wait = wait
+    database.prune_activity_periodically(writer, stop=stop, status=status)
+    assert status["runs"] == 1
+    assert status["last_error"] == "TimeoutError: Writer connection not available"
@@ -0,0 +1,18 @@
+import pytest
+
+from importer import parse_number
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf", "NaN"])
+def test_parse_number_rejects_non_finite(value):
+    with pytest.raises(ValueError, match="finite"):
+        parse_number(value, "salary", cast=float, minimum=0)
+
+
+def test_parse_number_bounds():
+    assert parse_number("", "age") is None
+    assert parse_number("42", "age", minimum=16, maximum=100) == 42
+    with pytest.raises(ValueError, match="must be at least 0, got -1"):
+        parse_number("-1", "salary", cast=float, minimum=0)
+    with pytest.raises(ValueError, match="must be between 16 and 100, got 12"):
+        parse_number("12", "age", minimum=16, maximum=100)
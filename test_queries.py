@@ -0,0 +1,47 @@
+import pytest
+
+import queries
+
+
+@pytest.fixture
+def db(tmp_path):
+    pool = queries.use_database(str(tmp_path / "university.db"))
+    with pool.writer() as conn:
+        conn.execute("INSERT INTO courses (id, name, credits, capacity) VALUES ('CS101', 'Programming', 3, 2)")
+        for n in range(1, 4):
+            conn.execute("INSERT INTO persons (id, name, email, type) VALUES (?, ?, ?, 'student')",
+                         (f"s{n}", f"Student {n}", f"s{n}@example.edu"))
+            conn.execute("INSERT INTO students (id, roll_number) VALUES (?, ?)", (f"s{n}", f"R{n}"))
+    return pool
+
+
+def test_graded_enrollments_keep_their_seat(db):
+    assert queries.register_course("s1", "CS101") == ("enrolled", None)
+    assert queries.register_course("s2", "CS101") == ("enrolled", None)
+    queries.save_grades("CS101", [("A", "s1")])
+    # Grading does not reopen the course
+    assert queries.register_course("s3", "CS101") == ("waitlisted", 1)
+    assert queries.get_course_seats("CS101") == (2, 2, 1)
+    # Clearing the grade gives back no seat it did not have, so the course stays within capacity
+    queries.save_grades("CS101", [(None, "s1")])
+    assert queries.get_course_seats("CS101") == (2, 2, 1)
+
+
+def test_save_grades_unknown_course(db):
+    with pytest.raises(ValueError):
+        queries.save_grades("NOPE", [("A", "s1")])
+
+
+def test_search_index_follows_edits_and_deletes(db):
+    assert [row[0] for row in queries.search_entities("student", "student 2")] == ["s2"]
+    with db.writer() as conn:
+        conn.execute("UPDATE persons SET name = 'Ada Lovelace' WHERE id = 's2'")
+        conn.execute("UPDATE courses SET name = 'Compilers' WHERE id = 'CS101'")
+    assert [row[0] for row in queries.search_entities("student", "lovelace")] == ["s2"]
+    assert queries.search_entities("student", "student 2") == []
+    assert [row[0] for row in queries.search_entities("course", "compil")] == ["CS101"]
+    with db.writer() as conn:
+        conn.execute("DELETE FROM students WHERE id = 's2'")
+        conn.execute("DELETE FROM persons WHERE id = 's2'")
+        conn.execute("INSERT INTO search_index (search_index) VALUES ('integrity-check')")
+    assert queries.search_entities("student", "lovelace") == []
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import queries
+import schedule
+
+
+@pytest.fixture
+def db(tmp_path):
+    # A freshly migrated database with no rows, like the shipped university.db
+    return queries.use_database(str(tmp_path / "university.db"))
+
+
+def meetings_frame(rows):
+    return pd.DataFrame(rows, columns=["course_key", "day", "start_minute", "end_minute"])
+
+
+def test_find_conflicts_without_meetings(db):
+    # Read back from an empty table the columns are object dtype
+    meetings = queries.get_all_meetings()
+    assert meetings.empty
+    pairs, scanned = schedule.find_conflicts(np.array([1, 2]), np.array([1, 1]), meetings)
+    assert pairs.empty
+    assert scanned == 0
+
+
+def test_find_conflicts_without_enrollments():
+    meetings = meetings_frame([(1, 0, 540, 615), (2, 0, 600, 675)])
+    pairs, scanned = schedule.find_conflicts(np.array([], dtype=np.int64), np.array([], dtype=np.int64), meetings)
+    assert pairs.empty
+    assert scanned == 0
+
+
+def test_find_conflicts_object_columns():
+    meetings = meetings_frame([(1, 0, 540, 615), (2, 0, 600, 675), (3, 1, 540, 615)]).astype(object)
+    pairs, scanned = schedule.find_conflicts(np.array([7, 7, 7]), np.array([1, 2, 3]), meetings)
+    assert scanned == 3
+    assert pairs.values.tolist() == [[7, 1, 2]]
+
+
+def test_conflict_report_on_empty_database(db):
+    report = schedule.conflict_report()
+    assert report["clashes"] == 0
+    assert report["meetings_scanned"] == 0
+    assert report["top_pairs"].empty
+
+
+def test_add_meeting_to_unknown_course(db):
+    with pytest.raises(ValueError):
+        queries.add_course_meeting("NOPE", 0, 540, 615, "A1")
+    assert queries.get_all_meetings().empty